@@ -18,15 +18,42 @@ class Settings(BaseSettings):
     ORCHESTRATOR_URL: str
     AUTO_REGISTER: bool = True
     
+    # Embedding Service Configuration: when set, query embeddings come from
+    # the embedding service's /embed API and no model is loaded locally
+    EMBEDDING_SERVICE_URL: str = ""
+    EMBEDDING_TIMEOUT: float = 10.0
+    
     # HuggingFace Configuration
     HF_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     HF_CACHE_DIR: str = "/app/models_cache"
     
+    # Index dimension: must match the embedding service
+    EMBEDDING_DIM: int = 384
+    DIM_REDUCTION: str = "matryoshka"
+    PCA_MODEL_DIR: str = "/app/models_cache/pca"
+    
+    # Inference backend: "torch", "torch-int8", "onnx" or "onnx-int8"
+    EMBEDDING_BACKEND: str = "torch"
+    ONNX_MODEL_DIR: str = "/app/models_cache/onnx"
+    
+    # Inference pool: query embeddings run off the event loop on these threads
+    INFERENCE_THREADS: int = 1
+    INFERENCE_MAX_QUEUE: int = 16
+    
     # RAG Configuration
     MAX_CONTEXT_LENGTH: int = 2000
     TOP_K_RESULTS: int = 5
     SCORE_THRESHOLD: float = 0.7
     
+    # Hybrid retrieval: dense + BM25 keyword search fused by the vector DB
+    # (SCORE_THRESHOLD then applies to the dense side only)
+    HYBRID_SEARCH: bool = True
+    # HNSW ef for this agent's searches; 0 uses the collection's default
+    SEARCH_HNSW_EF: int = 0
+    # Long items are stored as several chunks; this many chunk hits are
+    # fetched per requested source so max_results distinct items remain
+    SEARCH_OVERFETCH: int = 3
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,76 @@
+import os
+import numpy as np
+from typing import Dict, Optional
+
+
+class DimensionReducer:
+    """
+    Maps model embeddings to the index dimension (EMBEDDING_DIM)
+
+    Methods (DIM_REDUCTION):
+    - "matryoshka": keep the leading components and re-normalize. Only
+      meaningful for models trained with Matryoshka representation
+      learning; for other models prefer "pca".
+    - "pca": project onto principal components fitted on the archive with
+      fit_pca.py, then re-normalize. Falls back to "matryoshka" when the
+      fitted projection is missing or was fitted for a different width.
+
+    Vectors narrower than the target are zero-padded, which leaves their
+    cosine similarities unchanged. A vector already at the target width is
+    returned as is.
+    """
+
+    def __init__(self, target_dim: int, method: str = "matryoshka", pca_path: Optional[str] = None):
+        if method not in ("matryoshka", "pca"):
+            raise ValueError(f"Unknown dimension reduction method: {method}")
+        self.target_dim = target_dim
+        self.method = method
+        self.pca_path = pca_path
+        self._mean: Optional[np.ndarray] = None
+        self._components: Optional[np.ndarray] = None
+        if method == "pca":
+            self._load_pca()
+
+    def _load_pca(self):
+        if not self.pca_path or not os.path.exists(self.pca_path):
+            print(f"PCA projection not found at {self.pca_path}, using matryoshka truncation")
+            return
+        fitted = np.load(self.pca_path)
+        components = fitted["components"].astype(np.float32)
+        if components.shape[0] < self.target_dim:
+            print(f"PCA projection at {self.pca_path} has {components.shape[0]} components, "
+                  f"fewer than EMBEDDING_DIM={self.target_dim}; using matryoshka truncation")
+            return
+        self._mean = fitted["mean"].astype(np.float32)
+        self._components = components[:self.target_dim]
+        print(f"Loaded PCA projection {self._components.shape[1]} -> {self.target_dim} from {self.pca_path}")
+
+    @property
+    def name(self) -> str:
+        """Reduction actually applied to vectors wider than the target"""
+        return "pca" if self._components is not None else "matryoshka"
+
+    def describe(self) -> Dict:
+        return {"dim": self.target_dim, "reduction": self.name}
+
+    def reduce(self, embeddings: np.ndarray) -> np.ndarray:
+        """Map a (n, native_dim) matrix to (n, target_dim)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        native_dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+        if native_dim == self.target_dim or len(embeddings) == 0:
+            return embeddings
+
+        if native_dim < self.target_dim:
+            padding = np.zeros((len(embeddings), self.target_dim - native_dim), dtype=np.float32)
+            return np.hstack([embeddings, padding])
+
+        if self._components is not None and self._components.shape[1] == native_dim:
+            reduced = (embeddings - self._mean) @ self._components.T
+        else:
+            reduced = embeddings[:, :self.target_dim]
+        return reduced / np.clip(np.linalg.norm(reduced, axis=1, keepdims=True), 1e-12, None)
+
+
+def pca_model_path(pca_dir: str, model_name: str, target_dim: int) -> str:
+    """Where fit_pca.py stores the projection for a model and dimension"""
+    return os.path.join(pca_dir, f"{model_name.replace('/', '__')}-{target_dim}.npz")
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for model inference
+
+    SentenceTransformer.encode is a blocking call; running it here keeps
+    the asyncio event loop free for heartbeats, consumers and /health.
+    At most max_workers calls run at once and max_queue more may wait for
+    a thread; further callers are held back before anything is submitted.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, name: str = "inference"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            with self._lock:
+                self._queued += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._call, fn, args, kwargs)
+        finally:
+            self._slots.release()
+
+    def _call(self, fn: Callable, args: tuple, kwargs: Dict) -> Any:
+        """Executed on a pool thread"""
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def stats(self) -> Dict:
+        """Pool occupancy; queue_depth counts calls not yet running"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self._queued + self._waiting,
+                "completed": self._completed,
+                "failed": self._failed
+            }
+
+    def shutdown(self):
+        """Stop the worker threads once pending calls finish"""
+        self._executor.shutdown(wait=True)
@@ -1,9 +1,19 @@
 import httpx
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict
-import os
+from typing import List, Dict, Optional, Tuple
 
 from config import settings
+from services.inference_backend import load_backend
+from services.inference_executor import InferenceExecutor
+from services.dim_reduction import DimensionReducer, pca_model_path
+from services.sparse_encoder import encode_query
+
+
+class EmbeddingModelMismatch(Exception):
+    """The field's index holds no vectors of the query embedding's model"""
+    
+    def __init__(self, message: str, active_model: Optional[str] = None):
+        super().__init__(message)
+        self.active_model = active_model
 
 
 class RAGService:
@@ -13,15 +23,20 @@ class RAGService:
         self.embedding_model = None
         self.vector_db_client = None
         self.ollama_client = None
+        self.inference = None
+        self.reducer = None
+        self.embedding_client = None
     
     async def initialize(self):
         """Initialize models and clients"""
-        # Initialize embedding model
-        os.makedirs(settings.HF_CACHE_DIR, exist_ok=True)
-        self.embedding_model = SentenceTransformer(
-            settings.HF_MODEL,
-            cache_folder=settings.HF_CACHE_DIR
-        )
+        if settings.EMBEDDING_SERVICE_URL:
+            # Query embeddings come from the shared embedding service
+            self.embedding_client = httpx.AsyncClient(
+                base_url=settings.EMBEDDING_SERVICE_URL,
+                timeout=settings.EMBEDDING_TIMEOUT
+            )
+        else:
+            self._load_local_model()
         
         # Initialize HTTP clients
         self.vector_db_client = httpx.AsyncClient(
@@ -35,7 +50,30 @@ class RAGService:
         
         print(f"RAG Service initialized for field: {settings.FIELD_NAME}")
     
-    async def process_query(self, query: str, max_results: int) -> Dict:
+    def _load_local_model(self):
+        """Load the embedding model in-process"""
+        # Initialize embedding model on the configured inference backend
+        self.embedding_model = load_backend(
+            settings.EMBEDDING_BACKEND,
+            settings.HF_MODEL,
+            cache_dir=settings.HF_CACHE_DIR,
+            onnx_dir=settings.ONNX_MODEL_DIR
+        )
+        
+        # Map query vectors to the index dimension, as the embedding service does
+        self.reducer = DimensionReducer(
+            settings.EMBEDDING_DIM,
+            method=settings.DIM_REDUCTION,
+            pca_path=pca_model_path(settings.PCA_MODEL_DIR, settings.HF_MODEL, settings.EMBEDDING_DIM)
+        )
+        
+        # Query embeddings run on a bounded pool so encode() never blocks the event loop
+        self.inference = InferenceExecutor(
+            max_workers=settings.INFERENCE_THREADS,
+            max_queue=settings.INFERENCE_MAX_QUEUE
+        )
+    
+    async def process_query(self, query: str, max_results: int, query_filter: Optional[Dict] = None) -> Dict:
         """
         Process a query using RAG
         
@@ -46,10 +84,13 @@ class RAGService:
         4. Generate answer using LLM
         """
         # Step 1: Generate query embedding
-        query_embedding = self._generate_query_embedding(query)
+        query_embedding, embedding_spec = await self._generate_query_embedding(query)
         
         # Step 2: Search vector DB
-        sources = await self._search_vector_db(query_embedding, max_results)
+        try:
+            sources = await self._search_vector_db(query_embedding, embedding_spec, max_results, query_filter, query)
+        except EmbeddingModelMismatch as e:
+            sources = await self._search_with_active_model(query, max_results, e, query_filter)
         
         if not sources:
             return {
@@ -73,56 +114,117 @@ class RAGService:
             "confidence": confidence
         }
     
-    def _generate_query_embedding(self, query: str) -> List[float]:
-        """Generate embedding for the query"""
-        embedding = self.embedding_model.encode(query, convert_to_tensor=False)
-        embedding_list = embedding.tolist()
-        
-        # Pad or truncate to match expected dimension (768)
-        target_dim = 768
-        if len(embedding_list) < target_dim:
-            # Pad with zeros
-            embedding_list.extend([0.0] * (target_dim - len(embedding_list)))
-        elif len(embedding_list) > target_dim:
-            # Truncate
-            embedding_list = embedding_list[:target_dim]
-        
-        return embedding_list
+    async def _generate_query_embedding(self, query: str, model: Optional[str] = None) -> Tuple[List[float], Dict]:
+        """Generate embedding for the query, with the model, dim and reduction that produced it"""
+        if self.embedding_client:
+            response = await self.embedding_client.post("/embed", json={"text": query, "model": model})
+            response.raise_for_status()
+            data = response.json()
+            return data["embedding"], data["spec"]
+        
+        embeddings = await self.inference.run(self.embedding_model.encode, [query])
+        return self.reducer.reduce(embeddings)[0].tolist(), {"model": settings.HF_MODEL, **self.reducer.describe()}
+    
+    async def _search_with_active_model(
+        self,
+        query: str,
+        max_results: int,
+        mismatch: EmbeddingModelMismatch,
+        query_filter: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Re-embed the query with the model the field is indexed with
+        
+        Only the embedding service can do that; an agent embedding queries
+        locally refuses to compare vectors of different models and returns
+        no sources.
+        """
+        if not self.embedding_client or not mismatch.active_model:
+            print(f"Refusing to search {settings.FIELD_NAME} with a mismatched query embedding: {mismatch}")
+            return []
+        try:
+            query_embedding, embedding_spec = await self._generate_query_embedding(query, model=mismatch.active_model)
+            return await self._search_vector_db(query_embedding, embedding_spec, max_results, query_filter, query)
+        except Exception as e:
+            print(f"Could not search {settings.FIELD_NAME} with its model {mismatch.active_model}: {e}")
+            return []
     
     async def _search_vector_db(
         self,
         query_embedding: List[float],
-        max_results: int
+        embedding_spec: Dict,
+        max_results: int,
+        query_filter: Optional[Dict] = None,
+        query: Optional[str] = None
     ) -> List[Dict]:
-        """Search vector database for relevant content"""
+        """
+        Search vector database for relevant content
+        
+        The vector DB routes the search to the field's collection for the
+        query's model; EmbeddingModelMismatch is raised when there is none.
+        query_filter (Qdrant filter JSON on tags, content_type, created_at,
+        ...) is applied by the vector DB during the search. With
+        HYBRID_SEARCH and the query text, its keywords are matched too and
+        the two rankings fused; a source's score is then its dense similarity.
+        Chunks of the same archive item collapse into its best-ranked one,
+        so up to max_results distinct items are returned.
+        """
+        request = {
+            "vector": query_embedding,
+            "limit": max_results * max(settings.SEARCH_OVERFETCH, 1),
+            "score_threshold": settings.SCORE_THRESHOLD,
+            "embedding": embedding_spec,
+            "filter": query_filter,
+            "hnsw_ef": settings.SEARCH_HNSW_EF or None
+        }
+        path = f"/api/v1/index/{settings.FIELD_NAME}/search"
+        if settings.HYBRID_SEARCH and query:
+            request["sparse_vector"] = encode_query(query)
+            path = f"{path}/hybrid"
         try:
-            response = await self.vector_db_client.post(
-                f"/api/v1/index/{settings.FIELD_NAME}/search",
-                json={
-                    "vector": query_embedding,
-                    "limit": max_results,
-                    "score_threshold": settings.SCORE_THRESHOLD
-                }
-            )
+            response = await self.vector_db_client.post(path, json=request)
+            if response.status_code == 409:
+                detail = response.json().get("detail")
+                raise EmbeddingModelMismatch(str(detail), active_model=self._active_model(detail))
             response.raise_for_status()
             results = response.json()
             
             # Format sources
             sources = []
+            seen = set()
             for result in results:
+                # Long documents are stored as several chunks; report the archive
+                # item id once, with its best-ranked chunk (results come best first)
+                item_id = result["payload"].get("item_id", result["id"])
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
                 sources.append({
-                    "id": result["id"],
+                    "id": item_id,
                     "content": result["payload"].get("content", ""),
-                    "score": result["score"],
+                    "score": result["score"] if result.get("similarity") is None else result["similarity"],
                     "metadata": result["payload"].get("metadata", {})
                 })
+                if len(sources) == max_results:
+                    break
             
             return sources
         
+        except EmbeddingModelMismatch:
+            raise
         except Exception as e:
             print(f"Vector search failed: {e}")
             return []
     
+    def _active_model(self, detail) -> Optional[str]:
+        """Model of the field's active collection, from a 409 search response"""
+        if not isinstance(detail, dict):
+            return None
+        for space in detail.get("available") or []:
+            if space.get("collection") == detail.get("active"):
+                return space.get("model")
+        return None
+    
     def _build_context(self, sources: List[Dict]) -> str:
         """Build context string from sources"""
         context_parts = []
@@ -184,9 +286,19 @@ Based on the context above, provide a helpful and accurate answer. If the contex
         top_scores = [s["score"] for s in sources[:3]]
         return sum(top_scores) / len(top_scores)
     
+    def inference_stats(self) -> Dict:
+        """Inference pool occupancy and queue depth"""
+        if self.embedding_client:
+            return {"remote": settings.EMBEDDING_SERVICE_URL}
+        return self.inference.stats() if self.inference else {}
+    
     async def close(self):
         """Close connections"""
         if self.vector_db_client:
             await self.vector_db_client.aclose()
         if self.ollama_client:
             await self.ollama_client.aclose()
+        if self.embedding_client:
+            await self.embedding_client.aclose()
+        if self.inference:
+            self.inference.shutdown()
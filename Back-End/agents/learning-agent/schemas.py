@@ -5,6 +5,9 @@ from typing import List, Dict, Optional
 class QueryRequest(BaseModel):
     query: str
     max_results: Optional[int] = None
+    # Qdrant filter JSON pushed down to the vector search, e.g.
+    # {"must": [{"key": "metadata.tags", "match": {"any": ["recipes"]}}]}
+    filter: Optional[Dict] = None
 
 
 class Source(BaseModel):
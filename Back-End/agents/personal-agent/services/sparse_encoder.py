@@ -0,0 +1,20 @@
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of the NFKC-normalized text, as the embedding service indexes them"""
+    return re.findall(r"\w+", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def term_id(term: str) -> int:
+    """Stable 31-bit id of a term; must match the embedding service's sparse_encoder"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "big") & 0x7FFFFFFF
+
+
+def encode_query(text: str) -> Dict[str, List]:
+    """Sparse BM25 query: weight 1 per distinct term, the vector DB applies IDF"""
+    indices = sorted({term_id(term) for term in tokenize(text)})
+    return {"indices": indices, "values": [1.0] * len(indices)}
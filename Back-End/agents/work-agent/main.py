@@ -71,7 +71,8 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "field": settings.FIELD_NAME
+        "field": settings.FIELD_NAME,
+        "inference": rag_service.inference_stats()
     }
 
 
@@ -83,7 +84,8 @@ async def query(request: QueryRequest):
     try:
         result = await rag_service.process_query(
             query=request.query,
-            max_results=request.max_results or settings.TOP_K_RESULTS
+            max_results=request.max_results or settings.TOP_K_RESULTS,
+            query_filter=request.filter
         )
         
         return QueryResponse(
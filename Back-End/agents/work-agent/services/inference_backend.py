@@ -0,0 +1,190 @@
+import json
+import os
+import numpy as np
+from typing import List
+
+
+class EmbeddingBackend:
+    """
+    Interface for the model that turns text into vectors
+
+    Backends expose encode() returning a float32 matrix with one row per
+    input text, plus the tokenizer and maximum sequence length that the
+    chunker needs. Select one with EMBEDDING_BACKEND:
+
+    - "torch": full-precision PyTorch SentenceTransformer (default)
+    - "torch-int8": the same model with Linear layers dynamically quantized to int8
+    - "onnx": the model exported to ONNX and run with onnxruntime
+    - "onnx-int8": the ONNX export with dynamic int8 quantization
+    """
+
+    name = "base"
+    tokenizer = None
+    max_seq_length = 512
+    # Whether a loaded instance keeps working in a forked child process
+    fork_safe = True
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        raise NotImplementedError
+
+
+class TorchBackend(EmbeddingBackend):
+    """PyTorch SentenceTransformer"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str, cache_dir: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, cache_folder=cache_dir)
+        self.tokenizer = getattr(self.model, "tokenizer", None)
+        self.max_seq_length = self.model.max_seq_length or 512
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return np.asarray(
+            self.model.encode(texts, convert_to_numpy=True, batch_size=batch_size),
+            dtype=np.float32
+        )
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch SentenceTransformer with int8 dynamically quantized Linear layers"""
+
+    name = "torch-int8"
+
+    def __init__(self, model_name: str, cache_dir: str):
+        import torch
+
+        super().__init__(model_name, cache_dir)
+        self.model = torch.quantization.quantize_dynamic(
+            self.model,
+            {torch.nn.Linear},
+            dtype=torch.qint8
+        )
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX export of a SentenceTransformer run with onnxruntime
+
+    The model is exported on first use into ONNX_MODEL_DIR (and quantized
+    there when quantize=True). Pooling and normalization follow the
+    sentence-transformers config shipped with the model, so vectors match
+    the PyTorch backend; run parity_check.py after changing models.
+    """
+
+    name = "onnx"
+    # onnxruntime's thread pool does not survive fork()
+    fork_safe = False
+
+    def __init__(self, model_name: str, cache_dir: str, onnx_dir: str, quantize: bool = False, threads: int = 0):
+        import onnxruntime
+        from huggingface_hub import snapshot_download
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        if quantize:
+            self.name = "onnx-int8"
+
+        source_dir = snapshot_download(model_name, cache_dir=cache_dir)
+        self._load_pooling_config(source_dir)
+
+        export_dir = os.path.join(onnx_dir, model_name.replace("/", "__"))
+        if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+            print(f"Exporting {model_name} to ONNX in {export_dir}...")
+            exported = ORTModelForFeatureExtraction.from_pretrained(source_dir, export=True)
+            exported.save_pretrained(export_dir)
+            AutoTokenizer.from_pretrained(source_dir).save_pretrained(export_dir)
+
+        file_name = "model.onnx"
+        if quantize:
+            file_name = self._quantize(export_dir)
+
+        # onnxruntime sizes its thread pool when the session is created
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            export_dir,
+            file_name=file_name,
+            session_options=session_options
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+
+    def _load_pooling_config(self, source_dir: str):
+        """Read pooling mode, normalization and max length from the sentence-transformers files"""
+        self.pooling = "mean"
+        self.normalize = False
+        self.max_seq_length = 512
+
+        modules_path = os.path.join(source_dir, "modules.json")
+        if os.path.exists(modules_path):
+            with open(modules_path) as f:
+                modules = json.load(f)
+            self.normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+            for module in modules:
+                if module.get("type", "").endswith("Pooling"):
+                    pooling_path = os.path.join(source_dir, module.get("path", ""), "config.json")
+                    if os.path.exists(pooling_path):
+                        with open(pooling_path) as f:
+                            pooling = json.load(f)
+                        if pooling.get("pooling_mode_cls_token"):
+                            self.pooling = "cls"
+
+        config_path = os.path.join(source_dir, "sentence_bert_config.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                self.max_seq_length = json.load(f).get("max_seq_length", self.max_seq_length)
+
+    def _quantize(self, export_dir: str) -> str:
+        """Dynamically quantize the exported model to int8 once, returning its file name"""
+        file_name = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            from optimum.onnxruntime import ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+            print(f"Quantizing ONNX model in {export_dir} to int8...")
+            quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+            quantizer.quantize(
+                save_dir=export_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            )
+        return file_name
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            hidden = np.asarray(self.model(**inputs).last_hidden_state, dtype=np.float32)
+            batches.append(self._pool(hidden, inputs["attention_mask"]))
+
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        if self.normalize and len(embeddings):
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def load_backend(backend: str, model_name: str, cache_dir: str, onnx_dir: str, threads: int = 0) -> EmbeddingBackend:
+    """Instantiate the configured embedding backend; threads=0 keeps the runtime default"""
+    os.makedirs(cache_dir, exist_ok=True)
+    if backend == "torch":
+        return TorchBackend(model_name, cache_dir)
+    if backend == "torch-int8":
+        return QuantizedTorchBackend(model_name, cache_dir)
+    if backend in ("onnx", "onnx-int8"):
+        os.makedirs(onnx_dir, exist_ok=True)
+        return OnnxBackend(model_name, cache_dir, onnx_dir, quantize=backend == "onnx-int8", threads=threads)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
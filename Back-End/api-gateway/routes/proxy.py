@@ -147,7 +147,7 @@ async def query_proxy(request: Request):
 
 
 # Vector DB Service Routes (admin access)
-@router.api_route("/index/{path:path}", methods=["GET", "POST", "DELETE"])
+@router.api_route("/index/{path:path}", methods=["GET", "POST", "PATCH", "DELETE"])
 async def vector_db_proxy(path: str, request: Request):
     """Proxy requests to vector db service"""
     logger.info(f"[VECTOR DB PROXY] {request.method} request to path: /{path}")
@@ -12,7 +12,17 @@ class Settings(BaseSettings):
     
     # RabbitMQ Configuration
     RABBITMQ_URL: str
-    EMBEDDING_QUEUE_NAME: str = "embedding_queue"
+    EMBEDDING_QUEUE_NAME: str = "embedding_queue"  # Interactive lane
+    EMBEDDING_BULK_QUEUE_NAME: str = "embedding_bulk_queue"  # Bulk imports and backfills
+    # Larger content is left out of queue messages and fetched by the consumer
+    EMBEDDING_INLINE_MAX_BYTES: int = 4096
+    
+    # Embedding fast path: short text items are embedded within the request
+    # and only fall back to the queue when the embedding service is busy
+    EMBEDDING_SERVICE_URL: str = "http://embedding-service:8002"
+    FAST_PATH_ENABLED: bool = True
+    FAST_PATH_MAX_CHARS: int = 2000
+    FAST_PATH_TIMEOUT_S: float = 2.0
     
     # MinIO Configuration
     MINIO_ENDPOINT: str
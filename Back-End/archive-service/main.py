@@ -2,7 +2,7 @@ from fastapi import FastAPI, UploadFile, File, Form, HTTPException, status, Depe
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-from typing import Optional, List
+from typing import Optional, List, Literal
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -11,13 +11,18 @@ from database import engine, get_db, Base
 from models.archive import ArchiveItem
 from services.file_service import FileService
 from services.instagram_service import InstagramService
-from services.message_queue import MessageQueueService
+from services.message_queue import MessageQueueService, content_hash
+from services.embedding_client import EmbeddingClient
 from services.location_service import LocationService
 from schemas import (
     TextArchiveRequest,
     InstagramArchiveRequest,
     UpdateArchiveRequest,
     EmbeddingStatusUpdate,
+    EmbeddingStatusBatchUpdate,
+    ContentBatchRequest,
+    ContentBatchResponse,
+    ItemContent,
     ArchiveResponse,
     ArchiveListResponse,
     LocationData,
@@ -30,6 +35,7 @@ file_service = FileService()
 instagram_service = InstagramService()
 location_service = LocationService()
 mq_service: Optional[MessageQueueService] = None
+embedding_client = EmbeddingClient()
 
 
 @asynccontextmanager
@@ -47,6 +53,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     if mq_service:
         await mq_service.close()
+    await embedding_client.close()
     await location_service.close()
     await engine.dispose()
 
@@ -127,6 +134,7 @@ async def create_text_archive(
     - **title**: Title of the content
     - **content**: The text content to archive
     - **tags**: Optional tags for better organization
+    - **priority**: Embedding lane, "interactive" (default) or "bulk" for imports
     """
     from sqlalchemy import select
     from sqlalchemy.ext.asyncio import AsyncSession
@@ -161,17 +169,29 @@ async def create_text_archive(
     await db.commit()
     await db.refresh(archive_item)
     
-    # Publish to embedding queue
-    await mq_service.publish_to_embedding_queue({
+    embedding_message = {
         "item_id": item_id,
         "field": request.field,
         "content_type": "text",
         "content": request.content,
         "metadata": {
             "title": request.title,
-            "tags": request.tags or []
+            "tags": request.tags or [],
+            "created_at": archive_item.created_at.isoformat()
         }
-    })
+    }
+    
+    # Short interactive notes are embedded before responding so they are
+    # searchable right away; everything else goes through the queue
+    embedded = False
+    if request.priority == "interactive" and embedding_client.accepts(request.content):
+        embedded = await embedding_client.ingest(embedding_message)
+    
+    if embedded:
+        # The embedding service updated the status through its callback
+        await db.refresh(archive_item)
+    else:
+        await mq_service.publish_to_embedding_queue(embedding_message, priority=request.priority)
     
     # Prepare location data for response
     location_response = None
@@ -205,7 +225,8 @@ async def create_file_archive(
     location_address: Optional[str] = Form(None),
     location_google_maps_url: Optional[str] = Form(None),
     location_latitude: Optional[float] = Form(None),
-    location_longitude: Optional[float] = Form(None)
+    location_longitude: Optional[float] = Form(None),
+    priority: Literal["interactive", "bulk"] = Form("interactive")
 ):
     """
     Archive file content
@@ -218,6 +239,7 @@ async def create_file_archive(
     - **location_google_maps_url**: Optional Google Maps URL
     - **location_latitude**: Optional latitude
     - **location_longitude**: Optional longitude
+    - **priority**: Embedding lane, "interactive" (default) or "bulk"
     """
     async for session in get_db():
         db = session
@@ -269,9 +291,10 @@ async def create_file_archive(
         "metadata": {
             "title": title,
             "file_name": file.filename,
-            "tags": tag_list
+            "tags": tag_list,
+            "created_at": archive_item.created_at.isoformat()
         }
-    })
+    }, priority=priority)
     
     # Prepare location data for response
     location_response = None
@@ -350,9 +373,10 @@ async def create_instagram_archive(request: InstagramArchiveRequest, db: AsyncSe
             "title": request.title,
             "instagram_url": str(request.instagram_url),
             "tags": request.tags or [],
+            "created_at": archive_item.created_at.isoformat(),
             **instagram_data["metadata"]
         }
-    })
+    }, priority=request.priority)
     
     # Prepare location data for response
     location_response = None
@@ -680,6 +704,103 @@ async def update_archive_item(
     )
 
 
+@app.post("/api/v1/archive/content", response_model=ContentBatchResponse)
+async def get_content_batch(
+    request: ContentBatchRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Fetch the content of many items in one call (claim-check lookups by the embedding service)"""
+    from sqlalchemy import select
+    
+    result = await db.execute(
+        select(ArchiveItem.id, ArchiveItem.content).where(ArchiveItem.id.in_(request.item_ids))
+    )
+    found = {item_id: content or "" for item_id, content in result.all()}
+    
+    return ContentBatchResponse(
+        items=[
+            ItemContent(item_id=item_id, content=content, content_hash=content_hash(content))
+            for item_id, content in found.items()
+        ],
+        missing=[item_id for item_id in request.item_ids if item_id not in found]
+    )
+
+
+def with_canonical_item(extra_metadata: Optional[dict], canonical_item_id: Optional[str]) -> Optional[dict]:
+    """extra_metadata linked to a canonical item, or without a stale link; None if unchanged"""
+    extra_metadata = dict(extra_metadata or {})
+    if canonical_item_id:
+        if extra_metadata.get("canonical_item_id") == canonical_item_id:
+            return None
+        extra_metadata["canonical_item_id"] = canonical_item_id
+    elif "canonical_item_id" in extra_metadata:
+        del extra_metadata["canonical_item_id"]
+    else:
+        return None
+    return extra_metadata
+
+
+def set_canonical_item(item: ArchiveItem, canonical_item_id: Optional[str]):
+    """Link a near-duplicate to its canonical item, or drop a stale link"""
+    extra_metadata = with_canonical_item(item.extra_metadata, canonical_item_id)
+    if extra_metadata is not None:
+        # Reassign so SQLAlchemy sees the JSON column change
+        item.extra_metadata = extra_metadata
+
+
+@app.patch("/api/v1/archive/embedding-status", status_code=status.HTTP_200_OK)
+async def update_embedding_status_batch(
+    request: EmbeddingStatusBatchUpdate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Update the embedding status of many archive items in one call (called by embedding service)"""
+    from sqlalchemy import select, update, or_
+    from datetime import datetime
+    
+    # Items sharing a status and timestamp are updated with a single statement
+    groups = {}
+    for entry in request.items:
+        groups.setdefault((entry.embedding_status, entry.embedding_created_at), []).append(entry.item_id)
+    
+    updated = 0
+    for (embedding_status, embedding_created_at), item_ids in groups.items():
+        values = {"embedding_status": embedding_status}
+        if embedding_created_at:
+            values["embedding_created_at"] = datetime.fromisoformat(embedding_created_at.replace('Z', '+00:00'))
+        result = await db.execute(
+            update(ArchiveItem).where(ArchiveItem.id.in_(item_ids)).values(**values)
+        )
+        updated += result.rowcount
+    
+    # Near-duplicates keep a link to their canonical item in extra_metadata;
+    # items embedded again on their own lose it. Only rows gaining a link or
+    # holding one are read, and only their metadata
+    canonical_ids = {entry.item_id: entry.canonical_item_id for entry in request.items}
+    linking = [item_id for item_id, canonical_item_id in canonical_ids.items() if canonical_item_id]
+    result = await db.execute(
+        select(ArchiveItem.id, ArchiveItem.extra_metadata).where(
+            ArchiveItem.id.in_(list(canonical_ids)),
+            or_(
+                ArchiveItem.id.in_(linking),
+                ArchiveItem.extra_metadata["canonical_item_id"].as_string().isnot(None)
+            )
+        )
+    )
+    for item_id, extra_metadata in result.all():
+        extra_metadata = with_canonical_item(extra_metadata, canonical_ids[item_id])
+        if extra_metadata is not None:
+            await db.execute(
+                update(ArchiveItem).where(ArchiveItem.id == item_id).values(extra_metadata=extra_metadata)
+            )
+    
+    await db.commit()
+    
+    return {
+        "message": "Embedding status updated",
+        "updated": updated
+    }
+
+
 @app.patch("/api/v1/archive/{item_id}/embedding-status", status_code=status.HTTP_200_OK)
 async def update_embedding_status(
     item_id: str,
@@ -700,20 +821,17 @@ async def update_embedding_status(
     
     # Update embedding status
     item.embedding_status = request.embedding_status
+    set_canonical_item(item, request.canonical_item_id)
     
     if request.embedding_created_at:
         item.embedding_created_at = datetime.fromisoformat(request.embedding_created_at.replace('Z', '+00:00'))
     
-    if request.embedding_vector:
-        item.embedding_vector = request.embedding_vector
-    
     await db.commit()
     
     return {
         "message": "Embedding status updated",
         "item_id": item_id,
-        "embedding_status": request.embedding_status,
-        "has_vector": request.embedding_vector is not None
+        "embedding_status": request.embedding_status
     }
 
 
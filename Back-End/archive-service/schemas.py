@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
 from datetime import datetime
 
 
@@ -17,6 +17,7 @@ class TextArchiveRequest(BaseModel):
     content: str
     tags: Optional[List[str]] = None
     location: Optional[LocationData] = None
+    priority: Literal["interactive", "bulk"] = "interactive"  # Embedding lane
 
 
 class InstagramArchiveRequest(BaseModel):
@@ -25,6 +26,7 @@ class InstagramArchiveRequest(BaseModel):
     instagram_url: HttpUrl
     tags: Optional[List[str]] = None
     location: Optional[LocationData] = None
+    priority: Literal["interactive", "bulk"] = "interactive"  # Embedding lane
 
 
 class UpdateArchiveRequest(BaseModel):
@@ -37,10 +39,47 @@ class UpdateArchiveRequest(BaseModel):
 
 
 class EmbeddingStatusUpdate(BaseModel):
-    """Request to update embedding status"""
-    embedding_status: str  # pending, processing, completed, failed
+    """Request to update embedding status (vectors live only in the vector DB)"""
+    embedding_status: str  # pending, processing, completed, failed, duplicate
     embedding_created_at: Optional[str] = None
-    embedding_vector: Optional[List[float]] = None  # The embedding vector
+    canonical_item_id: Optional[str] = None  # Item a "duplicate" was linked to
+
+
+class EmbeddingStatusBatchItem(EmbeddingStatusUpdate):
+    item_id: str
+
+
+class EmbeddingStatusBatchUpdate(BaseModel):
+    """Request to update the embedding status of many items"""
+    items: List[EmbeddingStatusBatchItem]
+
+
+class EmbeddingMessage(BaseModel):
+    """Embedding queue message, version 2 (see shared/models.py)"""
+    schema_version: int = 2
+    item_id: str
+    field: str
+    content_type: str
+    content_hash: str
+    content_length: int
+    content: Optional[str] = None  # Only inlined below EMBEDDING_INLINE_MAX_BYTES
+    metadata: Dict = {}
+
+
+class ContentBatchRequest(BaseModel):
+    """Request for the content of many archive items"""
+    item_ids: List[str]
+
+
+class ItemContent(BaseModel):
+    item_id: str
+    content: str
+    content_hash: str
+
+
+class ContentBatchResponse(BaseModel):
+    items: List[ItemContent]
+    missing: List[str]
 
 
 class ArchiveResponse(BaseModel):
@@ -54,7 +93,6 @@ class ArchiveResponse(BaseModel):
     location: Optional[LocationData] = None
     embedding_status: Optional[str] = "pending"
     embedding_created_at: Optional[datetime] = None
-    embedding_vector: Optional[List[float]] = None  # Include only when needed
     
     class Config:
         from_attributes = True
@@ -0,0 +1,41 @@
+import httpx
+from typing import Dict
+from config import settings
+
+
+class EmbeddingClient:
+    """Client for the embedding service's synchronous /ingest fast path"""
+    
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            base_url=settings.EMBEDDING_SERVICE_URL,
+            timeout=settings.FAST_PATH_TIMEOUT_S
+        )
+    
+    def accepts(self, content: str) -> bool:
+        """Whether an item is small enough for the fast path"""
+        return settings.FAST_PATH_ENABLED and len(content) <= settings.FAST_PATH_MAX_CHARS
+    
+    async def ingest(self, message: Dict) -> bool:
+        """
+        Embed and store an item within the request
+        
+        Returns False when the embedding service is busy, slow or down; the
+        caller then publishes the item to the queue instead. If the request
+        timed out the service may still finish it, which is harmless: the
+        queued copy upserts the same points again.
+        """
+        try:
+            response = await self.client.post("/ingest", json=message)
+        except httpx.HTTPError as e:
+            print(f"Fast-path embedding unavailable for {message['item_id']}: {e}")
+            return False
+        
+        if response.status_code != 200:
+            print(f"Fast-path embedding declined for {message['item_id']}: {response.status_code}")
+            return False
+        return True
+    
+    async def close(self):
+        """Close connection"""
+        await self.client.aclose()
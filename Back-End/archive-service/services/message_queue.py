@@ -1,7 +1,37 @@
 import aio_pika
-import json
+import hashlib
+import re
+import unicodedata
 from typing import Dict
 from config import settings
+from schemas import EmbeddingMessage
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the normalized text (NFC, collapsed whitespace); a copy of shared/utils.py's"""
+    normalized = unicodedata.normalize("NFC", text or "")
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def build_embedding_message(item: Dict) -> EmbeddingMessage:
+    """
+    Turn an item into a claim-check queue message
+    
+    The content travels in the message only up to EMBEDDING_INLINE_MAX_BYTES;
+    beyond that the consumer fetches it from /api/v1/archive/content.
+    """
+    content = item.get("content") or ""
+    encoded_length = len(content.encode("utf-8"))
+    return EmbeddingMessage(
+        item_id=item["item_id"],
+        field=item["field"],
+        content_type=item["content_type"],
+        content_hash=content_hash(content),
+        content_length=encoded_length,
+        content=content if encoded_length <= settings.EMBEDDING_INLINE_MAX_BYTES else None,
+        metadata=item.get("metadata", {})
+    )
 
 
 class MessageQueueService:
@@ -16,30 +46,44 @@ class MessageQueueService:
             self.connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
             self.channel = await self.connection.channel()
             
-            # Declare queue
+            # Declare the interactive and bulk lanes
             self.queue = await self.channel.declare_queue(
                 settings.EMBEDDING_QUEUE_NAME,
                 durable=True
             )
+            await self.channel.declare_queue(
+                settings.EMBEDDING_BULK_QUEUE_NAME,
+                durable=True
+            )
             
             print(f"Connected to RabbitMQ: {settings.EMBEDDING_QUEUE_NAME}")
         except Exception as e:
             print(f"Failed to connect to RabbitMQ: {e}")
     
-    async def publish_to_embedding_queue(self, message: Dict):
-        """Publish message to embedding queue"""
+    async def publish_to_embedding_queue(self, message: Dict, priority: str = "interactive"):
+        """
+        Publish message to embedding queue
+        
+        Items saved from the UI use the "interactive" lane; bulk imports use
+        the "bulk" lane, which the embedding service drains with a reserved
+        but smaller share of each batch. Messages are claim checks: large
+        content stays in the archive database (see build_embedding_message).
+        """
         if not self.channel:
             await self.connect()
         
+        queue_name = settings.EMBEDDING_BULK_QUEUE_NAME if priority == "bulk" else settings.EMBEDDING_QUEUE_NAME
         try:
+            body = build_embedding_message(message).model_dump_json(exclude_none=True)
             await self.channel.default_exchange.publish(
                 aio_pika.Message(
-                    body=json.dumps(message).encode(),
+                    body=body.encode(),
+                    content_type="application/json",
                     delivery_mode=aio_pika.DeliveryMode.PERSISTENT
                 ),
-                routing_key=settings.EMBEDDING_QUEUE_NAME
+                routing_key=queue_name
             )
-            print(f"Published message to queue: {message['item_id']}")
+            print(f"Published message to queue {queue_name}: {message['item_id']}")
         except Exception as e:
             print(f"Failed to publish message: {e}")
     
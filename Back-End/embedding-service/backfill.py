@@ -0,0 +1,218 @@
+"""
+Re-embed archive items straight from the archive database
+
+Streams archive_items with keyset pagination, runs them through the same
+chunk/embed/store pipeline as the queue consumer (bulk vector DB upserts
+and bulk archive status updates), and records the last finished id in a
+checkpoint file so an interrupted run resumes where it stopped.
+
+With --enqueue the items are published to the bulk embedding lane instead
+of being embedded in this process, as claim-check messages (see
+shared/models.py), so the running embedding service interleaves them with
+interactive work.
+
+Usage:
+    python backfill.py [--field FIELD ...] [--status failed ...]
+                       [--since 2024-01-01] [--until 2024-06-01]
+                       [--batch-size 64] [--concurrency 4]
+                       [--checkpoint backfill.checkpoint.json] [--restart]
+                       [--enqueue]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import aio_pika
+from datetime import datetime
+from typing import Dict, List
+from config import settings
+from services.archive_reader import ArchiveReader
+from services.embedding_generator import EmbeddingGenerator, load_secondary_generator
+from services.vector_store import VectorStoreService
+from services.ingest_pipeline import IngestPipeline
+from services.embedding_cache import content_hash
+from schemas import EmbeddingMessage, EMBEDDING_MESSAGE_VERSION
+
+
+def load_checkpoint(path: str, filters: Dict) -> Dict:
+    """Resume state for this filter set, or a fresh one"""
+    if os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("filters") == filters:
+            return checkpoint
+        print(f"Checkpoint {path} was written for other filters, starting over")
+    return {"filters": filters, "last_id": None, "processed": 0, "failed": 0, "failed_ids": []}
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """Write the checkpoint atomically so a crash never leaves it half-written"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+async def process_batch(pipeline: IngestPipeline, batch: List[Dict]) -> List[str]:
+    """Run one batch through the pipeline, returning the ids that failed"""
+    try:
+        errors = await pipeline.process(batch)
+    except Exception as e:
+        print(f"Batch of {len(batch)} item(s) failed: {e}")
+        return [item["item_id"] for item in batch]
+    return [item["item_id"] for item, error in zip(batch, errors) if error is not None]
+
+
+def claim_check(item: Dict) -> EmbeddingMessage:
+    """Queue message for an item, leaving out content above EMBEDDING_INLINE_MAX_BYTES"""
+    content = item["content"]
+    size = len(content.encode("utf-8"))
+    return EmbeddingMessage(
+        schema_version=EMBEDDING_MESSAGE_VERSION,
+        item_id=item["item_id"],
+        field=item["field"],
+        content_type=item["content_type"],
+        content_hash=content_hash(content),
+        content_length=size,
+        content=content if size <= settings.EMBEDDING_INLINE_MAX_BYTES else None,
+        metadata=item["metadata"]
+    )
+
+
+async def publish_batch(channel: aio_pika.abc.AbstractChannel, batch: List[Dict]) -> List[str]:
+    """Publish one batch to the bulk embedding lane, returning the ids that failed"""
+    failed = []
+    for item in batch:
+        try:
+            await channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=claim_check(item).model_dump_json(exclude_none=True).encode(),
+                    content_type="application/json",
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=settings.EMBEDDING_BULK_QUEUE_NAME
+            )
+        except Exception as e:
+            print(f"Failed to publish item {item['item_id']}: {e}")
+            failed.append(item["item_id"])
+    return failed
+
+
+async def run(args):
+    filters = {
+        "fields": args.field,
+        "statuses": args.status,
+        "since": args.since,
+        "until": args.until
+    }
+    checkpoint = load_checkpoint(args.checkpoint, filters)
+    if args.restart:
+        checkpoint = {"filters": filters, "last_id": None, "processed": 0, "failed": 0, "failed_ids": []}
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+
+    reader = ArchiveReader(args.database_url)
+    await reader.connect()
+
+    connection = None
+    embedding_generator = None
+    vector_store = None
+    pipeline = None
+    if args.enqueue:
+        connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+        channel = await connection.channel()
+        await channel.declare_queue(settings.EMBEDDING_BULK_QUEUE_NAME, durable=True)
+        handle_batch = lambda batch: publish_batch(channel, batch)
+        target = f"queue {settings.EMBEDDING_BULK_QUEUE_NAME}"
+    else:
+        print("Loading embedding generator...")
+        embedding_generator = EmbeddingGenerator()
+        vector_store = VectorStoreService()
+        pipeline = IngestPipeline(embedding_generator, vector_store, load_secondary_generator())
+        handle_batch = lambda batch: process_batch(pipeline, batch)
+        target = embedding_generator.model_id
+
+    try:
+        remaining = await reader.count(args.field, args.status, since, until, after_id=checkpoint["last_id"])
+        if checkpoint["last_id"]:
+            print(f"Resuming after {checkpoint['last_id']} ({checkpoint['processed']} item(s) already done)")
+        print(f"{remaining} item(s) to send to {target}")
+
+        started = time.monotonic()
+        done = 0
+        # A page holds one batch per concurrent worker; the checkpoint only
+        # advances once every batch of the page has finished
+        page_size = args.batch_size * args.concurrency
+        async for page in reader.stream(
+            args.field,
+            args.status,
+            since,
+            until,
+            after_id=checkpoint["last_id"],
+            page_size=page_size
+        ):
+            batches = [page[start:start + args.batch_size] for start in range(0, len(page), args.batch_size)]
+            results = await asyncio.gather(*[handle_batch(batch) for batch in batches])
+            failed_ids = [item_id for ids in results for item_id in ids]
+
+            done += len(page)
+            checkpoint["last_id"] = page[-1]["item_id"]
+            checkpoint["processed"] += len(page) - len(failed_ids)
+            checkpoint["failed"] += len(failed_ids)
+            checkpoint["failed_ids"] = (checkpoint["failed_ids"] + failed_ids)[-1000:]
+            save_checkpoint(args.checkpoint, checkpoint)
+
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed > 0 else 0.0
+            eta = (remaining - done) / rate if rate > 0 else 0.0
+            print(
+                f"{done}/{remaining} items ({done / max(remaining, 1):.1%}), "
+                f"{rate:.1f} items/s, {len(failed_ids)} failed in page, ETA {eta / 60:.1f} min"
+                + (f", cache hit ratio {embedding_generator.cache_stats()['hit_ratio']}" if embedding_generator else "")
+                + (f", {pipeline.dedup_stats().get('duplicates', 0)} near-duplicates linked" if pipeline else "")
+            )
+
+        elapsed = time.monotonic() - started
+        print(
+            f"Backfill finished: {checkpoint['processed']} {'queued' if args.enqueue else 'embedded'}, "
+            f"{checkpoint['failed']} failed "
+            f"in {elapsed / 60:.1f} min"
+        )
+        if checkpoint["failed_ids"]:
+            print(f"Failed item ids are listed in {args.checkpoint}; rerun with --status failed to retry them")
+    finally:
+        await reader.close()
+        if connection:
+            await connection.close()
+        if pipeline:
+            await pipeline.close()
+        if vector_store:
+            await vector_store.close()
+        if embedding_generator:
+            await embedding_generator.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed archive items from the archive database")
+    parser.add_argument("--field", action="append", help="Only this field (repeatable)")
+    parser.add_argument("--status", action="append", help="Only items with this embedding status (repeatable)")
+    parser.add_argument("--since", help="Only items created at or after this ISO date")
+    parser.add_argument("--until", help="Only items created before this ISO date")
+    parser.add_argument("--batch-size", type=int, default=64, help="Items per pipeline call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batches in flight")
+    parser.add_argument("--checkpoint", default="backfill.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    parser.add_argument("--enqueue", action="store_true", help="Publish to the bulk lane instead of embedding here")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("DATABASE_URL is not set")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
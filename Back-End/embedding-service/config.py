@@ -8,28 +8,126 @@ class Settings(BaseSettings):
     
     # RabbitMQ Configuration
     RABBITMQ_URL: str
-    EMBEDDING_QUEUE_NAME: str = "embedding_queue"
+    EMBEDDING_QUEUE_NAME: str = "embedding_queue"  # Interactive lane
+    EMBEDDING_BULK_QUEUE_NAME: str = "embedding_bulk_queue"  # Bulk imports and backfills
     
     # Ollama Configuration
     OLLAMA_URL: str = "http://ollama:11434"
     OLLAMA_MODEL: str = "llama2"
+    OLLAMA_BATCH_SIZE: int = 32  # Texts per /api/embed request
+    OLLAMA_MAX_CONCURRENCY: int = 4  # In-flight embedding requests
     
     # HuggingFace Configuration
-    HF_MODEL: str = "google/gemma-2-2b-it"
+    HF_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"  # Same model as the agents
     HF_CACHE_DIR: str = "/app/models_cache"
     
+    # Inference backend: "torch", "torch-int8", "onnx" or "onnx-int8"
+    EMBEDDING_BACKEND: str = "torch"
+    ONNX_MODEL_DIR: str = "/app/models_cache/onnx"
+    
     # Embedding Strategy: "ollama" or "huggingface"
-    EMBEDDING_STRATEGY: str = "huggingface"  # Use HuggingFace with 768 dimensions
+    EMBEDDING_STRATEGY: str = "huggingface"
+    
+    # Model migration: when set, every item is also embedded with this
+    # HuggingFace model and written to that model's collections (dual-write)
+    SECONDARY_HF_MODEL: str = ""
+    
+    # Index dimension: wider model output is reduced with DIM_REDUCTION
+    # ("matryoshka" or "pca"), narrower output is zero-padded
+    EMBEDDING_DIM: int = 384
+    DIM_REDUCTION: str = "matryoshka"
+    PCA_MODEL_DIR: str = "/app/models_cache/pca"
+    
+    # Circuit breaker on the fallback strategy
+    FALLBACK_FAILURE_THRESHOLD: int = 5
+    FALLBACK_RESET_TIMEOUT_S: int = 30
+    
+    # Embedding Cache Configuration
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 10000  # In-process LRU tier
+    
+    # Redis Configuration (optional shared cache tier, disabled when REDIS_HOST is empty)
+    REDIS_HOST: str = ""
+    REDIS_PORT: int = 6379
+    REDIS_DB: int = 2
+    CACHE_REDIS_MAX_ENTRIES: int = 200000
     
     # Vector DB Configuration
     VECTOR_DB_SERVICE_URL: str
     
-    # Archive Service Configuration (for status callbacks)
+    # Archive database, read by fit_pca.py
+    DATABASE_URL: str = ""
+    
+    # Archive Service Configuration (for status callbacks and claim-check content)
     ARCHIVE_SERVICE_URL: str = "http://archive-service:8001"
+    CONTENT_FETCH_BATCH_SIZE: int = 200
+    EMBEDDING_INLINE_MAX_BYTES: int = 4096  # Used when backfill.py publishes to the queue
     
     # Processing Configuration
     BATCH_SIZE: int = 10
-    MAX_WORKERS: int = 2
+    MAX_WORKERS: int = 2  # Messages in flight in single mode when concurrency is not adaptive
+    
+    # Adaptive concurrency (AIMD) on in-flight batches (messages in single mode):
+    # every CONCURRENCY_WINDOW completions the limit grows by one while work is
+    # waiting, or shrinks by CONCURRENCY_DECREASE_FACTOR when the p90 latency or
+    # the downstream error rate is over target. Prefetch follows the limit
+    CONCURRENCY_ADAPTIVE: bool = True
+    CONCURRENCY_MIN: int = 1
+    CONCURRENCY_MAX: int = 8
+    CONCURRENCY_TARGET_LATENCY_MS: int = 5000
+    CONCURRENCY_MAX_ERROR_RATE: float = 0.05
+    CONCURRENCY_DECREASE_FACTOR: float = 0.5
+    CONCURRENCY_WINDOW: int = 10
+    
+    # Consumer mode: "batch" (micro-batching) or "single" (one message at a time)
+    CONSUMER_MODE: str = "batch"
+    BATCH_MAX_WAIT_MS: int = 50  # Close a partial batch after this window
+    BULK_MIN_SHARE: float = 0.2  # Share of each batch kept for the bulk lane while it has work
+    
+    # Retry Configuration: failed messages are retried with exponential backoff,
+    # then moved to the "<queue>.dead" dead-letter queue
+    MAX_DELIVERY_ATTEMPTS: int = 5
+    RETRY_BASE_DELAY_MS: int = 2000
+    RETRY_MAX_DELAY_MS: int = 300000
+    
+    # Chunking: long documents are split into overlapping token windows
+    CHUNK_MAX_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 32
+    
+    # Near-duplicate detection: items whose SimHash is within DEDUP_MAX_DISTANCE
+    # bits of an indexed item of the same field are linked to it, not embedded
+    # (the index is kept in Redis when REDIS_HOST is set)
+    DEDUP_ENABLED: bool = True
+    DEDUP_MAX_DISTANCE: int = 3
+    DEDUP_MIN_TOKENS: int = 8
+    
+    # Sparse BM25 term weights stored with every chunk for hybrid search
+    # (the vector DB applies IDF); the average length is in word tokens
+    SPARSE_ENABLED: bool = True
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    BM25_AVG_DOC_TOKENS: float = 150.0
+    
+    # Inference pool: model calls run off the event loop on these threads
+    INFERENCE_THREADS: int = 1
+    INFERENCE_MAX_QUEUE: int = 32
+    
+    # Worker processes: above 1, the model is loaded once and this many
+    # consumer processes are forked from it (WORKER_THREADS=0 splits the cores)
+    WORKER_PROCESSES: int = 1
+    WORKER_THREADS: int = 0
+    WORKER_STATS_INTERVAL_S: float = 10.0
+    WORKER_SHUTDOWN_TIMEOUT_S: float = 30.0
+    
+    # Embedding HTTP API: concurrent /embed requests are batched together
+    EMBED_MAX_BATCH_SIZE: int = 64  # Texts per model call
+    EMBED_MAX_WAIT_MS: int = 5  # How long a request may wait for others to join
+    EMBED_MAX_TEXTS_PER_REQUEST: int = 256
+    EMBED_TIMEOUT_S: float = 30.0
+    
+    # Synchronous /ingest fast path: requests beyond this many in flight get
+    # 429 so the caller falls back to the queue
+    INGEST_MAX_CONCURRENCY: int = 4
     
     class Config:
         env_file = ".env"
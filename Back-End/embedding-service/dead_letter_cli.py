@@ -0,0 +1,59 @@
+"""
+Inspect and replay the embedding dead-letter queue
+
+Usage:
+    python dead_letter_cli.py count
+    python dead_letter_cli.py list [--limit 50]
+    python dead_letter_cli.py replay [--limit N] [--item-id ID ...]
+    python dead_letter_cli.py purge --yes
+"""
+import argparse
+import asyncio
+import json
+from config import settings
+from services.dead_letter_admin import DeadLetterAdmin
+
+
+async def run(args):
+    admin = DeadLetterAdmin(args.queue)
+    await admin.connect()
+    try:
+        if args.command == "count":
+            print(f"{admin.dead_queue_name}: {await admin.count()} message(s)")
+        elif args.command == "list":
+            for entry in await admin.list(limit=args.limit):
+                print(json.dumps(entry, default=str))
+        elif args.command == "replay":
+            replayed = await admin.replay(limit=args.limit, item_ids=args.item_id)
+            print(f"Replayed {replayed} message(s) from {admin.dead_queue_name}")
+        elif args.command == "purge":
+            if not args.yes:
+                print("Refusing to purge without --yes")
+                return
+            print(f"Purged {await admin.purge()} message(s) from {admin.dead_queue_name}")
+    finally:
+        await admin.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding dead-letter queue admin")
+    parser.add_argument("--queue", default=settings.EMBEDDING_QUEUE_NAME, help="Source queue name")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    subcommands.add_parser("count", help="Show how many messages are dead-lettered")
+
+    list_parser = subcommands.add_parser("list", help="Show dead letters without removing them")
+    list_parser.add_argument("--limit", type=int, default=50)
+
+    replay_parser = subcommands.add_parser("replay", help="Send dead letters back for processing")
+    replay_parser.add_argument("--limit", type=int, default=None)
+    replay_parser.add_argument("--item-id", action="append", help="Only replay these items (repeatable)")
+
+    purge_parser = subcommands.add_parser("purge", help="Delete all dead letters")
+    purge_parser.add_argument("--yes", action="store_true")
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Fit the PCA projection used by DIM_REDUCTION=pca
+
+Samples archive text from the archive database, embeds it with the
+configured HuggingFace model and backend, and stores the mean and the top
+--dim principal components where EmbeddingGenerator and the field agents
+look for them (PCA_MODEL_DIR). Copy the file to every agent's
+models_cache so query vectors land in the same space, and re-embed
+existing items after changing the projection.
+
+Usage:
+    python fit_pca.py [--dim 256] [--sample 20000] [--field FIELD]
+"""
+import argparse
+import asyncio
+import os
+import asyncpg
+import numpy as np
+from config import settings
+from services.inference_backend import load_backend
+from services.dim_reduction import pca_model_path
+
+
+async def sample_texts(database_url: str, sample: int, field: str = None):
+    """Random sample of non-empty archive contents"""
+    # asyncpg takes a plain postgresql:// URL
+    connection = await asyncpg.connect(database_url.replace("postgresql+asyncpg://", "postgresql://"))
+    try:
+        query = "SELECT content FROM archive_items WHERE content IS NOT NULL AND content <> ''"
+        args = []
+        if field:
+            query += " AND field = $1"
+            args.append(field)
+        query += f" ORDER BY random() LIMIT {int(sample)}"
+        rows = await connection.fetch(query, *args)
+        return [row["content"] for row in rows]
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a PCA projection for embedding dimension reduction")
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM, help="Output dimension")
+    parser.add_argument("--sample", type=int, default=20000, help="Archive items to sample")
+    parser.add_argument("--field", help="Only sample this field")
+    parser.add_argument("--model", default=settings.HF_MODEL)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("DATABASE_URL is not set")
+
+    texts = asyncio.run(sample_texts(args.database_url, args.sample, args.field))
+    if len(texts) <= args.dim:
+        parser.error(f"Need more than {args.dim} archive items to fit {args.dim} components, found {len(texts)}")
+
+    backend = load_backend(settings.EMBEDDING_BACKEND, args.model, settings.HF_CACHE_DIR, settings.ONNX_MODEL_DIR)
+    print(f"Embedding {len(texts)} texts with {args.model} ({backend.name})...")
+    embeddings = backend.encode(texts, batch_size=settings.BATCH_SIZE)
+    if embeddings.shape[1] <= args.dim:
+        parser.error(f"Model output is {embeddings.shape[1]}-d; PCA only applies above --dim {args.dim}")
+
+    mean = embeddings.mean(axis=0)
+    _, singular_values, components = np.linalg.svd(embeddings - mean, full_matrices=False)
+    variance = singular_values ** 2
+    explained = variance[:args.dim].sum() / variance.sum()
+
+    path = pca_model_path(settings.PCA_MODEL_DIR, args.model, args.dim)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(
+        path,
+        mean=mean.astype(np.float32),
+        components=components[:args.dim].astype(np.float32),
+        explained_variance_ratio=np.float32(explained)
+    )
+    print(f"PCA {embeddings.shape[1]} -> {args.dim}: {explained:.1%} of variance kept")
+    print(f"Saved projection to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,318 @@
 import asyncio
-import json
-import aio_pika
-from typing import Dict
+import functools
+import time
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
 from config import settings
-from services.embedding_generator import EmbeddingGenerator
+from services.embedding_generator import EmbeddingGenerator, load_secondary_generator
 from services.vector_store import VectorStoreService
+from services.ingest_pipeline import IngestPipeline
+from services.queue_consumer import QueueConsumer
+from services.dynamic_batcher import DynamicBatcher
+from services.worker_supervisor import WorkerSupervisor
+from schemas import (
+    EmbedRequest,
+    EmbedResponse,
+    BatchEmbedRequest,
+    BatchEmbedResponse,
+    IngestRequest,
+    IngestResponse
+)
 
-print("=" * 60)
-print("EMBEDDING SERVICE - Initializing...")
-print("=" * 60)
-
-# Initialize services
-print("Loading embedding generator...")
-embedding_generator = EmbeddingGenerator()
-print("✓ Embedding generator loaded")
-
-print("Loading vector store service...")
-vector_store = VectorStoreService()
-print("✓ Vector store service loaded")
-
-
-async def process_message(message: aio_pika.IncomingMessage):
-    """Process a message from the queue"""
-    async with message.process():
-        try:
-            # Parse message
-            data = json.loads(message.body.decode())
-            
-            print(f"Processing item: {data['item_id']}")
-            
-            # Generate embedding
-            embedding = await embedding_generator.generate_embedding(
-                data['content'],
-                data.get('content_type', 'text')
-            )
-            
-            print(f"Sample embedding (first 5 dims): {embedding[:5]}...")
-            
-            # Store in vector database
-            await vector_store.store_embedding(
-                item_id=data['item_id'],
-                field=data['field'],
-                embedding=embedding,
-                content=data['content'],
-                metadata=data.get('metadata', {})
-            )
-            
-            print(f"Successfully processed item: {data['item_id']}")
-        
-        except Exception as e:
-            print(f"Error processing message: {e}")
-            # In production, implement dead letter queue
+app = FastAPI(
+    title="OmniA Embedding Service",
+    description="Generates embeddings for archived content",
+    version="1.0.0"
+)
 
 
-async def main():
-    """Main consumer loop"""
-    print(f"Starting Embedding Service...")
-    print(f"Connecting to RabbitMQ: {settings.RABBITMQ_URL}")
-    
-    # Connect to RabbitMQ
-    connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+class ServiceState:
+    """Startup lifecycle: loading_model -> warming_up -> running, or failed"""
+
+    def __init__(self):
+        self.status = "starting"
+        self.error: Optional[str] = None
+        self.started_at = time.monotonic()
+        self.model_load_seconds: Optional[float] = None
+        self.warm_up_seconds: Optional[float] = None
+        self.embedding_generator: Optional[EmbeddingGenerator] = None
+        self.secondary_generator: Optional[EmbeddingGenerator] = None
+        self.vector_store: Optional[VectorStoreService] = None
+        self.consumer: Optional[QueueConsumer] = None
+        self.batcher: Optional[DynamicBatcher] = None
+        self.supervisor: Optional[WorkerSupervisor] = None
+        self.pipeline: Optional[IngestPipeline] = None
+        self.ingest_in_flight = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+state = ServiceState()
+
+
+def embed_batcher(generator: EmbeddingGenerator) -> DynamicBatcher:
+    """
+    Batch scheduler for /embed requests to the primary model
     
-    async with connection:
-        channel = await connection.channel()
-        await channel.set_qos(prefetch_count=settings.MAX_WORKERS)
-        
-        # Declare queue
-        queue = await channel.declare_queue(
-            settings.EMBEDDING_QUEUE_NAME,
-            durable=True
-        )
+    Callers search stored vectors with these, so a fallback-model vector
+    labelled with the primary spec would match the wrong space; a failing
+    primary answers 500 instead.
+    """
+    return DynamicBatcher(
+        functools.partial(generator.generate_batch_embeddings, allow_fallback=False),
+        max_batch_size=settings.EMBED_MAX_BATCH_SIZE,
+        max_wait_ms=settings.EMBED_MAX_WAIT_MS
+    )
+
+
+async def start_service():
+    """Load the model in the background, warm it up, then start consuming"""
+    try:
+        state.status = "loading_model"
+        if state.supervisor:
+            # The supervisor loaded the model before forking the workers
+            state.embedding_generator = EmbeddingGenerator(backend=state.supervisor.backend)
+            state.model_load_seconds = state.supervisor.model_load_seconds
+        else:
+            print(f"Loading embedding generator ({settings.EMBEDDING_BACKEND}: {settings.HF_MODEL})...")
+            load_started = time.monotonic()
+            # Model download and load are blocking; keep them off the event loop
+            # so /health answers while they run
+            state.embedding_generator = await asyncio.get_running_loop().run_in_executor(None, EmbeddingGenerator)
+            state.model_load_seconds = round(time.monotonic() - load_started, 2)
+            print(f"✓ Embedding generator loaded in {state.model_load_seconds}s")
+
+        state.status = "warming_up"
+        warm_up_started = time.monotonic()
+        await state.embedding_generator.warm_up()
+        state.warm_up_seconds = round(time.monotonic() - warm_up_started, 2)
+        print(f"✓ Model warmed up in {state.warm_up_seconds}s")
+
+        if settings.SECONDARY_HF_MODEL:
+            # Model migration: embed everything with the new model as well
+            print(f"Loading secondary model for dual-write ({settings.SECONDARY_HF_MODEL})...")
+            state.secondary_generator = await asyncio.get_running_loop().run_in_executor(None, load_secondary_generator)
+            await state.secondary_generator.warm_up()
+            print("✓ Secondary model loaded")
+
+        # Serve the embedding API as soon as the model is warm
+        state.batcher = embed_batcher(state.embedding_generator)
+        state.batcher.start()
         
-        print(f"Waiting for messages on queue: {settings.EMBEDDING_QUEUE_NAME}")
+        state.vector_store = VectorStoreService()
+        state.pipeline = IngestPipeline(state.embedding_generator, state.vector_store, state.secondary_generator)
         
-        # Start consuming
-        await queue.consume(process_message)
+        if state.supervisor:
+            # Worker processes consume the queues; this process serves HTTP
+            state.status = "running"
+            await state.supervisor.monitor()
+            return
         
-        # Wait forever
-        await asyncio.Future()
+        state.consumer = QueueConsumer(state.pipeline)
 
+        state.status = "running"
+        await state.consumer.run()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        state.status = "failed"
+        state.error = str(e)
+        print(f"Embedding service failed to start: {e}")
 
-if __name__ == "__main__":
+
+@app.on_event("startup")
+async def startup():
+    """Start the model load and consumer without blocking the HTTP server"""
+    print("=" * 60)
+    print("EMBEDDING SERVICE - Initializing...")
+    print("=" * 60)
+    state.task = asyncio.create_task(start_service())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop consuming and release the model"""
+    if state.consumer:
+        await state.consumer.stop(timeout=settings.WORKER_SHUTDOWN_TIMEOUT_S)
+    if state.supervisor:
+        await asyncio.get_running_loop().run_in_executor(None, state.supervisor.stop)
+    if state.batcher:
+        await state.batcher.stop()
+    if state.task:
+        state.task.cancel()
+    if state.pipeline:
+        await state.pipeline.close()
+    if state.vector_store:
+        await state.vector_store.close()
+    if state.embedding_generator:
+        await state.embedding_generator.close()
+
+
+def service_status() -> dict:
+    status = {
+        "status": state.status,
+        "uptime_seconds": round(time.monotonic() - state.started_at, 2),
+        "model": {
+            "backend": settings.EMBEDDING_BACKEND,
+            "name": settings.HF_MODEL,
+            "load_seconds": state.model_load_seconds,
+            "warm_up_seconds": state.warm_up_seconds,
+            "secondary": settings.SECONDARY_HF_MODEL or None
+        },
+        "consumer": state.consumer.stats() if state.consumer else {"state": "not_started"}
+    }
+    if state.supervisor:
+        status["consumer"] = {"state": "supervised", **state.supervisor.stats()}
+    if state.error:
+        status["error"] = state.error
+    if state.embedding_generator:
+        status["inference"] = state.embedding_generator.inference_stats()
+        status["cache"] = state.embedding_generator.cache_stats()
+        status["fallback"] = state.embedding_generator.fallback_stats()
+    if state.batcher:
+        status["embed_api"] = state.batcher.stats()
+    if state.pipeline:
+        status["dedup"] = state.pipeline.dedup_stats()
+    return status
+
+
+@app.get("/")
+async def root():
+    return {
+        "service": "OmniA Embedding Service",
+        "version": "1.0.0",
+        "status": state.status
+    }
+
+
+@app.get("/health")
+async def health_check():
+    """Liveness: the process is up and startup has not failed"""
+    status = service_status()
+    # The startup task only finishes if startup failed or the consumer stopped
+    if state.status == "failed" or (state.task and state.task.done()):
+        raise HTTPException(status_code=503, detail=status)
+    if state.supervisor and state.supervisor.any_exited:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: the model is warmed up and messages are being consumed"""
+    status = service_status()
+    if state.supervisor:
+        consuming = state.supervisor.all_consuming
+    else:
+        consuming = state.consumer is not None and state.consumer.state == "consuming"
+    if state.status != "running" or not consuming:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+
+def generator_for(model: Optional[str]) -> EmbeddingGenerator:
+    """The primary generator, or the loaded one producing vectors of the requested model"""
+    if state.embedding_generator is None:
+        raise HTTPException(status_code=503, detail=f"Embedding model not ready ({state.status})")
+    for generator in (state.embedding_generator, state.secondary_generator):
+        if generator and (model is None or generator.embedding_spec["model"] == model):
+            return generator
+    raise HTTPException(
+        status_code=404,
+        detail=f"Model {model} is not loaded (primary: {state.embedding_generator.embedding_spec['model']}, "
+               f"secondary: {settings.SECONDARY_HF_MODEL or None})"
+    )
+
+
+async def embed_texts(texts: List[str], generator: EmbeddingGenerator) -> List[List[float]]:
+    """Embed texts, through the shared batch scheduler for the primary model"""
+    if state.batcher is None:
+        raise HTTPException(status_code=503, detail=f"Embedding model not ready ({state.status})")
+    if generator is state.embedding_generator:
+        pending = state.batcher.submit(texts)
+    else:
+        pending = generator.generate_batch_embeddings(texts, allow_fallback=False)
     try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        print("Shutting down...")
+        return await asyncio.wait_for(pending, timeout=settings.EMBED_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Embedding timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Embedding failed: {e}")
+
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed(request: EmbedRequest):
+    """Embed one text, e.g. a search query"""
+    generator = generator_for(request.model)
+    embedding = (await embed_texts([request.text], generator))[0]
+    return EmbedResponse(
+        embedding=embedding,
+        model=generator.model_id,
+        dim=len(embedding),
+        spec=generator.embedding_spec
+    )
+
+
+@app.post("/embed/batch", response_model=BatchEmbedResponse)
+async def embed_batch(request: BatchEmbedRequest):
+    """Embed several texts; vectors are returned in input order"""
+    if len(request.texts) > settings.EMBED_MAX_TEXTS_PER_REQUEST:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.EMBED_MAX_TEXTS_PER_REQUEST} texts per request"
+        )
+    generator = generator_for(request.model)
+    embeddings = await embed_texts(request.texts, generator)
+    return BatchEmbedResponse(
+        embeddings=embeddings,
+        model=generator.model_id,
+        dim=len(embeddings[0]) if embeddings else 0,
+        spec=generator.embedding_spec
+    )
+
+
+@app.post("/ingest", response_model=IngestResponse)
+async def ingest(request: IngestRequest):
+    """
+    Chunk, embed and store one item within the request
+    
+    Same pipeline as the queue consumer, for callers that want an item
+    searchable before they respond. Answers 429 when INGEST_MAX_CONCURRENCY
+    ingests are already running, and 502 when the item was stored but its
+    archive status could not be updated; callers should fall back to the
+    queue.
+    """
+    if state.pipeline is None:
+        raise HTTPException(status_code=503, detail=f"Embedding model not ready ({state.status})")
+    if state.ingest_in_flight >= settings.INGEST_MAX_CONCURRENCY:
+        raise HTTPException(status_code=429, detail="Ingest capacity exhausted, use the queue")
+    
+    item = request.model_dump()
+    state.ingest_in_flight += 1
+    try:
+        error = (await state.pipeline.process([item]))[0]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ingest failed: {e}")
+    finally:
+        state.ingest_in_flight -= 1
+    
+    if error is not None:
+        raise HTTPException(status_code=502, detail=str(error))
+    if not item.get("status_reported", True):
+        raise HTTPException(status_code=502, detail="Stored, but the archive status update failed")
+    if item.get("canonical_item_id"):
+        return IngestResponse(item_id=request.item_id, status="duplicate", canonical_item_id=item["canonical_item_id"])
+    return IngestResponse(item_id=request.item_id, status="completed")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    if settings.WORKER_PROCESSES > 1:
+        # Fork before the HTTP server starts any threads; the parent then
+        # serves /health, /ready and /embed while the workers consume
+        state.supervisor = WorkerSupervisor(settings.WORKER_PROCESSES)
+        state.supervisor.start()
+        import torch
+        torch.set_num_threads(state.supervisor.threads)
+    
+    uvicorn.run(app, host="0.0.0.0", port=settings.PORT)
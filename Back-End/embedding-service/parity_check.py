@@ -0,0 +1,69 @@
+"""
+Compare an alternative inference backend against the PyTorch reference
+
+Embeds a set of texts with the "torch" backend and with the backend under
+test, then reports the cosine similarity between matching vectors. Exits
+with status 1 when any pair falls below --min-cosine.
+
+Usage:
+    python parity_check.py --backend onnx-int8 [--texts-file samples.txt] [--min-cosine 0.99]
+"""
+import argparse
+import sys
+import numpy as np
+from config import settings
+from services.inference_backend import load_backend
+
+
+SAMPLE_TEXTS = [
+    "Dinner at the little trattoria near Piazza Navona, the carbonara was perfect.",
+    "Quarterly budget review: cloud costs up 12%, travel down 30%.",
+    "Remember to book the dentist appointment for next Tuesday morning.",
+    "Notes on transformers: attention lets every token look at every other token.",
+    "Morning run, 8km along the river, average pace 5:10 per km.",
+    "Invoice #2024-117 from the electricity provider, due at the end of the month.",
+    "Inspiration: minimalist Japanese interior with light wood and paper lamps.",
+    "Il treno per Milano parte alle 7:45 dal binario 3.",
+    "#travel #sunset #amalfi",
+    "Short."
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend parity check")
+    parser.add_argument("--backend", default=settings.EMBEDDING_BACKEND, help="Backend to compare against torch")
+    parser.add_argument("--model", default=settings.HF_MODEL)
+    parser.add_argument("--texts-file", help="File with one sample text per line")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    texts = SAMPLE_TEXTS
+    if args.texts_file:
+        with open(args.texts_file) as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    reference = load_backend("torch", args.model, settings.HF_CACHE_DIR, settings.ONNX_MODEL_DIR)
+    candidate = load_backend(args.backend, args.model, settings.HF_CACHE_DIR, settings.ONNX_MODEL_DIR)
+
+    expected = reference.encode(texts)
+    actual = candidate.encode(texts)
+    if expected.shape != actual.shape:
+        print(f"Shape mismatch: torch {expected.shape} vs {candidate.name} {actual.shape}")
+        sys.exit(1)
+
+    cosines = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    print(f"Model: {args.model}")
+    print(f"Backend: {candidate.name} vs torch over {len(texts)} texts")
+    print(f"Cosine similarity: min {cosines.min():.5f}, mean {cosines.mean():.5f}")
+
+    if cosines.min() < args.min_cosine:
+        worst = int(cosines.argmin())
+        print(f"✗ Parity check failed (threshold {args.min_cosine}); worst text: {texts[worst]!r}")
+        sys.exit(1)
+    print("✓ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
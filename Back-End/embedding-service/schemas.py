@@ -0,0 +1,62 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+EMBEDDING_MESSAGE_VERSION = 2
+
+
+class EmbeddingMessage(BaseModel):
+    """
+    Embedding queue message (see shared/models.py)
+
+    Version 2 is a claim check: content is only inlined when small and is
+    otherwise fetched from archive-service. Version 1 messages have no
+    schema_version and always carry content.
+    """
+    schema_version: int = 1
+    item_id: str = Field(..., min_length=1)
+    field: str = Field(..., min_length=1)
+    content_type: str = "text"
+    content_hash: Optional[str] = None
+    content_length: Optional[int] = None
+    content: Optional[str] = None
+    metadata: Dict = Field(default_factory=dict)
+
+
+class EmbedRequest(BaseModel):
+    text: str
+    model: Optional[str] = None  # HF model name; the primary model when omitted
+
+
+class EmbedResponse(BaseModel):
+    embedding: List[float]
+    model: str
+    dim: int
+    spec: Dict  # model, dim and reduction, as sent to the vector DB
+
+
+class BatchEmbedRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1)
+    model: Optional[str] = None
+
+
+class BatchEmbedResponse(BaseModel):
+    embeddings: List[List[float]]
+    model: str
+    dim: int
+    spec: Dict
+
+
+class IngestRequest(BaseModel):
+    """One archive item, shaped like an embedding queue message"""
+    item_id: str
+    field: str
+    content_type: str = "text"
+    content: str = ""
+    metadata: Dict = Field(default_factory=dict)
+
+
+class IngestResponse(BaseModel):
+    item_id: str
+    status: str  # completed or duplicate
+    canonical_item_id: Optional[str] = None
@@ -0,0 +1,122 @@
+import json
+import asyncpg
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+
+class ArchiveReader:
+    """
+    Streams archive_items from the archive database
+
+    Pages are read with keyset pagination on id (WHERE id > last id ORDER
+    BY id), so every page costs the same however deep into the table it is
+    and the last id of a page is a resumable cursor.
+    """
+
+    def __init__(self, database_url: str):
+        # asyncpg takes a plain postgresql:// URL
+        self.database_url = database_url.replace("postgresql+asyncpg://", "postgresql://")
+        self.connection: Optional[asyncpg.Connection] = None
+
+    async def connect(self):
+        """Connect to the archive database"""
+        self.connection = await asyncpg.connect(self.database_url)
+
+    def _where(
+        self,
+        fields: Optional[List[str]],
+        statuses: Optional[List[str]],
+        since: Optional[datetime],
+        until: Optional[datetime]
+    ):
+        clauses = []
+        args = []
+        if fields:
+            args.append(fields)
+            clauses.append(f"field = ANY(${len(args)})")
+        if statuses:
+            args.append(statuses)
+            clauses.append(f"embedding_status = ANY(${len(args)})")
+        if since:
+            args.append(since)
+            clauses.append(f"created_at >= ${len(args)}")
+        if until:
+            args.append(until)
+            clauses.append(f"created_at < ${len(args)}")
+        return clauses, args
+
+    async def count(
+        self,
+        fields: Optional[List[str]] = None,
+        statuses: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after_id: Optional[str] = None
+    ) -> int:
+        """Number of items matching the filters, after the cursor if given"""
+        clauses, args = self._where(fields, statuses, since, until)
+        if after_id:
+            args.append(after_id)
+            clauses.append(f"id > ${len(args)}")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return await self.connection.fetchval(f"SELECT count(*) FROM archive_items{where}", *args)
+
+    async def stream(
+        self,
+        fields: Optional[List[str]] = None,
+        statuses: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after_id: Optional[str] = None,
+        page_size: int = 500
+    ) -> AsyncIterator[List[Dict]]:
+        """Yield pages of items shaped like embedding queue messages"""
+        base_clauses, base_args = self._where(fields, statuses, since, until)
+        cursor = after_id
+
+        while True:
+            clauses, args = list(base_clauses), list(base_args)
+            if cursor:
+                args.append(cursor)
+                clauses.append(f"id > ${len(args)}")
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            args.append(page_size)
+            rows = await self.connection.fetch(
+                "SELECT id, field, content_type, title, content, file_name, tags, extra_metadata, created_at "
+                f"FROM archive_items{where} ORDER BY id LIMIT ${len(args)}",
+                *args
+            )
+            if not rows:
+                return
+
+            yield [self._to_item(row) for row in rows]
+            cursor = rows[-1]["id"]
+
+    def _to_item(self, row: asyncpg.Record) -> Dict:
+        metadata = {
+            "title": row["title"],
+            "tags": list(row["tags"] or [])
+        }
+        if row["created_at"]:
+            metadata["created_at"] = row["created_at"].isoformat()
+        if row["file_name"]:
+            metadata["file_name"] = row["file_name"]
+        extra = row["extra_metadata"]
+        if isinstance(extra, str):
+            # asyncpg returns json columns as text
+            extra = json.loads(extra)
+        if isinstance(extra, dict):
+            metadata.update(extra)
+
+        return {
+            "item_id": row["id"],
+            "field": row["field"],
+            "content_type": row["content_type"],
+            "content": row["content"] or "",
+            "metadata": metadata
+        }
+
+    async def close(self):
+        """Close connection"""
+        if self.connection:
+            await self.connection.close()
@@ -0,0 +1,244 @@
+import asyncio
+import time
+import aio_pika
+from collections import deque
+from typing import Deque, List, Dict, Set, Tuple
+from config import settings
+from services.ingest_pipeline import IngestPipeline
+from services.retry_handler import RetryHandler, safe_ack
+from services.content_fetcher import ContentFetcher
+from services.concurrency_controller import ConcurrencyController
+from schemas import EmbeddingMessage, EMBEDDING_MESSAGE_VERSION
+
+
+def parse_message(message: aio_pika.IncomingMessage) -> Dict:
+    """Decode a queue message of any supported schema version, raising if it is malformed"""
+    data = EmbeddingMessage.model_validate_json(message.body).model_dump()
+    if data["schema_version"] > EMBEDDING_MESSAGE_VERSION:
+        raise ValueError(f"unsupported message schema version {data['schema_version']}")
+    if data["schema_version"] == 1:
+        data["content"] = data["content"] or ""
+    return data
+
+
+class BatchConsumer:
+    """
+    Micro-batching consumer for the embedding queues
+
+    Incoming messages are buffered per lane and handed out in batches that
+    close when BATCH_SIZE messages are collected or BATCH_MAX_WAIT_MS has
+    passed since the first message of the batch arrived. Every batch goes
+    through the ingest pipeline in one call, then each message is settled
+    on its own: acked on success, or handed to the retry handler on failure.
+
+    Batches are filled from the interactive lane first. While bulk messages
+    are waiting, BULK_MIN_SHARE of every batch is held back for them, so a
+    steady stream of interactive items never starves a backfill and a
+    backfill only ever delays an interactive item by a fraction of a batch.
+
+    Up to controller.limit batches are processed at once, so fetching
+    content and writing to the vector DB overlap with inference; the
+    controller adapts that limit to latency and downstream errors.
+    """
+
+    def __init__(
+        self,
+        pipeline: IngestPipeline,
+        retry_handler: RetryHandler,
+        content_fetcher: ContentFetcher,
+        controller: ConcurrencyController,
+        batch_size: int = settings.BATCH_SIZE,
+        max_wait_ms: int = settings.BATCH_MAX_WAIT_MS,
+        bulk_min_share: float = settings.BULK_MIN_SHARE
+    ):
+        self.pipeline = pipeline
+        self.retry_handler = retry_handler
+        self.content_fetcher = content_fetcher
+        self.controller = controller
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.bulk_slots = max(1, int(batch_size * bulk_min_share))
+        self._lanes: Dict[str, Deque[aio_pika.IncomingMessage]] = {"interactive": deque(), "bulk": deque()}
+        self._arrived = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._slot_freed = asyncio.Event()
+        self._tasks = set()
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.lane_counts = {"interactive": 0, "bulk": 0}
+
+    async def on_message(self, message: aio_pika.IncomingMessage):
+        """Interactive queue callback: buffer the message until its batch is flushed"""
+        self._buffer("interactive", message)
+
+    async def on_bulk_message(self, message: aio_pika.IncomingMessage):
+        """Bulk queue callback: buffer the message until its batch is flushed"""
+        self._buffer("bulk", message)
+
+    def _buffer(self, lane: str, message: aio_pika.IncomingMessage):
+        self._lanes[lane].append(message)
+        self._arrived.set()
+
+    def _waiting(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    async def run(self):
+        """Collect batches forever, processing up to controller.limit at once"""
+        while True:
+            while not self.controller.has_slot:
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+                if self._waiting():
+                    self.controller.mark_waiting()
+            batch = await self._next_batch()
+            self.controller.acquire()
+            self._idle.clear()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[aio_pika.IncomingMessage]):
+        started = time.monotonic()
+        # Archive callback failures are counted by the vector store, not per item
+        archive_failures = self.pipeline.vector_store.archive_update_failures
+        # ids of messages already acked or rescheduled, which must not be settled twice
+        settled: Set[int] = set()
+        try:
+            errors = await self._process_batch(batch, settled)
+        except Exception as e:
+            print(f"Error processing batch: {e}")
+            unsettled = [message for message in batch if id(message) not in settled]
+            errors = len(unsettled)
+            for message in unsettled:
+                await self._fail(message, e, settled)
+        finally:
+            self.controller.release()
+            if self.controller.in_flight == 0:
+                self._idle.set()
+            self._slot_freed.set()
+
+        errors += self.pipeline.vector_store.archive_update_failures - archive_failures
+        try:
+            await self.controller.record(time.monotonic() - started, len(batch), errors)
+        except Exception as e:
+            print(f"Failed to adjust consumer concurrency: {e}")
+
+    async def drain(self, timeout: float):
+        """
+        Let the batches in flight finish, then hand buffered messages back to the broker
+
+        Call after cancelling the queue consumers so nothing new arrives.
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Batches still running after {timeout}s, their messages will be redelivered")
+        for lane in self._lanes.values():
+            while lane:
+                message = lane.popleft()
+                try:
+                    await message.nack(requeue=True)
+                except Exception as e:
+                    print(f"Failed to requeue message, the broker will redeliver it: {e}")
+
+    async def _next_batch(self) -> List[aio_pika.IncomingMessage]:
+        """Wait for the first message, then fill the batch until size or time limit"""
+        while not self._waiting():
+            self._arrived.clear()
+            await self._arrived.wait()
+
+        deadline = time.monotonic() + self.max_wait
+        while self._waiting() < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+
+        return self._take()
+
+    def _take(self) -> List[aio_pika.IncomingMessage]:
+        """Fill a batch from the interactive lane, keeping bulk_slots for waiting bulk messages"""
+        interactive, bulk = self._lanes["interactive"], self._lanes["bulk"]
+        # Batches of one can't be shared; the interactive lane wins
+        reserved = min(self.bulk_slots, len(bulk)) if self.batch_size > 1 else 0
+        batch = []
+        while interactive and len(batch) < self.batch_size - reserved:
+            batch.append(interactive.popleft())
+        self.lane_counts["interactive"] += len(batch)
+        while bulk and len(batch) < self.batch_size:
+            batch.append(bulk.popleft())
+            self.lane_counts["bulk"] += 1
+        return batch
+
+    def lane_depths(self) -> Dict[str, int]:
+        """Messages buffered per lane, waiting for a batch"""
+        return {lane: len(messages) for lane, messages in self._lanes.items()}
+
+    async def _process_batch(self, batch: List[aio_pika.IncomingMessage], settled: Set[int]) -> int:
+        """
+        Run a batch through the pipeline and settle each message, returning the downstream failures
+
+        Every message settled is added to settled, so on an unexpected error
+        the caller fails only the rest.
+        """
+        parsed: List[Tuple[aio_pika.IncomingMessage, Dict]] = []
+        for message in batch:
+            try:
+                parsed.append((message, parse_message(message)))
+            except Exception as e:
+                print(f"Discarding malformed message: {e}")
+                await self._fail(message, e, settled, retry=False)
+
+        # Claim-check messages: fetch the content of the whole batch at once
+        try:
+            missing = await self.content_fetcher.hydrate([data for _, data in parsed])
+        except Exception as e:
+            print(f"Failed to fetch content for batch: {e}")
+            for message, _ in parsed:
+                await self._fail(message, e, settled)
+            return len(parsed)
+        if missing:
+            for message, data in parsed:
+                if data['item_id'] in missing:
+                    print(f"Item {data['item_id']} no longer exists, dropping its message")
+                    settled.add(id(message))
+                    await safe_ack(message)
+            parsed = [(message, data) for message, data in parsed if data['item_id'] not in missing]
+
+        if not parsed:
+            return 0
+
+        started = time.monotonic()
+        results = await self.pipeline.process([data for _, data in parsed])
+        generator = self.pipeline.embedding_generator
+        print(
+            f"Processed batch of {len(parsed)} items in {(time.monotonic() - started) * 1000:.0f}ms "
+            f"(lanes waiting: {self.lane_depths()}, batches in flight: {self.controller.in_flight}, "
+            f"inference queue depth: {generator.inference_stats()['queue_depth']}, "
+            f"cache hit ratio: {generator.cache_stats()['hit_ratio']})"
+        )
+
+        errors = 0
+        for (message, data), error in zip(parsed, results):
+            if error is not None:
+                print(f"Error storing item {data['item_id']}: {error}")
+                errors += 1
+                await self._fail(message, error, settled)
+            else:
+                settled.add(id(message))
+                await safe_ack(message)
+                self.processed += 1
+        self.batches += 1
+        return errors
+
+    async def _fail(self, message: aio_pika.IncomingMessage, error: Exception, settled: Set[int], retry: bool = True):
+        """Retry or dead-letter a message; requeue it if the broker rejects both"""
+        self.failed += 1
+        settled.add(id(message))
+        await self.retry_handler.fail(message, error, retry=retry)
@@ -0,0 +1,119 @@
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from config import settings
+
+
+class ConcurrencyController:
+    """
+    AIMD limit on the consumer's in-flight work
+
+    Every completed unit of work (a batch, or a message in single mode)
+    reports how long it took from the start of processing to its last ack
+    and how many of its items failed downstream. Each CONCURRENCY_WINDOW
+    completions the window is judged: if the p90 latency is above
+    CONCURRENCY_TARGET_LATENCY_MS or the error rate above
+    CONCURRENCY_MAX_ERROR_RATE, the limit is multiplied by
+    CONCURRENCY_DECREASE_FACTOR; otherwise, if work was waiting for a free
+    slot, it grows by one. The limit stays within CONCURRENCY_MIN and
+    CONCURRENCY_MAX, and on_change is awaited after every change so the
+    consumer can resize its prefetch window.
+
+    Latency is measured from the start of processing, not from arrival:
+    time spent waiting for a slot grows when the limit shrinks, and would
+    otherwise push the limit down further.
+    """
+
+    def __init__(self, initial: int, adaptive: bool = settings.CONCURRENCY_ADAPTIVE):
+        self.adaptive = adaptive
+        self.min_limit = settings.CONCURRENCY_MIN
+        self.max_limit = max(settings.CONCURRENCY_MAX, self.min_limit)
+        self.limit = initial if not adaptive else min(max(initial, self.min_limit), self.max_limit)
+        self.target_latency = settings.CONCURRENCY_TARGET_LATENCY_MS / 1000.0
+        self.on_change: Optional[Callable[[int], Awaitable[None]]] = None
+        self.in_flight = 0
+        self._latencies: List[float] = []
+        self._items = 0
+        self._errors = 0
+        self._saturated = False
+        self.increases = 0
+        self.decreases = 0
+        self.last_window: Dict = {}
+        self.last_change: Optional[Dict] = None
+
+    def acquire(self):
+        """Count a unit of work as started"""
+        self.in_flight += 1
+        if self.in_flight >= self.limit:
+            self._saturated = True
+
+    def release(self):
+        self.in_flight -= 1
+
+    @property
+    def has_slot(self) -> bool:
+        return self.in_flight < self.limit
+
+    def mark_waiting(self):
+        """Work is queued behind the limit; the next healthy window may raise it"""
+        self._saturated = True
+
+    async def record(self, latency_s: float, items: int, errors: int):
+        """Report one completed unit of work and adjust the limit at the end of a window"""
+        if not self.adaptive:
+            return
+        self._latencies.append(latency_s)
+        self._items += items
+        self._errors += errors
+        if len(self._latencies) < settings.CONCURRENCY_WINDOW:
+            return
+
+        latencies = sorted(self._latencies)
+        p90 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+        error_rate = self._errors / self._items if self._items else 0.0
+        self.last_window = {
+            "p90_latency_ms": round(p90 * 1000, 1),
+            "error_rate": round(error_rate, 4),
+            "saturated": self._saturated
+        }
+        saturated = self._saturated
+        self._latencies = []
+        self._items = 0
+        self._errors = 0
+        self._saturated = False
+
+        limit = self.limit
+        if error_rate > settings.CONCURRENCY_MAX_ERROR_RATE:
+            limit, reason = int(limit * settings.CONCURRENCY_DECREASE_FACTOR), f"error rate {error_rate:.1%}"
+        elif p90 > self.target_latency:
+            limit, reason = int(limit * settings.CONCURRENCY_DECREASE_FACTOR), f"p90 latency {p90 * 1000:.0f}ms"
+        elif saturated:
+            limit, reason = limit + 1, "healthy and saturated"
+        else:
+            return
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if limit == self.limit:
+            return
+
+        if limit > self.limit:
+            self.increases += 1
+        else:
+            self.decreases += 1
+        print(f"Consumer concurrency {self.limit} -> {limit} ({reason})")
+        self.last_change = {"from": self.limit, "to": limit, "reason": reason, "at": time.time()}
+        self.limit = limit
+        if self.on_change is not None:
+            await self.on_change(limit)
+
+    def stats(self) -> Dict:
+        return {
+            "adaptive": self.adaptive,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "target_latency_ms": settings.CONCURRENCY_TARGET_LATENCY_MS,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "last_window": self.last_window,
+            "last_change": self.last_change
+        }
@@ -0,0 +1,64 @@
+import httpx
+from typing import Dict, List, Set
+from config import settings
+
+
+class ContentFetcher:
+    """
+    Resolves claim-check queue messages to their content
+
+    Version 2 messages leave large content out; it is fetched from the
+    archive service for a whole batch in one request.
+    """
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            base_url=settings.ARCHIVE_SERVICE_URL,
+            timeout=30.0
+        )
+        self.fetched = 0
+        self.changed = 0
+
+    async def hydrate(self, items: List[Dict]) -> Set[str]:
+        """
+        Fill in missing content in place, returning the ids of items that no longer exist
+
+        Content that changed since the message was published is used as is
+        (the newest text is what should be indexed); an update publishes
+        its own message anyway. Raises if the archive service can't be
+        reached, so the batch is retried.
+        """
+        wanted = [item for item in items if item.get("content") is None]
+        if not wanted:
+            return set()
+
+        found: Dict[str, Dict] = {}
+        item_ids = list({item["item_id"] for item in wanted})
+        for start in range(0, len(item_ids), settings.CONTENT_FETCH_BATCH_SIZE):
+            response = await self.client.post(
+                "/api/v1/archive/content",
+                json={"item_ids": item_ids[start:start + settings.CONTENT_FETCH_BATCH_SIZE]}
+            )
+            response.raise_for_status()
+            for entry in response.json()["items"]:
+                found[entry["item_id"]] = entry
+
+        missing = set()
+        for item in wanted:
+            entry = found.get(item["item_id"])
+            if entry is None:
+                missing.add(item["item_id"])
+                continue
+            if item.get("content_hash") and entry["content_hash"] != item["content_hash"]:
+                self.changed += 1
+                print(f"Content of item {item['item_id']} changed since it was queued, embedding the current version")
+            item["content"] = entry["content"]
+            self.fetched += 1
+        return missing
+
+    def stats(self) -> Dict:
+        return {"fetched": self.fetched, "changed": self.changed}
+
+    async def close(self):
+        """Close connection"""
+        await self.client.aclose()
@@ -0,0 +1,120 @@
+import json
+import aio_pika
+from typing import List, Dict, Optional
+from config import settings
+from services.retry_handler import (
+    ATTEMPTS_HEADER,
+    ORIGIN_QUEUE_HEADER,
+    ERROR_HEADER,
+    FAILED_AT_HEADER,
+    dead_letter_queue_name
+)
+
+
+class DeadLetterAdmin:
+    """Inspect, replay and purge a dead-letter queue"""
+
+    def __init__(self, queue_name: str = settings.EMBEDDING_QUEUE_NAME):
+        self.queue_name = queue_name
+        self.dead_queue_name = dead_letter_queue_name(queue_name)
+        self.connection = None
+        self.channel = None
+
+    async def connect(self):
+        """Connect to RabbitMQ"""
+        self.connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+        self.channel = await self.connection.channel()
+
+    async def count(self) -> int:
+        """Number of messages waiting in the dead-letter queue"""
+        queue = await self.channel.declare_queue(self.dead_queue_name, durable=True)
+        return queue.declaration_result.message_count
+
+    async def list(self, limit: int = 50) -> List[Dict]:
+        """
+        Peek at dead letters without removing them
+
+        Messages are held unacknowledged while listing so none is seen
+        twice, then all of them are returned to the queue.
+        """
+        queue = await self.channel.declare_queue(self.dead_queue_name, durable=True)
+        held = []
+        try:
+            while len(held) < limit:
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                held.append(message)
+            return [self._describe(message) for message in held]
+        finally:
+            for message in held:
+                await message.nack(requeue=True)
+
+    async def replay(self, limit: Optional[int] = None, item_ids: Optional[List[str]] = None) -> int:
+        """
+        Republish dead letters to the queue they came from, with a fresh attempt count
+
+        When item_ids is given only those items are replayed; the other
+        messages go back to the dead-letter queue untouched.
+        """
+        queue = await self.channel.declare_queue(self.dead_queue_name, durable=True)
+        wanted = set(item_ids) if item_ids else None
+        skipped = []
+        replayed = 0
+        try:
+            while limit is None or replayed < limit:
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+
+                if wanted is not None and self._item_id(message) not in wanted:
+                    skipped.append(message)
+                    continue
+
+                headers = {
+                    key: value for key, value in (message.headers or {}).items()
+                    if key not in (ATTEMPTS_HEADER, ERROR_HEADER, FAILED_AT_HEADER)
+                }
+                origin = headers.pop(ORIGIN_QUEUE_HEADER, None) or self.queue_name
+                await self.channel.default_exchange.publish(
+                    aio_pika.Message(
+                        body=message.body,
+                        headers=headers,
+                        content_type=message.content_type,
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                    ),
+                    routing_key=origin
+                )
+                await message.ack()
+                replayed += 1
+        finally:
+            for message in skipped:
+                await message.nack(requeue=True)
+        return replayed
+
+    async def purge(self) -> int:
+        """Drop every dead letter, returning how many were removed"""
+        queue = await self.channel.declare_queue(self.dead_queue_name, durable=True)
+        result = await queue.purge()
+        return result.message_count
+
+    def _describe(self, message: aio_pika.IncomingMessage) -> Dict:
+        headers = message.headers or {}
+        return {
+            "item_id": self._item_id(message),
+            "origin_queue": headers.get(ORIGIN_QUEUE_HEADER),
+            "attempts": headers.get(ATTEMPTS_HEADER),
+            "error": headers.get(ERROR_HEADER),
+            "failed_at": headers.get(FAILED_AT_HEADER)
+        }
+
+    def _item_id(self, message: aio_pika.IncomingMessage) -> Optional[str]:
+        try:
+            return json.loads(message.body.decode()).get("item_id")
+        except Exception:
+            return None
+
+    async def close(self):
+        """Close connection"""
+        if self.connection:
+            await self.connection.close()
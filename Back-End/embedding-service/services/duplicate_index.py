@@ -0,0 +1,256 @@
+import hashlib
+import re
+import unicodedata
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+
+SIGNATURE_BITS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of the NFKC-normalized text"""
+    return re.findall(r"\w+", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def simhash(tokens: List[str], shingle_size: int = 3) -> int:
+    """
+    64-bit SimHash over word shingles
+
+    Every shingle is hashed to 64 bits; each bit of the signature is the
+    sign of the count-weighted vote of all shingles on that bit, so texts
+    that share most shingles end up a few bits apart.
+    """
+    shingles: Dict[str, int] = {}
+    for start in range(max(1, len(tokens) - shingle_size + 1)):
+        shingle = " ".join(tokens[start:start + shingle_size])
+        shingles[shingle] = shingles.get(shingle, 0) + 1
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles],
+        dtype=np.uint64
+    )
+    weights = np.array(list(shingles.values()), dtype=np.int64)
+    bits = ((hashes[:, None] >> np.arange(SIGNATURE_BITS, dtype=np.uint64)) & np.uint64(1)).astype(np.int64)
+    votes = ((bits * 2 - 1) * weights[:, None]).sum(axis=0)
+
+    signature = 0
+    for bit in np.nonzero(votes > 0)[0]:
+        signature |= 1 << int(bit)
+    return signature
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class DuplicateIndex:
+    """
+    Per-field SimHash index that finds near-duplicate archive items
+
+    Signatures are split into DEDUP_MAX_DISTANCE + 1 bands; two signatures
+    at most DEDUP_MAX_DISTANCE bits apart must agree on at least one band,
+    so looking up an item's bands finds every near-duplicate candidate
+    without scanning the field. Candidates are confirmed by Hamming
+    distance. Items with fewer than DEDUP_MIN_TOKENS tokens are never
+    matched; short captions collide too easily.
+
+    Without REDIS_HOST the index lives in process memory and starts empty
+    on every restart (and per worker process). With Redis it is shared and
+    persistent. Redis errors are counted and the item is treated as unique,
+    so an outage only costs model calls.
+    """
+
+    KEY_PREFIX = "dedup"
+
+    def __init__(self):
+        self.max_distance = settings.DEDUP_MAX_DISTANCE
+        self.bands = self.max_distance + 1
+        self.band_bits = SIGNATURE_BITS // self.bands
+        self._bands: Dict[str, Dict[str, int]] = {}
+        self._items: Dict[str, int] = {}
+        self._redis = None
+        self.stats_counters = {
+            "checked": 0,
+            "duplicates": 0,
+            "too_short": 0,
+            "redis_errors": 0
+        }
+        self.duplicates_by_field: Dict[str, int] = {}
+
+        if settings.REDIS_HOST:
+            import redis.asyncio as redis
+            self._redis = redis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB
+            )
+
+    def signature(self, text: str) -> Optional[int]:
+        """SimHash of a text, or None if it is too short to match reliably"""
+        tokens = tokenize(text)
+        if len(tokens) < settings.DEDUP_MIN_TOKENS:
+            return None
+        return simhash(tokens)
+
+    def _band_keys(self, field: str, signature: int) -> List[str]:
+        mask = (1 << self.band_bits) - 1
+        return [
+            f"{self.KEY_PREFIX}:{field}:{band}:{(signature >> (band * self.band_bits)) & mask:x}"
+            for band in range(self.bands)
+        ]
+
+    def _item_key(self, field: str, item_id: str) -> str:
+        return f"{self.KEY_PREFIX}:{field}:item:{item_id}"
+
+    async def _candidates(self, field: str, signature: int) -> Dict[str, int]:
+        """Indexed items sharing at least one band with the signature"""
+        keys = self._band_keys(field, signature)
+        candidates: Dict[str, int] = {}
+        if self._redis is None:
+            for key in keys:
+                candidates.update(self._bands.get(key, {}))
+            return candidates
+
+        pipe = self._redis.pipeline()
+        for key in keys:
+            pipe.hgetall(key)
+        for members in await pipe.execute():
+            for item_id, value in members.items():
+                candidates[item_id.decode()] = int(value, 16)
+        return candidates
+
+    async def check(self, items: List[Dict]) -> List[Tuple[Optional[int], Optional[str]]]:
+        """
+        (signature, canonical item id) for each item
+
+        The canonical id is set when the item is a near-duplicate of an
+        indexed item, or of an earlier unique item of the same call, of
+        the same field. An item never matches itself.
+        """
+        results: List[Tuple[Optional[int], Optional[str]]] = []
+        earlier: List[Tuple[str, str, int]] = []
+        for item in items:
+            self.stats_counters["checked"] += 1
+            signature = self.signature(item["content"])
+            if signature is None:
+                self.stats_counters["too_short"] += 1
+                results.append((None, None))
+                continue
+
+            canonical = None
+            for field, item_id, other in earlier:
+                if field == item["field"] and item_id != item["item_id"] and hamming(signature, other) <= self.max_distance:
+                    canonical = item_id
+                    break
+
+            if canonical is None:
+                try:
+                    candidates = await self._candidates(item["field"], signature)
+                except Exception as e:
+                    self.stats_counters["redis_errors"] += 1
+                    print(f"Warning: duplicate lookup in Redis failed: {e}")
+                    candidates = {}
+                matches = sorted(
+                    (hamming(signature, other), item_id)
+                    for item_id, other in candidates.items()
+                    if item_id != item["item_id"]
+                )
+                if matches and matches[0][0] <= self.max_distance:
+                    canonical = matches[0][1]
+
+            if canonical is None:
+                earlier.append((item["field"], item["item_id"], signature))
+            else:
+                self.stats_counters["duplicates"] += 1
+                self.duplicates_by_field[item["field"]] = self.duplicates_by_field.get(item["field"], 0) + 1
+            results.append((signature, canonical))
+        return results
+
+    async def add(self, entries: List[Tuple[str, str, int]]):
+        """Index (field, item_id, signature) entries, replacing an item's previous signature"""
+        if not entries:
+            return
+
+        if self._redis is None:
+            for field, item_id, signature in entries:
+                self._forget_local(field, item_id)
+                self._items[self._item_key(field, item_id)] = signature
+                for key in self._band_keys(field, signature):
+                    self._bands.setdefault(key, {})[item_id] = signature
+            return
+
+        try:
+            pipe = self._redis.pipeline()
+            for field, item_id, _ in entries:
+                pipe.get(self._item_key(field, item_id))
+            previous = await pipe.execute()
+
+            pipe = self._redis.pipeline()
+            for (field, item_id, signature), old in zip(entries, previous):
+                if old is not None:
+                    for key in self._band_keys(field, int(old, 16)):
+                        pipe.hdel(key, item_id)
+                pipe.set(self._item_key(field, item_id), f"{signature:x}")
+                for key in self._band_keys(field, signature):
+                    pipe.hset(key, item_id, f"{signature:x}")
+            await pipe.execute()
+        except Exception as e:
+            self.stats_counters["redis_errors"] += 1
+            print(f"Warning: duplicate index write to Redis failed: {e}")
+
+    async def remove(self, entries: List[Tuple[str, str]]):
+        """Drop (field, item_id) entries, e.g. items that turned out to be duplicates"""
+        if not entries:
+            return
+
+        if self._redis is None:
+            for field, item_id in entries:
+                self._forget_local(field, item_id)
+            return
+
+        try:
+            pipe = self._redis.pipeline()
+            for field, item_id in entries:
+                pipe.get(self._item_key(field, item_id))
+            previous = await pipe.execute()
+
+            pipe = self._redis.pipeline()
+            for (field, item_id), old in zip(entries, previous):
+                if old is None:
+                    continue
+                for key in self._band_keys(field, int(old, 16)):
+                    pipe.hdel(key, item_id)
+                pipe.delete(self._item_key(field, item_id))
+            await pipe.execute()
+        except Exception as e:
+            self.stats_counters["redis_errors"] += 1
+            print(f"Warning: duplicate index write to Redis failed: {e}")
+
+    def _forget_local(self, field: str, item_id: str):
+        old = self._items.pop(self._item_key(field, item_id), None)
+        if old is None:
+            return
+        for key in self._band_keys(field, old):
+            members = self._bands.get(key)
+            if members is not None:
+                members.pop(item_id, None)
+                if not members:
+                    del self._bands[key]
+
+    def stats(self) -> Dict:
+        checked = self.stats_counters["checked"]
+        return {
+            **self.stats_counters,
+            "duplicate_ratio": round(self.stats_counters["duplicates"] / checked, 4) if checked else 0.0,
+            "duplicates_by_field": dict(self.duplicates_by_field),
+            "max_distance": self.max_distance,
+            "memory_entries": len(self._items),
+            "redis_enabled": self._redis is not None
+        }
+
+    async def close(self):
+        """Close the Redis connection"""
+        if self._redis is not None:
+            await self._redis.close()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class DynamicBatcher:
+    """
+    Coalesces concurrent embedding requests into shared model calls
+
+    Callers submit a list of texts and await their vectors. A single
+    scheduler task takes the first waiting request, keeps collecting
+    requests for up to max_wait_ms or until max_batch_size texts are
+    gathered, embeds all texts in one call and hands each caller its
+    slice. Under light load a request waits at most max_wait_ms; under
+    heavy load batches fill up immediately and throughput follows the
+    model's batched speed.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = 64,
+        max_wait_ms: int = 5
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.failed_batches = 0
+
+    def start(self):
+        """Start the scheduler task on the running loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts as part of the next batch"""
+        future = asyncio.get_running_loop().create_future()
+        await self._pending.put((texts, future))
+        self.requests += 1
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            await self._embed(batch)
+
+    async def _next_batch(self) -> List[Tuple[List[str], asyncio.Future]]:
+        """Wait for a request, then gather more until the batch is full or the window closes"""
+        batch = [await self._pending.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._pending.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            size += len(request[0])
+
+        return batch
+
+    async def _embed(self, batch: List[Tuple[List[str], asyncio.Future]]):
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            embeddings = await self.embed_fn(texts)
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts += len(texts)
+        offset = 0
+        for request_texts, future in batch:
+            # A caller that gave up (timeout, disconnect) has a cancelled future
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self._pending.qsize(),
+            "requests": self.requests,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0
+        }
+
+    async def stop(self):
+        """Stop the scheduler, failing requests still waiting"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self._pending.empty():
+            _, future = self._pending.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("embedding service is shutting down"))
@@ -0,0 +1,151 @@
+import hashlib
+import re
+import time
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Optional
+from config import settings
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the normalized text (NFC, collapsed whitespace); a copy of shared/utils.py's"""
+    normalized = unicodedata.normalize("NFC", text or "")
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model id, normalized content hash)
+
+    The first tier is an in-process LRU holding CACHE_MAX_ENTRIES vectors.
+    When REDIS_HOST is set, a shared Redis tier sits behind it: vectors are
+    stored as float32 bytes and a sorted set of last-access times lets the
+    tier evict the least recently used keys once it grows past
+    CACHE_REDIS_MAX_ENTRIES. Redis errors are counted and otherwise ignored,
+    so a cache outage only costs model calls.
+    """
+
+    KEY_PREFIX = "emb"
+    INDEX_KEY = "emb:lru"
+
+    def __init__(self):
+        self.enabled = settings.CACHE_ENABLED
+        self.max_entries = settings.CACHE_MAX_ENTRIES
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._redis = None
+        self.stats_counters = {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "redis_errors": 0,
+            "redis_evictions": 0
+        }
+
+        if self.enabled and settings.REDIS_HOST:
+            import redis.asyncio as redis
+            self._redis = redis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB
+            )
+
+    def key(self, model_id: str, text: str) -> str:
+        """Cache key for a text embedded by a given model"""
+        return f"{self.KEY_PREFIX}:{model_id}:{content_hash(text)}"
+
+    async def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Look up several keys, memory tier first, then one Redis round-trip"""
+        if not self.enabled:
+            return [None] * len(keys)
+
+        results: List[Optional[List[float]]] = []
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            results.append(vector)
+
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing and self._redis is not None:
+            missing_keys = [keys[i] for i in missing]
+            try:
+                values = await self._redis.mget(missing_keys)
+                found = {}
+                for i, value in zip(missing, values):
+                    if value is not None:
+                        results[i] = np.frombuffer(value, dtype=np.float32).tolist()
+                        found[keys[i]] = time.time()
+                        self._remember(keys[i], results[i])
+                if found:
+                    await self._redis.zadd(self.INDEX_KEY, found)
+                self.stats_counters["redis_hits"] += len(found)
+            except Exception as e:
+                self.stats_counters["redis_errors"] += 1
+                print(f"Warning: embedding cache lookup in Redis failed: {e}")
+
+        memory_hits = len(keys) - len(missing)
+        self.stats_counters["memory_hits"] += memory_hits
+        self.stats_counters["misses"] += sum(1 for vector in results if vector is None)
+        return results
+
+    async def get(self, key: str) -> Optional[List[float]]:
+        """Look up a single key"""
+        return (await self.get_many([key]))[0]
+
+    async def put_many(self, entries: Dict[str, List[float]]):
+        """Store vectors in both tiers and trim the Redis tier to its size limit"""
+        if not self.enabled or not entries:
+            return
+
+        for key, vector in entries.items():
+            self._remember(key, vector)
+
+        if self._redis is None:
+            return
+        try:
+            now = time.time()
+            pipe = self._redis.pipeline()
+            for key, vector in entries.items():
+                pipe.set(key, np.asarray(vector, dtype=np.float32).tobytes())
+            pipe.zadd(self.INDEX_KEY, {key: now for key in entries})
+            pipe.zcard(self.INDEX_KEY)
+            size = (await pipe.execute())[-1]
+
+            overflow = size - settings.CACHE_REDIS_MAX_ENTRIES
+            if overflow > 0:
+                evicted = [key for key, _ in await self._redis.zpopmin(self.INDEX_KEY, overflow)]
+                if evicted:
+                    await self._redis.delete(*evicted)
+                self.stats_counters["redis_evictions"] += len(evicted)
+        except Exception as e:
+            self.stats_counters["redis_errors"] += 1
+            print(f"Warning: embedding cache write to Redis failed: {e}")
+
+    async def put(self, key: str, vector: List[float]):
+        """Store a single vector"""
+        await self.put_many({key: vector})
+
+    def _remember(self, key: str, vector: List[float]):
+        """Insert into the LRU tier, evicting the least recently used entry"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.stats_counters["memory_hits"] + self.stats_counters["redis_hits"] + self.stats_counters["misses"]
+        hits = lookups - self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "redis_enabled": self._redis is not None
+        }
+
+    async def close(self):
+        """Close the Redis connection"""
+        if self._redis is not None:
+            await self._redis.close()
@@ -1,96 +1,266 @@
+import asyncio
 import httpx
-from sentence_transformers import SentenceTransformer
-from typing import List
+import numpy as np
+from typing import List, Dict, Optional, Tuple
 from config import settings
-import os
+from services.inference_backend import EmbeddingBackend, load_backend
+from services.inference_executor import InferenceExecutor
+from services.dim_reduction import DimensionReducer, pca_model_path
+from services.embedding_cache import EmbeddingCache
+from services.circuit_breaker import CircuitBreaker
 
 
 class EmbeddingGenerator:
-    def __init__(self):
-        # Initialize HuggingFace model
-        os.makedirs(settings.HF_CACHE_DIR, exist_ok=True)
-        self.hf_model = SentenceTransformer(
-            settings.HF_MODEL,
-            cache_folder=settings.HF_CACHE_DIR
+    def __init__(
+        self,
+        backend: Optional[EmbeddingBackend] = None,
+        hf_model: Optional[str] = None,
+        strategy: Optional[str] = None,
+        fallback: bool = True
+    ):
+        self.hf_model = hf_model or settings.HF_MODEL
+        self.strategy = strategy or settings.EMBEDDING_STRATEGY
+        self.fallback = fallback
+        
+        # Initialize HuggingFace model on the configured inference backend,
+        # unless one was loaded already (worker processes share the parent's)
+        self.backend = backend or load_backend(
+            settings.EMBEDDING_BACKEND,
+            self.hf_model,
+            cache_dir=settings.HF_CACHE_DIR,
+            onnx_dir=settings.ONNX_MODEL_DIR
+        )
+        
+        # Map model output to the index dimension
+        self.reducer = DimensionReducer(
+            settings.EMBEDDING_DIM,
+            method=settings.DIM_REDUCTION,
+            pca_path=pca_model_path(settings.PCA_MODEL_DIR, self.hf_model, settings.EMBEDDING_DIM)
+        )
+        
+        # Inference runs on a bounded pool so encode() never blocks the event loop
+        self.inference = InferenceExecutor(
+            max_workers=settings.INFERENCE_THREADS,
+            max_queue=settings.INFERENCE_MAX_QUEUE
+        )
+        
+        # Cache in front of the model, keyed by model id and content hash
+        self.cache = EmbeddingCache()
+        
+        # Ollama client: kept-alive connections, bounded in-flight requests
+        self.ollama_client = httpx.AsyncClient(
+            base_url=settings.OLLAMA_URL,
+            timeout=60.0,
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONCURRENCY,
+                max_keepalive_connections=settings.OLLAMA_MAX_CONCURRENCY,
+                keepalive_expiry=60.0
+            )
         )
+        self._ollama_slots = asyncio.Semaphore(settings.OLLAMA_MAX_CONCURRENCY)
         
-        # Ollama client
-        self.ollama_client = httpx.AsyncClient(base_url=settings.OLLAMA_URL, timeout=60.0)
+        # Stops falling back to the other strategy while that one keeps failing
+        self.fallback_breaker = CircuitBreaker(
+            "embedding-fallback",
+            failure_threshold=settings.FALLBACK_FAILURE_THRESHOLD,
+            reset_timeout=settings.FALLBACK_RESET_TIMEOUT_S
+        )
+    
+    @property
+    def tokenizer(self):
+        """Tokenizer of the HuggingFace model, used to size chunks"""
+        return self.backend.tokenizer
+    
+    @property
+    def max_seq_length(self) -> int:
+        """Longest input, in tokens, the HuggingFace model encodes without truncation"""
+        return self.backend.max_seq_length
+    
+    @property
+    def model_id(self) -> str:
+        """Identifier of the model and reduction producing primary-strategy embeddings"""
+        suffix = f"{self.reducer.target_dim}:{self.reducer.name}"
+        if self.strategy == "ollama":
+            return f"ollama:{settings.OLLAMA_MODEL}:{suffix}"
+        return f"hf:{self.hf_model}:{self.backend.name}:{suffix}"
+    
+    @property
+    def embedding_spec(self) -> Dict:
+        """Model and dimension of stored vectors, recorded on each collection"""
+        model = settings.OLLAMA_MODEL if self.strategy == "ollama" else self.hf_model
+        return {"model": model, **self.reducer.describe()}
     
     async def generate_embedding(self, text: str, content_type: str = "text") -> List[float]:
         """
         Generate embedding for text
         
         Strategy:
+        - Return the cached vector if this content was embedded before
         - Use Ollama for large embeddings if configured
         - Fallback to HuggingFace for fast, consistent embeddings
         """
+        key = self.cache.key(self.model_id, text)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        embedding, cacheable = (await self._encode_batch([text]))[0]
+        if cacheable:
+            await self.cache.put(key, embedding)
+        return embedding
+    
+    async def _generate_hf_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a list of texts in one HuggingFace model call"""
+        embeddings = await self.inference.run(
+            self.backend.encode,
+            texts,
+            batch_size=settings.BATCH_SIZE
+        )
+        return self.reducer.reduce(embeddings).tolist()
+    
+    async def _generate_ollama_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings using Ollama
+        
+        Texts are sent OLLAMA_BATCH_SIZE at a time to /api/embed, with at most
+        OLLAMA_MAX_CONCURRENCY requests in flight over kept-alive connections.
+        """
+        sub_batches = [
+            texts[start:start + settings.OLLAMA_BATCH_SIZE]
+            for start in range(0, len(texts), settings.OLLAMA_BATCH_SIZE)
+        ]
+        try:
+            results = await asyncio.gather(*[self._post_ollama_batch(batch) for batch in sub_batches])
+        except Exception as e:
+            raise Exception(f"Ollama embedding failed: {e}")
+        embeddings = np.asarray([embedding for batch in results for embedding in batch], dtype=np.float32)
+        return self.reducer.reduce(embeddings).tolist()
+    
+    async def _post_ollama_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one sub-batch with a single Ollama request"""
+        async with self._ollama_slots:
+            response = await self.ollama_client.post(
+                "/api/embed",
+                json={
+                    "model": settings.OLLAMA_MODEL,
+                    "input": texts
+                }
+            )
+            response.raise_for_status()
+            embeddings = response.json()["embeddings"]
+        
+        if len(embeddings) != len(texts):
+            raise Exception(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+    
+    async def generate_batch_embeddings(self, texts: List[str], allow_fallback: bool = True) -> List[List[float]]:
+        """
+        Generate embeddings for multiple texts
+        
+        Cached texts are served from the cache; the remaining distinct texts
+        are embedded together and written back to it. Vectors that are
+        stored, or searched against stored ones, must pass
+        allow_fallback=False: they are labelled with embedding_spec, and
+        fallback vectors come from another model.
+        """
+        keys = [self.cache.key(self.model_id, text) for text in texts]
+        embeddings = await self.cache.get_many(keys)
+        
+        missing: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], []).append(i)
+        
+        if missing:
+            computed = await self._encode_batch(
+                [texts[positions[0]] for positions in missing.values()],
+                allow_fallback=allow_fallback
+            )
+            to_cache = {}
+            for (key, positions), (embedding, cacheable) in zip(missing.items(), computed):
+                for i in positions:
+                    embeddings[i] = embedding
+                if cacheable:
+                    to_cache[key] = embedding
+            await self.cache.put_many(to_cache)
+        
+        return embeddings
+    
+    async def _encode_batch(self, texts: List[str], allow_fallback: bool = True) -> List[Tuple[List[float], bool]]:
+        """
+        Embed texts without consulting the cache, falling back to the other strategy
+        
+        Returns each embedding with whether it came from the primary
+        strategy; fallback vectors live in a different space and must not be
+        cached. The fallback is guarded by a circuit breaker so a failing
+        primary cannot keep doubling the load on an unhealthy fallback.
+        """
         try:
-            # Check embedding strategy from settings
-            if settings.EMBEDDING_STRATEGY == "ollama":
-                return await self._generate_ollama_embedding(text)
+            # Check embedding strategy
+            if self.strategy == "ollama":
+                embeddings = await self._generate_ollama_embeddings(texts)
             else:
-                return await self._generate_hf_embedding(text)
+                embeddings = await self._generate_hf_embeddings(texts)
+            return [(embedding, True) for embedding in embeddings]
         
         except Exception as e:
-            print(f"Error generating embedding with {settings.EMBEDDING_STRATEGY}: {e}")
+            print(f"Error generating embedding with {self.strategy}: {e}")
+            if not self.fallback or not allow_fallback:
+                raise
+            if not self.fallback_breaker.allow():
+                print("Fallback circuit is open, not retrying with the other strategy")
+                raise
+            
             # Fallback to alternative method
             try:
-                if settings.EMBEDDING_STRATEGY == "ollama":
+                if self.strategy == "ollama":
                     print("Falling back to HuggingFace...")
-                    return await self._generate_hf_embedding(text)
+                    embeddings = await self._generate_hf_embeddings(texts)
                 else:
                     print("Falling back to Ollama...")
-                    return await self._generate_ollama_embedding(text)
+                    embeddings = await self._generate_ollama_embeddings(texts)
             except Exception as fallback_error:
+                self.fallback_breaker.record_failure()
                 print(f"Fallback also failed: {fallback_error}")
                 raise
+            except BaseException:
+                # Cancelled mid-trial: free the half-open slot or allow() rejects forever
+                self.fallback_breaker.release_trial()
+                raise
+            
+            self.fallback_breaker.record_success()
+            return [(embedding, False) for embedding in embeddings]
     
-    async def _generate_hf_embedding(self, text: str) -> List[float]:
-        """Generate embedding using HuggingFace model"""
-        # Truncate text if too long (model specific limit)
-        max_length = 512
-        if len(text) > max_length:
-            text = text[:max_length]
-        
-        # Generate embedding
-        embedding = self.hf_model.encode(text, convert_to_tensor=False)
-        embedding_list = embedding.tolist()
-        
-        # Ensure 768 dimensions (gemma-2-2b-it produces 768d embeddings)
-        # If the model produces different dimensions, pad or truncate
-        target_dim = 768
-        if len(embedding_list) < target_dim:
-            # Pad with zeros
-            embedding_list.extend([0.0] * (target_dim - len(embedding_list)))
-        elif len(embedding_list) > target_dim:
-            # Truncate to target dimension
-            embedding_list = embedding_list[:target_dim]
-        
-        return embedding_list
-    
-    async def _generate_ollama_embedding(self, text: str) -> List[float]:
-        """Generate embedding using Ollama"""
-        try:
-            response = await self.ollama_client.post(
-                "/api/embeddings",
-                json={
-                    "model": settings.OLLAMA_MODEL,
-                    "prompt": text
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data["embedding"]
-        
-        except Exception as e:
-            raise Exception(f"Ollama embedding failed: {e}")
+    async def warm_up(self):
+        """Run one encode so the first real request doesn't pay for lazy initialization"""
+        await self.inference.run(self.backend.encode, ["warm up"], batch_size=1)
+    
+    def inference_stats(self) -> Dict:
+        """Inference pool occupancy and queue depth"""
+        return self.inference.stats()
+    
+    def cache_stats(self) -> Dict:
+        """Embedding cache hit/miss counters"""
+        return self.cache.stats()
     
-    async def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        embeddings = self.hf_model.encode(texts, convert_to_tensor=False, batch_size=settings.BATCH_SIZE)
-        return embeddings.tolist()
+    def fallback_stats(self) -> Dict:
+        """State of the fallback circuit breaker"""
+        return self.fallback_breaker.stats()
     
     async def close(self):
         """Close connections"""
         await self.ollama_client.aclose()
+        await self.cache.close()
+        self.inference.shutdown()
+
+
+def load_secondary_generator() -> Optional[EmbeddingGenerator]:
+    """
+    Generator for SECONDARY_HF_MODEL, or None when no migration is running
+    
+    Its vectors go to the new model's collections; falling back to another
+    strategy would put them in the wrong space, so it never does.
+    """
+    if not settings.SECONDARY_HF_MODEL:
+        return None
+    return EmbeddingGenerator(hf_model=settings.SECONDARY_HF_MODEL, strategy="huggingface", fallback=False)
@@ -0,0 +1,138 @@
+from typing import List, Dict, Optional
+from config import settings
+from services.embedding_generator import EmbeddingGenerator
+from services.vector_store import VectorStoreService
+from services.text_chunker import TextChunker
+from services.duplicate_index import DuplicateIndex
+from services.sparse_encoder import SparseEncoder
+
+
+class IngestPipeline:
+    """
+    Chunk, embed and store archive items
+
+    Every item is split into token-bounded chunks; the chunks of all items
+    in a call are embedded together in one batched model call, then all
+    chunks are written to the vector DB as separate points in bulk.
+    
+    With DEDUP_ENABLED, near-duplicates of already indexed items are
+    linked to them instead of being embedded again. With a secondary
+    generator (a model migration), every chunk is also embedded with the
+    new model and written to that model's collections. With
+    SPARSE_ENABLED, every chunk also gets BM25 term weights, stored as the
+    point's sparse vector for hybrid search.
+    """
+
+    def __init__(
+        self,
+        embedding_generator: EmbeddingGenerator,
+        vector_store: VectorStoreService,
+        secondary_generator: Optional[EmbeddingGenerator] = None
+    ):
+        self.embedding_generator = embedding_generator
+        self.vector_store = vector_store
+        self.secondary_generator = secondary_generator
+        # Leave room for the [CLS]/[SEP] tokens the model adds; chunks must
+        # fit both models while dual-writing
+        max_seq_length = embedding_generator.max_seq_length
+        if secondary_generator:
+            max_seq_length = min(max_seq_length, secondary_generator.max_seq_length)
+        max_tokens = min(settings.CHUNK_MAX_TOKENS, max_seq_length - 2)
+        self.chunker = TextChunker(
+            embedding_generator.tokenizer,
+            max_tokens=max_tokens,
+            overlap_tokens=settings.CHUNK_OVERLAP_TOKENS
+        )
+        self.dedup = DuplicateIndex() if settings.DEDUP_ENABLED else None
+        self.sparse_encoder = SparseEncoder() if settings.SPARSE_ENABLED else None
+
+    async def process(self, items: List[Dict]) -> List[Optional[Exception]]:
+        """
+        Ingest queue items, returning None or the error for each item
+
+        An embedding failure fails the whole call; storage failures are
+        reported per item so the caller can ack or nack each message.
+        Items found to be near-duplicates get canonical_item_id set in
+        place and count as processed. Every item also gets status_reported
+        set in place: whether the archive status callback succeeded.
+        """
+        if self.dedup:
+            checked = await self.dedup.check(items)
+        else:
+            checked = [(None, None)] * len(items)
+        unique = [index for index, (_, canonical) in enumerate(checked) if canonical is None]
+        duplicates = [(items[index], canonical) for index, (_, canonical) in enumerate(checked) if canonical]
+
+        errors: List[Optional[Exception]] = [None] * len(items)
+        if unique:
+            stored = await self._embed_and_store([items[index] for index in unique])
+            for index, error in zip(unique, stored):
+                errors[index] = error
+
+        if duplicates:
+            for item, canonical in duplicates:
+                item['canonical_item_id'] = canonical
+                print(f"Item {item['item_id']} is a near-duplicate of {canonical}, not embedding it")
+            reported = await self.vector_store.store_duplicates([
+                (item['item_id'], item['field'], canonical) for item, canonical in duplicates
+            ])
+            for item, _ in duplicates:
+                item['status_reported'] = reported
+
+        if self.dedup:
+            await self.dedup.add([
+                (items[index]['field'], items[index]['item_id'], checked[index][0])
+                for index in unique
+                if errors[index] is None and checked[index][0] is not None
+            ])
+            await self.dedup.remove([(item['field'], item['item_id']) for item, _ in duplicates])
+        return errors
+
+    async def _embed_and_store(self, items: List[Dict]) -> List[Optional[Exception]]:
+        chunked = [self.chunker.chunk(item['content']) for item in items]
+        texts = [chunk["text"] for chunks in chunked for chunk in chunks]
+
+        # Stored vectors must come from the model of embedding_spec: when it
+        # fails the batch fails and is retried, rather than storing vectors
+        # of the fallback strategy's model in its collection
+        embeddings = await self.embedding_generator.generate_batch_embeddings(texts, allow_fallback=False)
+        secondary_embeddings = None
+        if self.secondary_generator:
+            secondary_embeddings = await self.secondary_generator.generate_batch_embeddings(texts, allow_fallback=False)
+
+        stored_items = []
+        offset = 0
+        for item, chunks in zip(items, chunked):
+            stored_item = {
+                "item_id": item['item_id'],
+                "field": item['field'],
+                "content_type": item.get('content_type', 'text'),
+                "chunks": chunks,
+                "embeddings": embeddings[offset:offset + len(chunks)],
+                "metadata": item.get('metadata', {})
+            }
+            if self.sparse_encoder:
+                stored_item["sparse_vectors"] = self.sparse_encoder.encode_documents([chunk["text"] for chunk in chunks])
+            if secondary_embeddings is not None:
+                stored_item["secondary_embeddings"] = secondary_embeddings[offset:offset + len(chunks)]
+            stored_items.append(stored_item)
+            offset += len(chunks)
+
+        errors = await self.vector_store.store_items(
+            stored_items,
+            self.embedding_generator.embedding_spec,
+            secondary_spec=self.secondary_generator.embedding_spec if self.secondary_generator else None
+        )
+        for item, stored_item in zip(items, stored_items):
+            item['status_reported'] = stored_item['status_reported']
+        return errors
+
+    def dedup_stats(self) -> Dict:
+        return self.dedup.stats() if self.dedup else {"enabled": False}
+
+    async def close(self):
+        """Close the duplicate index and the secondary generator"""
+        if self.dedup:
+            await self.dedup.close()
+        if self.secondary_generator:
+            await self.secondary_generator.close()
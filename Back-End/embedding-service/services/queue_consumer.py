@@ -0,0 +1,240 @@
+import asyncio
+import time
+import aio_pika
+from typing import Callable, Dict, List, Optional, Tuple
+from config import settings
+from services.ingest_pipeline import IngestPipeline
+from services.batch_consumer import BatchConsumer, parse_message
+from services.content_fetcher import ContentFetcher
+from services.concurrency_controller import ConcurrencyController
+from services.retry_handler import RetryHandler, dead_letter_queue_name, safe_ack
+
+
+class QueueConsumer:
+    """
+    Consumes the interactive and bulk embedding queues in "batch" or "single" mode
+
+    Only batch mode favors the interactive lane; single mode handles
+    messages from both lanes in arrival order.
+
+    state moves through connecting -> consuming -> stopping -> stopped, and
+    is reported by the readiness endpoint.
+
+    In-flight work (batches, or messages in single mode) is limited by an
+    AIMD controller, one limit shared by both lanes. The broker's prefetch
+    window follows that limit; RabbitMQ applies a new prefetch only to
+    consumers started after it, so a change re-subscribes both queues.
+    Prefetch is per consumer, so in single mode messages of both lanes may
+    be delivered up to the limit each, and wait here for a shared slot.
+    """
+
+    def __init__(self, pipeline: IngestPipeline):
+        self.pipeline = pipeline
+        self.state = "idle"
+        self.connection = None
+        self.retry_handler: Optional[RetryHandler] = None
+        self.batch_consumer: Optional[BatchConsumer] = None
+        self.content_fetcher = ContentFetcher()
+        # Batch mode used to run one batch at a time, single mode MAX_WORKERS messages
+        self.controller = ConcurrencyController(1 if settings.CONSUMER_MODE == "batch" else settings.MAX_WORKERS)
+        self.controller.on_change = self._apply_limit
+        self._slot_freed = asyncio.Event()
+        self.channel = None
+        self._resubscribing = asyncio.Lock()
+        self._consumers: List[Tuple[aio_pika.abc.AbstractQueue, str, Callable]] = []
+        self.processed = 0
+        self.failed = 0
+
+    async def run(self):
+        """Connect to RabbitMQ and consume until stopped"""
+        self.state = "connecting"
+        print(f"Connecting to RabbitMQ: {settings.RABBITMQ_URL}")
+        self.connection = await self._connect()
+
+        channel = await self.connection.channel()
+        self.channel = channel
+        self.retry_handler = RetryHandler(channel)
+        await channel.set_qos(prefetch_count=self._prefetch_count(self.controller.limit))
+
+        # Declare the interactive and bulk lanes and their dead-letter queues.
+        # Prefetch applies per consumer, so unacked bulk messages never use
+        # up the interactive lane's window
+        queue = await channel.declare_queue(
+            settings.EMBEDDING_QUEUE_NAME,
+            durable=True
+        )
+        bulk_queue = await channel.declare_queue(
+            settings.EMBEDDING_BULK_QUEUE_NAME,
+            durable=True
+        )
+        for name in (settings.EMBEDDING_QUEUE_NAME, settings.EMBEDDING_BULK_QUEUE_NAME):
+            await channel.declare_queue(dead_letter_queue_name(name), durable=True)
+
+        print(
+            f"Waiting for messages on queues: {settings.EMBEDDING_QUEUE_NAME}, "
+            f"{settings.EMBEDDING_BULK_QUEUE_NAME} (mode: {settings.CONSUMER_MODE})"
+        )
+        self.state = "consuming"
+
+        # Start consuming
+        if settings.CONSUMER_MODE == "batch":
+            self.batch_consumer = BatchConsumer(
+                self.pipeline,
+                self.retry_handler,
+                self.content_fetcher,
+                self.controller
+            )
+            await self._consume(queue, self.batch_consumer.on_message)
+            await self._consume(bulk_queue, self.batch_consumer.on_bulk_message)
+            await self.batch_consumer.run()
+        else:
+            await self._consume(queue, self.process_message)
+            await self._consume(bulk_queue, self.process_message)
+
+            # Wait forever
+            await asyncio.Future()
+
+    async def _consume(self, queue: aio_pika.abc.AbstractQueue, callback):
+        self._consumers.append((queue, await queue.consume(callback), callback))
+
+    def _prefetch_count(self, limit: int) -> int:
+        """Unacked messages the broker may deliver for a concurrency limit"""
+        if settings.CONSUMER_MODE == "batch":
+            # Enough to fill the next batch while `limit` batches are processed
+            return (limit + 1) * settings.BATCH_SIZE
+        return limit
+
+    async def _apply_limit(self, limit: int):
+        """Resize the prefetch window and re-subscribe so the broker applies it"""
+        async with self._resubscribing:
+            if self.state != "consuming":
+                return
+            # A raised limit may let waiting messages start
+            self._slot_freed.set()
+            await self.channel.set_qos(prefetch_count=self._prefetch_count(self.controller.limit))
+            consumers, self._consumers = self._consumers, []
+            for queue, consumer_tag, callback in consumers:
+                # Messages already delivered to the old consumer stay unacked
+                # on the channel and are settled as usual
+                await queue.cancel(consumer_tag)
+                await self._consume(queue, callback)
+
+    async def _connect(self):
+        """Connect to RabbitMQ, retrying with backoff while the broker is unavailable"""
+        delay = 1.0
+        while True:
+            try:
+                return await aio_pika.connect_robust(settings.RABBITMQ_URL)
+            except Exception as e:
+                print(f"RabbitMQ not reachable ({e}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    async def process_message(self, message: aio_pika.IncomingMessage):
+        """Process a message from the queue, once the lanes' shared limit has a free slot"""
+        while not self.controller.has_slot:
+            self.controller.mark_waiting()
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        self.controller.acquire()
+        if not self.controller.has_slot:
+            # Every slot is busy, so the broker is holding more work
+            self.controller.mark_waiting()
+        started = time.monotonic()
+        archive_failures = self.pipeline.vector_store.archive_update_failures
+        error_count = 0
+        try:
+            error_count = await self._process_message(message)
+        finally:
+            self.controller.release()
+            self._slot_freed.set()
+        error_count += self.pipeline.vector_store.archive_update_failures - archive_failures
+        try:
+            await self.controller.record(time.monotonic() - started, 1, min(error_count, 1))
+        except Exception as e:
+            print(f"Failed to adjust consumer concurrency: {e}")
+
+    async def _process_message(self, message: aio_pika.IncomingMessage) -> int:
+        """Handle one message, returning 1 if it failed downstream"""
+        try:
+            # Parse message
+            data = parse_message(message)
+        except Exception as e:
+            print(f"Discarding malformed message: {e}")
+            self.failed += 1
+            await self.retry_handler.fail(message, e, retry=False)
+            return 0
+
+        try:
+            print(f"Processing item: {data['item_id']}")
+
+            # Claim-check messages carry no content; fetch it
+            if await self.content_fetcher.hydrate([data]):
+                print(f"Item {data['item_id']} no longer exists, dropping its message")
+                await safe_ack(message)
+                return 0
+
+            # Chunk, embed and store in vector database
+            error = (await self.pipeline.process([data]))[0]
+            if error is not None:
+                raise error
+
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            self.failed += 1
+            await self.retry_handler.fail(message, e)
+            return 1
+
+        await safe_ack(message)
+        self.processed += 1
+        print(f"Successfully processed item: {data['item_id']}")
+        return 0
+
+    def stats(self) -> Dict:
+        processed, failed = self.processed, self.failed
+        if self.batch_consumer is not None:
+            processed += self.batch_consumer.processed
+            failed += self.batch_consumer.failed
+        stats = {
+            "state": self.state,
+            "mode": settings.CONSUMER_MODE,
+            "queues": {
+                "interactive": settings.EMBEDDING_QUEUE_NAME,
+                "bulk": settings.EMBEDDING_BULK_QUEUE_NAME
+            },
+            "processed": processed,
+            "failed": failed
+        }
+        stats["content_fetch"] = self.content_fetcher.stats()
+        stats["concurrency"] = {
+            **self.controller.stats(),
+            "prefetch_count": self._prefetch_count(self.controller.limit)
+        }
+        if self.batch_consumer is not None:
+            stats["lanes"] = {
+                "waiting": self.batch_consumer.lane_depths(),
+                "processed": dict(self.batch_consumer.lane_counts)
+            }
+        return stats
+
+    async def stop(self, timeout: float = 0.0):
+        """
+        Stop consuming and close the broker connection
+
+        With a timeout, consumers are cancelled first and the batch in
+        flight gets up to timeout seconds to finish; anything unacked when
+        the connection closes is redelivered.
+        """
+        self.state = "stopping"
+        if timeout > 0:
+            for queue, consumer_tag, _ in self._consumers:
+                try:
+                    await queue.cancel(consumer_tag)
+                except Exception as e:
+                    print(f"Failed to cancel consumer {consumer_tag}: {e}")
+            if self.batch_consumer is not None:
+                await self.batch_consumer.drain(timeout)
+        self.state = "stopped"
+        if self.connection:
+            await self.connection.close()
+        await self.content_fetcher.close()
@@ -0,0 +1,135 @@
+import aio_pika
+from datetime import datetime
+from typing import Dict, Set
+from config import settings
+
+
+ATTEMPTS_HEADER = "x-attempts"
+ORIGIN_QUEUE_HEADER = "x-origin-queue"
+ERROR_HEADER = "x-last-error"
+FAILED_AT_HEADER = "x-failed-at"
+
+
+def retry_queue_name(queue_name: str, attempt: int) -> str:
+    return f"{queue_name}.retry.{attempt}"
+
+
+def dead_letter_queue_name(queue_name: str) -> str:
+    return f"{queue_name}.dead"
+
+
+async def safe_ack(message: aio_pika.IncomingMessage) -> bool:
+    """Ack a message, logging instead of raising if the channel rejects it"""
+    try:
+        await message.ack()
+        return True
+    except Exception as e:
+        print(f"Failed to ack message, the broker will redeliver it: {e}")
+        return False
+
+
+class RetryHandler:
+    """
+    Bounded retries with exponential backoff, then a dead-letter queue
+
+    A failed message is acked and republished to a delay queue for its
+    attempt number, {queue}.retry.{n}, with a per-message TTL of
+    RETRY_BASE_DELAY_MS * 2^(n-1) (capped at RETRY_MAX_DELAY_MS). The delay
+    queue has no consumer: when the TTL expires the broker dead-letters
+    the message back onto its original queue. One delay queue per attempt
+    keeps every message in a queue on the same TTL, so a long delay never
+    holds up a shorter one behind it. The x-attempts header counts
+    deliveries; once it reaches MAX_DELIVERY_ATTEMPTS the message is moved
+    to {queue}.dead with the last error attached for inspection and replay.
+    """
+
+    def __init__(self, channel: aio_pika.abc.AbstractChannel):
+        self.channel = channel
+        self._declared: Set[str] = set()
+
+    async def retry_or_dead_letter(self, message: aio_pika.IncomingMessage, error: Exception):
+        """Schedule a retry for a failed message, or dead-letter it when out of attempts"""
+        headers = dict(message.headers or {})
+        origin = headers.get(ORIGIN_QUEUE_HEADER) or message.routing_key or settings.EMBEDDING_QUEUE_NAME
+        attempt = int(headers.get(ATTEMPTS_HEADER, 1))
+
+        if attempt >= settings.MAX_DELIVERY_ATTEMPTS:
+            await self.dead_letter(message, error)
+            return
+
+        delay_ms = min(settings.RETRY_BASE_DELAY_MS * 2 ** (attempt - 1), settings.RETRY_MAX_DELAY_MS)
+        retry_queue = await self._declare_retry_queue(origin, attempt)
+        headers.update({
+            ATTEMPTS_HEADER: attempt + 1,
+            ORIGIN_QUEUE_HEADER: origin,
+            ERROR_HEADER: str(error)[:1000]
+        })
+
+        await self.channel.default_exchange.publish(
+            self._copy(message, headers, expiration=delay_ms / 1000.0),
+            routing_key=retry_queue
+        )
+        await message.ack()
+        print(f"Scheduled retry {attempt + 1}/{settings.MAX_DELIVERY_ATTEMPTS} in {delay_ms}ms via {retry_queue}")
+
+    async def fail(self, message: aio_pika.IncomingMessage, error: Exception, retry: bool = True):
+        """
+        Retry or dead-letter a failed message; requeue it if the broker rejects both
+        
+        Never raises, so a broken channel can't leave the rest of a batch
+        unsettled.
+        """
+        try:
+            if retry:
+                await self.retry_or_dead_letter(message, error)
+            else:
+                await self.dead_letter(message, error)
+        except Exception as e:
+            print(f"Failed to reschedule message, requeueing: {e}")
+            try:
+                await message.nack(requeue=True)
+            except Exception as nack_error:
+                print(f"Failed to requeue message, the broker will redeliver it: {nack_error}")
+    
+    async def dead_letter(self, message: aio_pika.IncomingMessage, error: Exception):
+        """Move a message to its origin queue's dead-letter queue"""
+        headers = dict(message.headers or {})
+        origin = headers.get(ORIGIN_QUEUE_HEADER) or message.routing_key or settings.EMBEDDING_QUEUE_NAME
+        dead_queue = await self._declare(dead_letter_queue_name(origin))
+        headers.update({
+            ATTEMPTS_HEADER: int(headers.get(ATTEMPTS_HEADER, 1)),
+            ORIGIN_QUEUE_HEADER: origin,
+            ERROR_HEADER: str(error)[:1000],
+            FAILED_AT_HEADER: datetime.utcnow().isoformat()
+        })
+
+        await self.channel.default_exchange.publish(
+            self._copy(message, headers),
+            routing_key=dead_queue
+        )
+        await message.ack()
+        print(f"Moved message to dead-letter queue {dead_queue}: {error}")
+
+    async def _declare_retry_queue(self, origin: str, attempt: int) -> str:
+        return await self._declare(
+            retry_queue_name(origin, attempt),
+            arguments={
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": origin
+            }
+        )
+
+    async def _declare(self, name: str, arguments: Dict = None) -> str:
+        if name not in self._declared:
+            await self.channel.declare_queue(name, durable=True, arguments=arguments)
+            self._declared.add(name)
+        return name
+
+    def _copy(self, message: aio_pika.IncomingMessage, headers: Dict, expiration: float = None) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=message.body,
+            headers=headers,
+            content_type=message.content_type,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            expiration=expiration
+        )
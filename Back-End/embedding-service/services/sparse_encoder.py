@@ -0,0 +1,48 @@
+import hashlib
+from collections import Counter
+from typing import Dict, List
+from config import settings
+from services.duplicate_index import tokenize
+
+
+def term_id(term: str) -> int:
+    """Stable 31-bit id of a term, so no vocabulary has to be shared"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "big") & 0x7FFFFFFF
+
+
+class SparseEncoder:
+    """
+    BM25 term weights for the vector DB's sparse "bm25" vector
+
+    Documents get the BM25 term-frequency part of the score, saturated by
+    BM25_K1 and normalized by length against BM25_AVG_DOC_TOKENS; queries
+    get weight 1 per distinct term. The IDF part is applied by Qdrant (the
+    sparse vector is configured with the IDF modifier), so it always
+    reflects the collection's current statistics. Terms are the same
+    lowercased NFKC word tokens the duplicate index uses, hashed to ids.
+    """
+
+    def __init__(self):
+        self.k1 = settings.BM25_K1
+        self.b = settings.BM25_B
+        self.avg_doc_tokens = settings.BM25_AVG_DOC_TOKENS
+
+    def _vector(self, weights: Dict[int, float]) -> Dict[str, List]:
+        indices = sorted(weights)
+        return {"indices": indices, "values": [round(weights[index], 4) for index in indices]}
+
+    def encode_document(self, text: str) -> Dict[str, List]:
+        tokens = tokenize(text)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_tokens)
+        weights: Dict[int, float] = {}
+        for term, count in Counter(tokens).items():
+            index = term_id(term)
+            # Hash collisions add up, as they would for the same term
+            weights[index] = weights.get(index, 0.0) + count * (self.k1 + 1) / (count + norm)
+        return self._vector(weights)
+
+    def encode_documents(self, texts: List[str]) -> List[Dict[str, List]]:
+        return [self.encode_document(text) for text in texts]
+
+    def encode_query(self, text: str) -> Dict[str, List]:
+        return self._vector({term_id(term): 1.0 for term in set(tokenize(text))})
@@ -0,0 +1,114 @@
+import re
+from typing import List, Dict, Tuple
+
+
+# Sentence boundaries: terminal punctuation followed by whitespace, or a blank line
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+
+class TextChunker:
+    """
+    Split documents into overlapping, token-bounded chunks
+
+    Sentences are packed into windows of at most max_tokens tokens (as
+    counted by the embedding model's tokenizer). Consecutive windows share
+    up to overlap_tokens tokens worth of whole sentences so that context
+    spanning a boundary is searchable from both sides. A sentence longer
+    than a window is split on token offsets. Each chunk keeps its
+    character offsets into the original text.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, overlap_tokens: int):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    def chunk(self, text: str) -> List[Dict]:
+        """Return chunks as dicts with chunk_index, text, char_start and char_end"""
+        spans = []
+        for start, end in self._sentence_spans(text):
+            length = self._count_tokens(text[start:end])
+            if length > self.max_tokens:
+                spans.extend(self._split_long_span(text, start, end))
+            else:
+                spans.append((start, end, length))
+
+        if not spans:
+            return [self._make_chunk(text, 0, 0, len(text))]
+
+        chunks = []
+        window: List[Tuple[int, int, int]] = []
+        window_tokens = 0
+        for span in spans:
+            if window and window_tokens + span[2] > self.max_tokens:
+                chunks.append(self._make_chunk(text, len(chunks), window[0][0], window[-1][1]))
+                window = self._overlap_tail(window)
+                window_tokens = sum(s[2] for s in window)
+                # The overlap must leave room for the incoming sentence
+                while window and window_tokens + span[2] > self.max_tokens:
+                    window_tokens -= window.pop(0)[2]
+            window.append(span)
+            window_tokens += span[2]
+
+        chunks.append(self._make_chunk(text, len(chunks), window[0][0], window[-1][1]))
+        return chunks
+
+    def _sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Character spans of the sentences in text, whitespace trimmed"""
+        spans = []
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            self._append_trimmed(spans, text, start, match.start())
+            start = match.end()
+        self._append_trimmed(spans, text, start, len(text))
+        return spans
+
+    def _append_trimmed(self, spans: List[Tuple[int, int]], text: str, start: int, end: int):
+        segment = text[start:end]
+        stripped = segment.strip()
+        if stripped:
+            start += len(segment) - len(segment.lstrip())
+            spans.append((start, start + len(stripped)))
+
+    def _split_long_span(self, text: str, start: int, end: int) -> List[Tuple[int, int, int]]:
+        """Cut a sentence that exceeds the window on token boundaries"""
+        offsets = self._token_offsets(text[start:end])
+        pieces = []
+        step = self.max_tokens - self.overlap_tokens
+        for first in range(0, len(offsets), step):
+            window = offsets[first:first + self.max_tokens]
+            pieces.append((start + window[0][0], start + window[-1][1], len(window)))
+            if first + self.max_tokens >= len(offsets):
+                break
+        return pieces
+
+    def _overlap_tail(self, window: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """Trailing spans of a window that fit in the overlap budget"""
+        tail = []
+        tokens = 0
+        for span in reversed(window):
+            if tokens + span[2] > self.overlap_tokens:
+                break
+            tail.insert(0, span)
+            tokens += span[2]
+        return tail
+
+    def _count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return len(text.split())
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _token_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Character offsets of each token in text"""
+        if self.tokenizer is None:
+            return [(m.start(), m.end()) for m in re.finditer(r'\S+', text)]
+        encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [tuple(offset) for offset in encoded["offset_mapping"]]
+
+    def _make_chunk(self, text: str, index: int, start: int, end: int) -> Dict:
+        return {
+            "chunk_index": index,
+            "text": text[start:end],
+            "char_start": start,
+            "char_end": end
+        }
@@ -1,9 +1,22 @@
 import httpx
-from typing import List, Dict
+import uuid
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from config import settings
 
 
+def chunk_point_id(item_id: str, chunk_index: int) -> str:
+    """
+    Vector DB point id for one chunk of an archive item
+    
+    The first chunk reuses the item id so single-chunk items keep the
+    point id they always had; further chunks get a stable UUIDv5.
+    """
+    if chunk_index == 0:
+        return item_id
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"omnia:{item_id}#{chunk_index}"))
+
+
 class VectorStoreService:
     def __init__(self):
         self.client = httpx.AsyncClient(
@@ -14,70 +27,203 @@ class VectorStoreService:
             base_url=settings.ARCHIVE_SERVICE_URL,
             timeout=10.0
         )
+        self.archive_update_failures = 0
     
-    async def store_embedding(
+    async def store_items(
+        self,
+        items: List[Dict],
+        embedding_spec: Optional[Dict] = None,
+        secondary_spec: Optional[Dict] = None
+    ) -> List[Optional[Exception]]:
+        """
+        Store the chunks of several items and update their archive status
+        
+        Items are dicts with item_id, field, chunks, embeddings and metadata.
+        All points of a field are written in one request, through the bulk
+        upsert endpoint whenever there is more than one point. The vector DB
+        routes them by embedding_spec (model, dim, reduction) to the field's
+        collection for that model. During a model migration items also carry
+        secondary_embeddings, written with secondary_spec to the new model's
+        collection; an item only succeeds once both writes did. Once an
+        item's chunks are written, chunks it had beyond its new chunk count
+        (from a longer earlier version) are deleted; if that fails the item
+        fails too, so a retry doesn't leave outdated chunks searchable.
+        Each item gets status_reported set in place to whether the archive
+        status callback succeeded. Returns None or the error for each item,
+        in order.
+        """
+        errors: List[Optional[Exception]] = [None] * len(items)
+        by_field: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            by_field.setdefault(item["field"], []).append(index)
+        
+        spaces = [("embeddings", embedding_spec)]
+        if secondary_spec:
+            spaces.append(("secondary_embeddings", secondary_spec))
+        
+        for field, indexes in by_field.items():
+            for embeddings_key, spec in spaces:
+                points = []
+                owners = []
+                for index in indexes:
+                    for point in self._build_points(items[index], embeddings_key):
+                        points.append(point)
+                        owners.append(index)
+                
+                try:
+                    failures = await self._upsert_points(field, points, spec)
+                except Exception as e:
+                    for index in indexes:
+                        errors[index] = Exception(f"Failed to store embedding: {e}")
+                    continue
+                
+                for position, error in failures.items():
+                    errors[owners[position]] = Exception(f"Failed to store embedding: {error}")
+                model = f" ({spec['model']})" if secondary_spec and spec else ""
+                print(f"Stored {len(points) - len(failures)}/{len(points)} point(s) in field {field}{model}")
+                
+                stored = [index for index in indexes if errors[index] is None]
+                try:
+                    await self._prune_stale_chunks(
+                        field,
+                        {items[index]["item_id"]: len(items[index]["chunks"]) for index in stored},
+                        spec
+                    )
+                except Exception as e:
+                    print(f"Failed to delete stale chunks in field {field}: {e}")
+                    for index in stored:
+                        errors[index] = Exception(f"Failed to delete stale chunks: {e}")
+        
+        reported = await self._update_archive_embedding_statuses([
+            (item["item_id"], "failed" if error else "completed")
+            for item, error in zip(items, errors)
+        ])
+        for item in items:
+            item["status_reported"] = reported
+        return errors
+    
+    async def store_duplicates(self, duplicates: List[Tuple[str, str, str]]) -> bool:
+        """
+        Record (item_id, field, canonical_item_id) near-duplicates
+        
+        Points an item had from an earlier embedding are deleted so it no
+        longer shows up in search, and its archive status becomes
+        "duplicate" with a link to the canonical item. Returns whether the
+        archive status callback succeeded.
+        """
+        by_field: Dict[str, List[str]] = {}
+        for item_id, field, _ in duplicates:
+            by_field.setdefault(field, []).append(item_id)
+        
+        for field, item_ids in by_field.items():
+            try:
+                response = await self.client.post(
+                    f"/api/v1/index/{field}/items/delete",
+                    json={"item_ids": item_ids}
+                )
+                # 404: the field has no collection yet, so nothing to delete
+                if response.status_code != 404:
+                    response.raise_for_status()
+            except Exception as e:
+                print(f"Warning: Failed to delete points of duplicate items in field {field}: {e}")
+        
+        return await self._update_archive_embedding_statuses(
+            [(item_id, "duplicate") for item_id, _, _ in duplicates],
+            canonical_ids={item_id: canonical_id for item_id, _, canonical_id in duplicates}
+        )
+    
+    def _build_points(self, item: Dict, embeddings_key: str = "embeddings") -> List[Dict]:
+        """One vector DB point per chunk of an item, with its sparse BM25 vector if computed"""
+        chunks = item["chunks"]
+        sparse_vectors = item.get("sparse_vectors") or [None] * len(chunks)
+        return [
+            {
+                "id": chunk_point_id(item["item_id"], chunk["chunk_index"]),
+                "vector": embedding,
+                "sparse_vector": sparse_vector,
+                "payload": {
+                    "content": chunk["text"],
+                    "metadata": item["metadata"],
+                    "item_id": item["item_id"],
+                    # Top-level copies for the vector DB's payload indexes
+                    "content_type": item.get("content_type", "text"),
+                    "created_at": item["metadata"].get("created_at"),
+                    "chunk_index": chunk["chunk_index"],
+                    "chunk_count": len(chunks),
+                    "char_start": chunk["char_start"],
+                    "char_end": chunk["char_end"]
+                }
+            }
+            for chunk, embedding, sparse_vector in zip(chunks, item[embeddings_key], sparse_vectors)
+        ]
+    
+    async def _upsert_points(
         self,
-        item_id: str,
         field: str,
-        embedding: List[float],
-        content: str,
-        metadata: Dict
-    ):
-        """Store embedding in vector database and update archive status"""
-        try:
-            # Store in vector DB
+        points: List[Dict],
+        embedding_spec: Optional[Dict] = None
+    ) -> Dict[int, str]:
+        """Write points to a field's collection, returning errors by point position"""
+        if len(points) == 1:
             response = await self.client.post(
                 f"/api/v1/index/{field}/upsert",
-                json={
-                    "id": item_id,
-                    "vector": embedding,
-                    "payload": {
-                        "content": content,
-                        "metadata": metadata
-                    }
-                }
+                json={**points[0], "embedding": embedding_spec}
             )
             response.raise_for_status()
-            print(f"Stored embedding for {item_id} in field {field}")
-            
-            # Update archive item status with embedding vector
-            await self._update_archive_embedding_status(
-                item_id=item_id,
-                status="completed",
-                embedding_vector=embedding
-            )
+            return {}
         
-        except Exception as e:
-            # Mark as failed in archive
-            await self._update_archive_embedding_status(
-                item_id=item_id,
-                status="failed"
-            )
-            raise Exception(f"Failed to store embedding: {e}")
+        response = await self.client.post(
+            f"/api/v1/index/{field}/upsert/batch",
+            json={"points": points, "embedding": embedding_spec}
+        )
+        response.raise_for_status()
+        return {
+            position: result.get("error", "upsert failed")
+            for position, result in enumerate(response.json()["results"])
+            if result["status"] != "ok"
+        }
+    
+    async def _prune_stale_chunks(self, field: str, chunk_counts: Dict[str, int], embedding_spec: Optional[Dict] = None):
+        """Delete points of items beyond their current chunk count, in the collection for embedding_spec"""
+        if not chunk_counts:
+            return
+        response = await self.client.post(
+            f"/api/v1/index/{field}/items/prune",
+            json={"chunk_counts": chunk_counts, "embedding": embedding_spec}
+        )
+        response.raise_for_status()
     
-    async def _update_archive_embedding_status(
+    async def _update_archive_embedding_statuses(
         self,
-        item_id: str,
-        status: str,
-        embedding_vector: List[float] = None
-    ):
-        """Update the embedding status and vector in the archive service"""
+        statuses: List[Tuple[str, str]],
+        canonical_ids: Optional[Dict[str, str]] = None
+    ) -> bool:
+        """Report (item_id, status) pairs, and canonical items of duplicates, to the archive service in one call"""
+        if not statuses:
+            return True
         try:
-            payload = {
-                "embedding_status": status,
-                "embedding_created_at": datetime.utcnow().isoformat()
-            }
-            if embedding_vector:
-                payload["embedding_vector"] = embedding_vector
-            
+            embedding_created_at = datetime.utcnow().isoformat()
             response = await self.archive_client.patch(
-                f"/api/v1/archive/{item_id}/embedding-status",
-                json=payload
+                "/api/v1/archive/embedding-status",
+                json={
+                    "items": [
+                        {
+                            "item_id": item_id,
+                            "embedding_status": status,
+                            "embedding_created_at": embedding_created_at,
+                            "canonical_item_id": (canonical_ids or {}).get(item_id)
+                        }
+                        for item_id, status in statuses
+                    ]
+                }
             )
             response.raise_for_status()
-            print(f"Updated embedding status for {item_id}: {status}")
+            print(f"Updated embedding status for {len(statuses)} item(s)")
+            return True
         except Exception as e:
+            self.archive_update_failures += 1
             print(f"Warning: Failed to update archive embedding status: {e}")
+            return False
     
     async def close(self):
         """Close connections"""
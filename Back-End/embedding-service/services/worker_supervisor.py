@@ -0,0 +1,202 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from typing import Dict, List, Optional
+from config import settings
+from services.inference_backend import EmbeddingBackend, load_backend
+
+
+def worker_threads(num_workers: int) -> int:
+    """Inference threads per worker: WORKER_THREADS, or the host's cores split evenly"""
+    if settings.WORKER_THREADS > 0:
+        return settings.WORKER_THREADS
+    return max(1, (os.cpu_count() or 1) // num_workers)
+
+
+class WorkerSupervisor:
+    """
+    Forks WORKER_PROCESSES queue consumers that share one loaded model
+
+    The model is loaded once in the parent and the workers are forked
+    before it has run any inference, so the weights are shared
+    copy-on-write and no inference thread pool exists yet at fork time.
+    onnxruntime sessions do not survive fork(); with an ONNX backend each
+    worker loads its own session after forking, as it does the
+    SECONDARY_HF_MODEL of a model migration. Each worker pins its
+    inference thread count, runs its own consumer on its own broker
+    connection and reports throughput to the parent every
+    WORKER_STATS_INTERVAL_S seconds.
+
+    start() must run before the parent starts any threads (i.e. before the
+    HTTP server), and a worker that exits is reported, not re-forked.
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self.threads = worker_threads(num_workers)
+        self.backend: Optional[EmbeddingBackend] = None
+        self.model_load_seconds: Optional[float] = None
+        self._context = multiprocessing.get_context("fork")
+        self._reports = self._context.Queue()
+        self._processes: List[multiprocessing.Process] = []
+        self._stats: Dict[int, Dict] = {}
+
+    def start(self):
+        """Load the model and fork the workers"""
+        load_started = time.monotonic()
+        self.backend = load_backend(
+            settings.EMBEDDING_BACKEND,
+            settings.HF_MODEL,
+            cache_dir=settings.HF_CACHE_DIR,
+            onnx_dir=settings.ONNX_MODEL_DIR
+        )
+        self.model_load_seconds = round(time.monotonic() - load_started, 2)
+        print(f"✓ Model loaded in {self.model_load_seconds}s, forking {self.num_workers} workers "
+              f"with {self.threads} inference thread(s) each")
+
+        shared_backend = self.backend if self.backend.fork_safe else None
+        for index in range(self.num_workers):
+            process = self._context.Process(
+                target=run_worker,
+                args=(index, shared_backend, self.threads, self._reports),
+                name=f"embedding-worker-{index}"
+            )
+            process.start()
+            self._processes.append(process)
+            self._stats[index] = {"worker": index, "pid": process.pid, "state": "starting"}
+
+    async def monitor(self):
+        """Collect worker reports until the supervisor is stopped"""
+        while True:
+            self._collect()
+            await asyncio.sleep(1.0)
+
+    def _collect(self):
+        while True:
+            try:
+                report = self._reports.get_nowait()
+            except queue.Empty:
+                break
+            self._stats[report["worker"]] = report
+
+        for index, process in enumerate(self._processes):
+            if not process.is_alive() and self._stats[index].get("state") != "exited":
+                print(f"Embedding worker {index} (pid {process.pid}) exited with code {process.exitcode}")
+                self._stats[index] = {**self._stats[index], "state": "exited", "exitcode": process.exitcode}
+
+    @property
+    def all_consuming(self) -> bool:
+        self._collect()
+        return all(stats.get("state") == "consuming" for stats in self._stats.values())
+
+    @property
+    def any_exited(self) -> bool:
+        self._collect()
+        return any(stats.get("state") == "exited" for stats in self._stats.values())
+
+    def stats(self) -> Dict:
+        self._collect()
+        workers = [self._stats[index] for index in sorted(self._stats)]
+        return {
+            "workers": workers,
+            "threads_per_worker": self.threads,
+            "processed": sum(worker.get("processed", 0) for worker in workers),
+            "failed": sum(worker.get("failed", 0) for worker in workers),
+            "duplicates": sum(worker.get("duplicates", 0) for worker in workers),
+            "items_per_second": round(sum(worker.get("items_per_second", 0.0) for worker in workers), 2)
+        }
+
+    def stop(self, timeout: float = settings.WORKER_SHUTDOWN_TIMEOUT_S):
+        """SIGTERM every worker, wait for them to drain, then SIGKILL stragglers"""
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"Embedding worker {process.name} did not stop in {timeout}s, killing it")
+                process.kill()
+                process.join()
+
+
+def run_worker(index: int, backend: Optional[EmbeddingBackend], threads: int, reports):
+    """Entry point of a forked worker process"""
+    import torch
+
+    # Pin intra-op parallelism so N workers don't oversubscribe the cores
+    torch.set_num_threads(threads)
+    if backend is None:
+        backend = load_backend(
+            settings.EMBEDDING_BACKEND,
+            settings.HF_MODEL,
+            cache_dir=settings.HF_CACHE_DIR,
+            onnx_dir=settings.ONNX_MODEL_DIR,
+            threads=threads
+        )
+    try:
+        asyncio.run(_worker_main(index, backend, reports))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_main(index: int, backend: EmbeddingBackend, reports):
+    # Imported here so the parent doesn't pull in the consumer stack it never runs
+    from services.embedding_generator import EmbeddingGenerator, load_secondary_generator
+    from services.vector_store import VectorStoreService
+    from services.ingest_pipeline import IngestPipeline
+    from services.queue_consumer import QueueConsumer
+
+    embedding_generator = EmbeddingGenerator(backend=backend)
+    await embedding_generator.warm_up()
+    vector_store = VectorStoreService()
+    pipeline = IngestPipeline(embedding_generator, vector_store, load_secondary_generator())
+    consumer = QueueConsumer(pipeline)
+
+    loop = asyncio.get_running_loop()
+    consume_task = asyncio.create_task(consumer.run())
+    stopping = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    def report(last: Dict) -> Dict:
+        stats = consumer.stats()
+        now = time.monotonic()
+        elapsed = now - last["at"]
+        current = {
+            "worker": index,
+            "pid": os.getpid(),
+            "state": stats["state"],
+            "processed": stats["processed"],
+            "failed": stats["failed"],
+            "duplicates": pipeline.dedup_stats().get("duplicates", 0),
+            "concurrency_limit": stats["concurrency"]["limit"],
+            "items_per_second": round((stats["processed"] - last["processed"]) / elapsed, 2) if elapsed > 0 else 0.0,
+            "inference": embedding_generator.inference_stats(),
+            "at": now
+        }
+        reports.put({key: value for key, value in current.items() if key != "at"})
+        return current
+
+    last = {"processed": 0, "at": time.monotonic()}
+    while not stopping.is_set() and not consume_task.done():
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=settings.WORKER_STATS_INTERVAL_S)
+        except asyncio.TimeoutError:
+            pass
+        last = report(last)
+
+    print(f"Embedding worker {index} shutting down...")
+    await consumer.stop(timeout=settings.WORKER_SHUTDOWN_TIMEOUT_S)
+    consume_task.cancel()
+    try:
+        await consume_task
+    except (asyncio.CancelledError, Exception):
+        pass
+    report(last)
+    await pipeline.close()
+    await vector_store.close()
+    await embedding_generator.close()
@@ -102,7 +102,8 @@ async def process_query(request: QueryRequest):
             query_id=query_id,
             query_text=request.query,
             fields=request.fields,
-            max_results=request.max_results
+            max_results=request.max_results,
+            query_filter=request.filter
         )
         
         logger.info(f"[QUERY {query_id}] Processed successfully. Agents consulted: {result.get('agents_consulted', [])}")
@@ -7,6 +7,7 @@ class QueryRequest(BaseModel):
     query: str
     fields: Optional[List[str]] = None  # Specific fields to search, None = all
     max_results: int = 5
+    filter: Optional[Dict] = None  # Qdrant filter JSON applied to every agent's vector search
 
 
 class QueryResponse(BaseModel):
@@ -26,7 +26,8 @@ class QueryProcessor:
         query_id: str,
         query_text: str,
         fields: Optional[List[str]] = None,
-        max_results: int = 5
+        max_results: int = 5,
+        query_filter: Optional[Dict] = None
     ) -> Dict:
         """
         Process a query through the agentic RAG system
@@ -69,7 +70,8 @@ class QueryProcessor:
                 response = await self._query_agent(
                     agent_url=agent_info["agent_url"],
                     query=query_text,
-                    max_results=max_results
+                    max_results=max_results,
+                    query_filter=query_filter
                 )
                 logger.info(f"[{query_id}] Received response from '{field}' agent")
                 agent_responses.append({
@@ -118,7 +120,8 @@ class QueryProcessor:
         self,
         agent_url: str,
         query: str,
-        max_results: int
+        max_results: int,
+        query_filter: Optional[Dict] = None
     ) -> Dict:
         """Query a specific field agent"""
         async with httpx.AsyncClient(timeout=30.0) as client:
@@ -126,7 +129,8 @@ class QueryProcessor:
                 f"{agent_url}/query",
                 json={
                     "query": query,
-                    "max_results": max_results
+                    "max_results": max_results,
+                    "filter": query_filter
                 }
             )
             response.raise_for_status()
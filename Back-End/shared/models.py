@@ -43,10 +43,25 @@ class VectorSearchResult(BaseModel):
     metadata: Dict
 
 
+EMBEDDING_MESSAGE_VERSION = 2
+
+
 class EmbeddingMessage(BaseModel):
-    """Message format for embedding queue"""
+    """
+    Message format for embedding queue (claim check)
+    
+    Version 2 carries a reference to the content instead of the content
+    itself: consumers fetch it from archive-service by item_id and can
+    check it against content_hash (utils.content_hash of the text). Content up
+    to the publisher's inline limit is still sent in the message to save
+    the round trip. Version 1 messages had no schema_version and always
+    carried content.
+    """
+    schema_version: int = EMBEDDING_MESSAGE_VERSION
     item_id: str
     field: str
     content_type: str
-    content: str
+    content_hash: str
+    content_length: int
+    content: Optional[str] = None
     metadata: Dict = {}
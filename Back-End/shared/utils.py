@@ -1,6 +1,9 @@
 """
 Common utility functions
 """
+import hashlib
+import re
+import unicodedata
 import uuid
 from datetime import datetime
 from typing import Optional
@@ -38,3 +41,17 @@ def validate_field_name(field: str) -> bool:
     import re
     pattern = r'^[a-z0-9_]+$'
     return bool(re.match(pattern, field))
+
+
+def content_hash(text: str) -> str:
+    """
+    SHA-256 of the normalized text (NFC, collapsed whitespace)
+
+    Used for embedding-message claim checks, backfill messages and the
+    embedding cache key. The services don't import this package at
+    runtime; archive-service and embedding-service each carry a copy of
+    this function that must stay identical (test_content_hash.py checks it).
+    """
+    normalized = unicodedata.normalize("NFC", text or "")
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for content_hash
+
+archive-service (claim checks), embedding-service (backfill messages and
+the embedding cache) and shared/utils.py each define it; the copies must
+stay identical or claim-check and cache lookups stop matching.
+"""
+
+import ast
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from shared.utils import content_hash
+
+COPIES = [
+    "shared/utils.py",
+    "archive-service/services/message_queue.py",
+    "embedding-service/services/embedding_cache.py",
+]
+
+
+def function_body(path: str) -> str:
+    """AST of content_hash in a file, without its docstring"""
+    with open(os.path.join(ROOT, path)) as source:
+        tree = ast.parse(source.read())
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "content_hash":
+            return ast.dump(ast.Module(body=node.body[1:], type_ignores=[]))
+    raise AssertionError(f"{path} defines no content_hash")
+
+
+@pytest.mark.parametrize("path", COPIES[1:])
+def test_copies_match_shared_definition(path):
+    assert function_body(path) == function_body(COPIES[0])
+
+
+def test_whitespace_and_unicode_form_do_not_change_the_hash():
+    assert content_hash("cafe\u0301  au\n lait ") == content_hash("caf\u00e9 au lait")
+
+
+def test_different_text_has_a_different_hash():
+    assert content_hash("first note") != content_hash("second note")
+    assert content_hash(None) == content_hash("")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
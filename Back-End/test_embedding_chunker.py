@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the embedding service's token chunker
+
+Chunks stay within the token window, overlap by whole sentences, keep
+their character offsets into the document and together cover all of it.
+Without a tokenizer the chunker counts whitespace-separated words, which
+keeps these tests independent of any model.
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding-service"))
+
+import pytest
+
+from services.text_chunker import TextChunker
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+def document(sentences: int, words_per_sentence: int = 5) -> str:
+    return " ".join(
+        " ".join(f"s{index}w{word}" for word in range(words_per_sentence)) + "."
+        for index in range(sentences)
+    )
+
+
+def test_short_text_is_one_chunk():
+    text = "A short note. Nothing to split."
+    chunks = TextChunker(None, max_tokens=50, overlap_tokens=10).chunk(text)
+    assert chunks == [{"chunk_index": 0, "text": text, "char_start": 0, "char_end": len(text)}]
+
+
+def test_empty_text_is_one_empty_chunk():
+    chunks = TextChunker(None, max_tokens=50, overlap_tokens=10).chunk("")
+    assert [chunk["text"] for chunk in chunks] == [""]
+
+
+def test_chunks_stay_within_the_window_and_keep_offsets():
+    text = document(sentences=20)
+    chunks = TextChunker(None, max_tokens=12, overlap_tokens=5).chunk(text)
+
+    assert len(chunks) > 1
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert words(chunk["text"]) <= 12
+        assert text[chunk["char_start"]:chunk["char_end"]] == chunk["text"]
+
+
+def test_consecutive_chunks_share_whole_sentences():
+    text = document(sentences=20)
+    chunks = TextChunker(None, max_tokens=12, overlap_tokens=5).chunk(text)
+
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current["char_start"] < previous["char_end"]
+        shared = text[current["char_start"]:previous["char_end"]]
+        # The overlap is the previous chunk's last sentence, not a word fragment
+        assert shared.endswith(".") and words(shared) == 5
+
+
+def test_chunks_cover_every_sentence():
+    text = document(sentences=20)
+    chunks = TextChunker(None, max_tokens=12, overlap_tokens=5).chunk(text)
+
+    covered = set()
+    for chunk in chunks:
+        covered.update(re.findall(r"s(\d+)w", chunk["text"]))
+    assert covered == {str(index) for index in range(20)}
+
+
+def test_overlong_sentence_is_split_on_token_boundaries():
+    text = " ".join(f"w{index}" for index in range(30))
+    chunks = TextChunker(None, max_tokens=10, overlap_tokens=2).chunk(text)
+
+    assert [chunk["text"].split()[0] for chunk in chunks] == ["w0", "w8", "w16", "w24"]
+    for chunk in chunks:
+        assert words(chunk["text"]) <= 10
+        assert text[chunk["char_start"]:chunk["char_end"]] == chunk["text"]
+    assert chunks[-1]["text"].split()[-1] == "w29"
+
+
+def test_overlap_is_capped_at_half_the_window():
+    assert TextChunker(None, max_tokens=10, overlap_tokens=8).overlap_tokens == 5
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
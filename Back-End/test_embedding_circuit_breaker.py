@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for the fallback circuit breaker
+
+A half-open trial must not wedge the breaker when it ends without an outcome.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding-service"))
+
+import pytest
+
+from services.circuit_breaker import CircuitBreaker
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return breaker
+
+
+def test_only_one_trial_while_half_open():
+    breaker = open_breaker()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_released_trial_lets_the_next_call_through():
+    breaker = open_breaker()
+    assert breaker.allow()
+
+    breaker.release_trial()
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_trial_success_closes_the_circuit():
+    breaker = open_breaker()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Dict
 
 
 class Settings(BaseSettings):
@@ -12,9 +13,46 @@ class Settings(BaseSettings):
     QDRANT_API_KEY: str = ""
     
     # Collection Configuration
-    DEFAULT_VECTOR_SIZE: int = 768  # For google/gemma-2-2b-it embeddings
+    DEFAULT_VECTOR_SIZE: int = 384  # Must match EMBEDDING_DIM of the embedding service
     DISTANCE_METRIC: str = "Cosine"
     
+    # Reserved collection recording the model, dimension and reduction of each collection
+    METADATA_COLLECTION: str = "_collection_metadata"
+    
+    # "per_field": one collection per field; "shared": every field in
+    # SHARED_COLLECTION, told apart by an indexed "field" payload
+    STORAGE_MODE: str = "per_field"
+    SHARED_COLLECTION: str = "archive"
+    
+    # Payload indexes (path -> keyword | integer | float | datetime | text | bool)
+    # created on every collection, so filtered searches stay inside HNSW
+    PAYLOAD_INDEXES: Dict[str, str] = {
+        "metadata.tags": "keyword",
+        "content_type": "keyword",
+        "created_at": "datetime",
+        "metadata.title": "text",
+        "chunk_index": "integer"
+    }
+    
+    # Hybrid search: points carry a sparse BM25 vector under this name
+    # (IDF applied by Qdrant); each branch of a hybrid query prefetches
+    # limit * HYBRID_PREFETCH_MULTIPLIER candidates before RRF fusion
+    SPARSE_VECTOR_NAME: str = "bm25"
+    HYBRID_PREFETCH_MULTIPLIER: int = 4
+    
+    # Index tuning of new collections (PATCH /api/v1/index/{field} changes
+    # live ones). QUANTIZATION: "" (none), "scalar" (int8, ~4x less vector
+    # RAM) or "binary"; quantized vectors stay in RAM and, with
+    # VECTORS_ON_DISK, the originals are read from disk for rescoring
+    QUANTIZATION: str = ""
+    QUANTIZATION_ALWAYS_RAM: bool = True
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCT: int = 100
+    VECTORS_ON_DISK: bool = False
+    
+    # Bulk upserts are forwarded to Qdrant in sub-batches of this size
+    UPSERT_BATCH_SIZE: int = 256
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,10 +1,17 @@
 from fastapi import FastAPI, HTTPException, status
 from typing import List, Dict, Optional
 from pydantic import BaseModel
+import asyncio
 import logging
 
 from config import settings
-from services.qdrant_service import QdrantService
+from services.qdrant_service import (
+    QdrantService,
+    EmbeddingSpecMismatch,
+    parse_filter,
+    combine_filters,
+    search_params
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -19,22 +26,148 @@ app = FastAPI(
 )
 
 
+class EmbeddingSpec(BaseModel):
+    """Model, dimension and reduction that produced the vectors"""
+    model: Optional[str] = None
+    dim: Optional[int] = None
+    reduction: Optional[str] = None
+
+
+class SparseVectorData(BaseModel):
+    """Sparse term weights, e.g. BM25, as parallel index/value lists"""
+    indices: List[int]
+    values: List[float]
+
+
 class UpsertRequest(BaseModel):
     id: str
     vector: List[float]
     payload: Dict
+    sparse_vector: Optional[SparseVectorData] = None
+    embedding: Optional[EmbeddingSpec] = None
+
+
+class BatchUpsertRequest(BaseModel):
+    points: List[UpsertRequest]
+    embedding: Optional[EmbeddingSpec] = None
+
+
+class DeleteItemsRequest(BaseModel):
+    item_ids: List[str]
+
+
+class PruneChunksRequest(BaseModel):
+    chunk_counts: Dict[str, int]  # item_id -> number of chunks the item has now
+    embedding: Optional[EmbeddingSpec] = None
 
 
 class SearchRequest(BaseModel):
     vector: List[float]
     limit: int = 10
     score_threshold: Optional[float] = None
+    # Model of the query vector; searches the field's collection for that
+    # model, or the field's active collection when omitted
+    embedding: Optional[EmbeddingSpec] = None
+    # Qdrant filter JSON, e.g. {"must": [{"key": "metadata.tags", "match": {"any": ["travel"]}},
+    # {"key": "created_at", "range": {"gte": "2024-01-01T00:00:00Z"}}]}
+    filter: Optional[Dict] = None
+    # Recall/speed trade-off: a larger hnsw_ef explores more of the graph,
+    # exact skips the index; rescore/oversampling re-rank quantized hits
+    # with the original vectors
+    hnsw_ef: Optional[int] = None
+    exact: bool = False
+    rescore: Optional[bool] = None
+    oversampling: Optional[float] = None
+
+
+class HybridSearchRequest(SearchRequest):
+    # Query terms with weight 1 each; the collection's IDF modifier weighs them
+    sparse_vector: Optional[SparseVectorData] = None
+
+
+class MultiFieldSearchRequest(BaseModel):
+    vector: List[float]
+    fields: Optional[List[str]] = None  # every field when omitted
+    limit: int = 10
+    score_threshold: Optional[float] = None
+    embedding: Optional[EmbeddingSpec] = None
+    filter: Optional[Dict] = None
+    hnsw_ef: Optional[int] = None
+    exact: bool = False
+    rescore: Optional[bool] = None
+    oversampling: Optional[float] = None
+
+
+class CollectionTuning(BaseModel):
+    """Index settings of a collection; omitted ones are left unchanged"""
+    quantization: Optional[str] = None  # "scalar", "binary" or "none"
+    quantization_always_ram: Optional[bool] = None
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+    on_disk: Optional[bool] = None
+
+
+class ModelSpace(BaseModel):
+    collection: str
+    model: Optional[str] = None
+    dim: Optional[int] = None
+    reduction: Optional[str] = None
+    active: bool = False
+
+
+def spec_dict(embedding: Optional[EmbeddingSpec]) -> Optional[Dict]:
+    return embedding.model_dump(exclude_none=True) if embedding else None
+
+
+def request_filter(expression: Optional[Dict]):
+    """Parsed search filter, or 422 when it isn't a valid Qdrant filter"""
+    try:
+        return parse_filter(expression)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def request_params(request):
+    """Qdrant search params from a search request's hnsw_ef, exact, rescore and oversampling"""
+    return search_params(request.hnsw_ef, request.exact, request.rescore, request.oversampling)
+
+
+def mismatch_response(error: EmbeddingSpecMismatch) -> HTTPException:
+    """409 naming the models a field does have, so callers can switch or re-embed"""
+    return HTTPException(
+        status_code=409,
+        detail={"message": str(error), "available": error.available, "active": error.active}
+    )
 
 
 class SearchResult(BaseModel):
     id: str
     score: float
     payload: Dict
+    field: Optional[str] = None
+    # Dense similarity of a hybrid search result, whose score is a fused rank
+    similarity: Optional[float] = None
+
+
+async def check_query_dim(collection_name: str, vector: List[float]):
+    """409 when the query vector's dimension differs from the collection's"""
+    recorded = await qdrant_service.get_collection_metadata(collection_name) or {}
+    if recorded.get("dim") not in (None, len(vector)):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Collection '{collection_name}' holds {recorded['dim']}-dim vectors of model "
+                   f"{recorded.get('model')}, got a {len(vector)}-dim query vector"
+        )
+
+
+async def search_collection(field: str, request: SearchRequest) -> str:
+    """Collection a search of a field goes to, or 409 when it holds other vectors than the query's"""
+    try:
+        collection_name = await qdrant_service.resolve_collection(field, spec_dict(request.embedding))
+    except EmbeddingSpecMismatch as e:
+        raise mismatch_response(e)
+    await check_query_dim(collection_name, request.vector)
+    return collection_name
 
 
 @app.on_event("startup")
@@ -62,11 +195,31 @@ async def health_check():
 
 
 @app.post("/api/v1/index/{field}", status_code=status.HTTP_201_CREATED)
-async def create_index(field: str, vector_size: Optional[int] = None):
-    """Create a new collection (index) for a field"""
+async def create_index(
+    field: str,
+    vector_size: Optional[int] = None,
+    model: Optional[str] = None,
+    reduction: Optional[str] = None,
+    quantization: Optional[str] = None,
+    hnsw_m: Optional[int] = None,
+    hnsw_ef_construct: Optional[int] = None,
+    on_disk: Optional[bool] = None
+):
+    """Create a new collection (index) for a field, with optional quantization and HNSW settings"""
     try:
         size = vector_size or settings.DEFAULT_VECTOR_SIZE
-        await qdrant_service.create_collection(field, size)
+        tuning = CollectionTuning(
+            quantization=quantization,
+            hnsw_m=hnsw_m,
+            hnsw_ef_construct=hnsw_ef_construct,
+            on_disk=on_disk
+        )
+        await qdrant_service.create_collection(
+            qdrant_service.namespace(field),
+            size,
+            {"model": model, "reduction": reduction},
+            tuning.model_dump()
+        )
         return {"message": f"Collection created for field: {field}"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -74,19 +227,44 @@ async def create_index(field: str, vector_size: Optional[int] = None):
 
 @app.get("/api/v1/index/{field}/stats")
 async def get_index_stats(field: str):
-    """Get statistics for a field's collection"""
+    """Get statistics for a field's active collection"""
     try:
-        stats = await qdrant_service.get_collection_stats(field)
+        stats = await qdrant_service.get_collection_stats(await qdrant_service.get_active_collection(field), field)
         return stats
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@app.patch("/api/v1/index/{field}")
+async def update_index(field: str, request: CollectionTuning):
+    """
+    Change quantization, HNSW or on-disk settings of a field's collections
+    
+    Applies to the collection of every model the field has (in shared
+    mode, the shared collections, i.e. every field). Qdrant re-indexes in
+    the background; the collection stays searchable meanwhile.
+    """
+    spaces = await qdrant_service.model_spaces(field)
+    if not spaces:
+        raise HTTPException(status_code=404, detail=f"Field '{field}' has no collections")
+    try:
+        for space in spaces:
+            await qdrant_service.update_collection(space["collection"], request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "message": f"Updated {len(spaces)} collection(s) for field: {field}",
+        "collections": [space["collection"] for space in spaces]
+    }
+
+
 @app.delete("/api/v1/index/{field}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_index(field: str):
-    """Delete a collection"""
+    """Delete a field's collections, for every model"""
     try:
-        await qdrant_service.delete_collection(field)
+        await qdrant_service.delete_field(field)
         return None
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -96,13 +274,19 @@ async def delete_index(field: str):
 async def upsert_vector(field: str, request: UpsertRequest):
     """Insert or update a vector in the collection"""
     try:
+        embedding_spec = spec_dict(request.embedding)
         await qdrant_service.upsert_point(
-            collection_name=field,
+            collection_name=await qdrant_service.resolve_collection(field, embedding_spec, create=True),
             point_id=request.id,
             vector=request.vector,
-            payload=request.payload
+            payload=request.payload,
+            embedding_spec=embedding_spec,
+            field=field,
+            sparse_vector=request.sparse_vector.model_dump() if request.sparse_vector else None
         )
         return {"message": "Vector upserted successfully", "id": request.id}
+    except EmbeddingSpecMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"ERROR in upsert_vector: {type(e).__name__}: {str(e)}")
         import traceback
@@ -110,23 +294,61 @@ async def upsert_vector(field: str, request: UpsertRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/api/v1/index/{field}/upsert/batch", status_code=status.HTTP_200_OK)
+async def upsert_vectors_batch(field: str, request: BatchUpsertRequest):
+    """Insert or update many vectors, reporting the outcome of each point"""
+    try:
+        embedding_spec = spec_dict(request.embedding)
+        results = await qdrant_service.upsert_points(
+            collection_name=await qdrant_service.resolve_collection(field, embedding_spec, create=True),
+            points=[point.model_dump(exclude={"embedding"}) for point in request.points],
+            embedding_spec=embedding_spec,
+            field=field
+        )
+    except EmbeddingSpecMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch upsert failed for collection {field}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    failed = sum(1 for result in results if result["status"] != "ok")
+    return {
+        "upserted": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+
 @app.post("/api/v1/index/{field}/search", response_model=List[SearchResult])
 async def search_vectors(field: str, request: SearchRequest):
-    """Search for similar vectors in the collection"""
+    """
+    Search for similar vectors in the field's collection for the query's model
+    
+    Without a model the field's active collection is searched. Answers 409
+    when the field holds no vectors of the model, or when the query vector's
+    dimension doesn't match the collection's. The optional filter is applied
+    by Qdrant during the HNSW search, on the indexed payload (PAYLOAD_INDEXES).
+    """
+    query_filter = request_filter(request.filter)
+    collection_name = await search_collection(field, request)
+    
     try:
-        logger.info(f"Searching collection: {field}, vector length: {len(request.vector)}, limit: {request.limit}")
+        logger.info(f"Searching collection: {collection_name}, vector length: {len(request.vector)}, limit: {request.limit}")
         results = await qdrant_service.search(
-            collection_name=field,
+            collection_name=collection_name,
             query_vector=request.vector,
             limit=request.limit,
-            score_threshold=request.score_threshold
+            score_threshold=request.score_threshold,
+            params=request_params(request),
+            query_filter=combine_filters(qdrant_service.field_filter(field), query_filter)
         )
         
         return [
             SearchResult(
                 id=str(result.id),
                 score=result.score,
-                payload=result.payload
+                payload=result.payload,
+                field=field
             )
             for result in results
         ]
@@ -135,11 +357,135 @@ async def search_vectors(field: str, request: SearchRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/api/v1/index/{field}/search/hybrid", response_model=List[SearchResult])
+async def hybrid_search_vectors(field: str, request: HybridSearchRequest):
+    """
+    Search with the dense query vector and the sparse BM25 query terms
+    
+    Both result lists are fused with reciprocal rank fusion in a single
+    Qdrant query, so exact keywords (names, invoice numbers, hashtags) rank
+    even when the embedding misses them. Scores are fused ranks, not
+    similarities. Collections created before sparse vectors existed, or a
+    query without sparse terms, get a plain dense search.
+    """
+    query_filter = request_filter(request.filter)
+    collection_name = await search_collection(field, request)
+    
+    try:
+        results = await qdrant_service.hybrid_search(
+            collection_name=collection_name,
+            query_vector=request.vector,
+            sparse_vector=request.sparse_vector.model_dump() if request.sparse_vector else None,
+            limit=request.limit,
+            score_threshold=request.score_threshold,
+            params=request_params(request),
+            query_filter=combine_filters(qdrant_service.field_filter(field), query_filter)
+        )
+        return [
+            SearchResult(
+                id=str(result.id),
+                score=result.score,
+                payload=result.payload,
+                field=field,
+                similarity=similarity
+            )
+            for result, similarity in results
+        ]
+    except Exception as e:
+        logger.error(f"Hybrid search failed for collection {field}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/v1/search", response_model=List[SearchResult])
+async def search_fields(request: MultiFieldSearchRequest):
+    """
+    Search several fields (all of them by default) in one request
+    
+    In shared storage mode this is a single query on the shared collection,
+    filtered on the indexed field payload. In per-field mode the fields'
+    collections are searched concurrently and merged by score; fields
+    without vectors of the query's model are skipped, and the request
+    answers 409 only when none has them.
+    """
+    embedding_spec = spec_dict(request.embedding)
+    query_filter = request_filter(request.filter)
+    fields = request.fields if request.fields is not None else await qdrant_service.list_fields()
+    if not fields:
+        return []
+    
+    if qdrant_service.shared:
+        try:
+            collection_name = await qdrant_service.resolve_collection(fields[0], embedding_spec)
+        except EmbeddingSpecMismatch as e:
+            raise mismatch_response(e)
+        await check_query_dim(collection_name, request.vector)
+        try:
+            results = await qdrant_service.search(
+                collection_name=collection_name,
+                query_vector=request.vector,
+                limit=request.limit,
+                score_threshold=request.score_threshold,
+                params=request_params(request),
+                query_filter=combine_filters(qdrant_service.fields_filter(request.fields), query_filter)
+            )
+        except Exception as e:
+            logger.error(f"Search failed for fields {fields}: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
+        return [
+            SearchResult(
+                id=str(result.id),
+                score=result.score,
+                payload=result.payload,
+                field=result.payload.get("field")
+            )
+            for result in results
+        ]
+    
+    targets = []
+    mismatch = None
+    for field in fields:
+        try:
+            collection_name = await qdrant_service.resolve_collection(field, embedding_spec)
+        except EmbeddingSpecMismatch as e:
+            mismatch = e
+            continue
+        recorded = await qdrant_service.get_collection_metadata(collection_name) or {}
+        if recorded.get("dim") in (None, len(request.vector)):
+            targets.append((field, collection_name))
+    if not targets:
+        if mismatch is not None:
+            raise mismatch_response(mismatch)
+        raise HTTPException(status_code=409, detail=f"No field holds {len(request.vector)}-dim vectors")
+    
+    try:
+        responses = await asyncio.gather(*[
+            qdrant_service.search(
+                collection_name=collection_name,
+                query_vector=request.vector,
+                limit=request.limit,
+                score_threshold=request.score_threshold,
+                params=request_params(request),
+                query_filter=query_filter
+            )
+            for _, collection_name in targets
+        ])
+    except Exception as e:
+        logger.error(f"Search failed for fields {fields}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    merged = [
+        SearchResult(id=str(result.id), score=result.score, payload=result.payload, field=field)
+        for (field, _), results in zip(targets, responses)
+        for result in results
+    ]
+    merged.sort(key=lambda result: result.score, reverse=True)
+    return merged[:request.limit]
+
+
 @app.get("/api/v1/index/{field}/point/{point_id}")
 async def get_point(field: str, point_id: str):
     """Get a specific point from the collection"""
     try:
-        point = await qdrant_service.get_point(field, point_id)
+        point = await qdrant_service.get_point(await qdrant_service.get_active_collection(field), point_id, field)
         return point
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -147,19 +493,81 @@ async def get_point(field: str, point_id: str):
 
 @app.delete("/api/v1/index/{field}/point/{point_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_point(field: str, point_id: str):
-    """Delete a specific point from the collection"""
+    """Delete a specific point from the field's collections"""
     try:
-        await qdrant_service.delete_point(field, point_id)
+        for space in await qdrant_service.model_spaces(field):
+            await qdrant_service.delete_point(space["collection"], point_id, field)
         return None
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@app.post("/api/v1/index/{field}/items/delete", status_code=status.HTTP_200_OK)
+async def delete_items(field: str, request: DeleteItemsRequest):
+    """Delete every point (all chunks) of the given archive items, for every model"""
+    try:
+        spaces = await qdrant_service.model_spaces(field)
+        if not spaces:
+            raise Exception(f"Field '{field}' has no collections")
+        for space in spaces:
+            await qdrant_service.delete_item_points(space["collection"], request.item_ids, field)
+        return {"deleted_items": len(request.item_ids)}
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/api/v1/index/{field}/items/prune", status_code=status.HTTP_200_OK)
+async def prune_item_chunks(field: str, request: PruneChunksRequest):
+    """Delete the trailing chunks re-embedded items no longer have, in the collection for the model"""
+    try:
+        collection_name = await qdrant_service.resolve_collection(field, spec_dict(request.embedding))
+    except EmbeddingSpecMismatch as e:
+        raise mismatch_response(e)
+    try:
+        await qdrant_service.delete_stale_chunks(collection_name, request.chunk_counts, field)
+        return {"pruned_items": len(request.chunk_counts)}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/v1/index/{field}/models", response_model=List[ModelSpace])
+async def list_models(field: str):
+    """Embedding models a field has vectors for, one collection each"""
+    return [ModelSpace(**space) for space in await qdrant_service.model_spaces(field)]
+
+
+@app.post("/api/v1/index/{field}/models/promote", response_model=ModelSpace)
+async def promote_model(field: str, request: EmbeddingSpec):
+    """Make a model's collection the one searches without a model use"""
+    try:
+        collection_name = await qdrant_service.resolve_collection(field, spec_dict(request))
+    except EmbeddingSpecMismatch as e:
+        raise mismatch_response(e)
+    await qdrant_service.set_active_collection(field, collection_name)
+    logger.info(f"Promoted collection {collection_name} for field {field}")
+    spaces = await qdrant_service.model_spaces(field)
+    return next(ModelSpace(**space) for space in spaces if space["collection"] == collection_name)
+
+
+@app.post("/api/v1/index/{field}/models/retire", status_code=status.HTTP_204_NO_CONTENT)
+async def retire_model(field: str, request: EmbeddingSpec):
+    """Delete a model's collection once searches no longer use it"""
+    try:
+        collection_name = await qdrant_service.resolve_collection(field, spec_dict(request))
+    except EmbeddingSpecMismatch as e:
+        raise mismatch_response(e)
+    if collection_name == await qdrant_service.get_active_collection(field):
+        raise HTTPException(status_code=409, detail="Cannot retire the active model; promote another first")
+    # In shared mode the collection holds every field's vectors of the model
+    await qdrant_service.delete_collection(collection_name)
+    return None
+
+
 @app.get("/api/v1/collections")
 async def list_collections():
-    """List all collections"""
+    """List the indexed fields (their collections, or the fields in the shared collection)"""
     try:
-        collections = await qdrant_service.list_collections()
+        collections = await qdrant_service.list_fields()
         return {"collections": collections}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,180 @@
+import hashlib
+import re
+import uuid
+from datetime import datetime
 from qdrant_client import QdrantClient, AsyncQdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from typing import List, Optional
+from qdrant_client.models import (
+    Distance,
+    VectorParams,
+    PointStruct,
+    Filter,
+    FieldCondition,
+    MatchAny,
+    MatchValue,
+    Range,
+    HasIdCondition,
+    FilterSelector,
+    PayloadSchemaType,
+    SparseVectorParams,
+    SparseVector,
+    Modifier,
+    Prefetch,
+    FusionQuery,
+    Fusion,
+    HnswConfigDiff,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    VectorParamsDiff,
+    SearchParams,
+    QuantizationSearchParams
+)
+from pydantic import ValidationError
+from typing import List, Dict, Optional, Tuple
 from config import settings
 
 
+# Embedding properties that must match for vectors to share a collection
+EMBEDDING_SPEC_KEYS = ("model", "dim", "reduction")
+
+# Collections of a field for models other than its first are named <field>__<model slug>
+MODEL_COLLECTION_SEPARATOR = "__"
+
+# Metadata records of fields (active model) are keyed with this prefix
+FIELD_RECORD_PREFIX = "field:"
+
+# Metadata record listing the fields stored in the shared collection
+SHARED_FIELDS_RECORD = "shared-fields"
+
+
+class EmbeddingSpecMismatch(Exception):
+    """Vectors come from a different model, dimension or reduction than the collection holds"""
+    
+    def __init__(self, message: str, available: Optional[List[Dict]] = None, active: Optional[str] = None):
+        super().__init__(message)
+        self.available = available
+        self.active = active
+
+
+def spec_matches(recorded: Dict, embedding_spec: Dict) -> bool:
+    """Whether vectors of embedding_spec belong in a collection with recorded metadata"""
+    for key in EMBEDDING_SPEC_KEYS:
+        expected, actual = recorded.get(key), embedding_spec.get(key)
+        if expected is not None and actual is not None and expected != actual:
+            return False
+    return True
+
+
+def matching_space(spaces: List[Dict], embedding_spec: Dict) -> Optional[str]:
+    """Collection of the first model space vectors of embedding_spec belong in"""
+    # Collections that recorded a model win over legacy ones that didn't
+    for space in sorted(spaces, key=lambda space: space["model"] is None):
+        if spec_matches(space, embedding_spec):
+            return space["collection"]
+    return None
+
+
+def parse_filter(expression: Optional[Dict]) -> Optional[Filter]:
+    """Qdrant Filter from its JSON form (must / should / must_not conditions)"""
+    if not expression:
+        return None
+    try:
+        return Filter(**expression)
+    except (TypeError, ValidationError) as e:
+        raise ValueError(f"Invalid filter: {e}")
+
+
+def combine_filters(*filters: Optional[Filter]) -> Optional[Filter]:
+    """Filter matching points that pass every given filter"""
+    filters = [query_filter for query_filter in filters if query_filter is not None]
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return Filter(must=filters)
+
+
+QUANTIZATION_KINDS = ("", "none", "scalar", "binary")
+
+
+def quantization_config(kind: str, always_ram: bool = True):
+    """Qdrant quantization config for "scalar" (int8) or "binary"; None for no quantization"""
+    if kind == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=always_ram)
+        )
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=always_ram))
+    if kind in ("", "none"):
+        return None
+    raise ValueError(f"Unknown quantization '{kind}', expected one of {', '.join(QUANTIZATION_KINDS[1:])}")
+
+
+def search_params(
+    hnsw_ef: Optional[int] = None,
+    exact: bool = False,
+    rescore: Optional[bool] = None,
+    oversampling: Optional[float] = None
+) -> Optional[SearchParams]:
+    """Per-query search parameters, or None to use the collection's"""
+    quantization = None
+    if rescore is not None or oversampling is not None:
+        quantization = QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+    if hnsw_ef is None and not exact and quantization is None:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef, exact=exact, quantization=quantization)
+
+
+def describe_quantization(config) -> str:
+    """"scalar", "binary" or "none", from a collection's quantization config"""
+    if isinstance(config, ScalarQuantization):
+        return "scalar"
+    if isinstance(config, BinaryQuantization):
+        return "binary"
+    return "none" if config is None else type(config).__name__
+
+
+def is_not_found(error: Exception) -> bool:
+    """Whether a Qdrant error says the collection does not exist"""
+    message = str(error).lower()
+    return "not found" in message or "404" in message or "doesn't exist" in message
+
+
+def model_collection_name(field: str, embedding_spec: Dict) -> str:
+    """Collection for a field's vectors of a model other than the field's first"""
+    raw = "-".join(str(embedding_spec.get(key) or "") for key in EMBEDDING_SPEC_KEYS)
+    slug = re.sub(r"[^a-z0-9]+", "_", raw.lower()).strip("_")[:40]
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:8]
+    return f"{field}{MODEL_COLLECTION_SEPARATOR}{slug}_{digest}"
+
+
 class QdrantService:
+    """
+    Qdrant access for the field indexes
+    
+    With STORAGE_MODE "per_field" every field has its own collection. With
+    "shared" all fields live in SHARED_COLLECTION, each point carries its
+    field in an indexed "field" keyword payload, and per-field operations
+    become filtered ones. Either way a collection exists per embedding
+    model (see resolve_collection).
+    
+    Existing collections and their vector size and distance are kept in an
+    in-process registry, loaded at startup and updated on create and
+    delete, so writes neither ask Qdrant whether their collection exists
+    nor send vectors of the wrong dimension. A "not found" error from
+    Qdrant evicts the entry (another instance deleted the collection) and
+    the write is retried once after re-creating it.
+    """
+    
     def __init__(self):
         self.client: Optional[AsyncQdrantClient] = None
+        self._metadata: Dict[str, Dict] = {}
+        self._collections: Dict[str, Dict] = {}
+        self.shared = settings.STORAGE_MODE == "shared"
+        self._shared_fields: Optional[List[str]] = None
     
     async def initialize(self):
         """Initialize Qdrant client"""
@@ -17,6 +185,90 @@ class QdrantService:
             timeout=30.0
         )
         print(f"Connected to Qdrant at {settings.QDRANT_HOST}:{settings.QDRANT_PORT}")
+        try:
+            await self.refresh_collections()
+            print(f"Loaded {len(self._collections)} collection(s) into the registry")
+        except Exception as e:
+            # Qdrant not up yet; entries are filled in on first use
+            print(f"Warning: could not load the collection registry: {e}")
+            return
+        for collection_name in await self._collection_names():
+            try:
+                await self.ensure_payload_indexes(collection_name)
+            except Exception as e:
+                print(f"Warning: could not create payload indexes on {collection_name}: {e}")
+    
+    def _payload_indexes(self) -> Dict[str, str]:
+        """Payload indexes every collection gets: PAYLOAD_INDEXES, item_id, and field in shared mode"""
+        indexes = dict(settings.PAYLOAD_INDEXES)
+        # Item deletes and the stale-chunk prune on every store filter on item_id
+        indexes["item_id"] = "keyword"
+        if self.shared:
+            # Every per-field read filters on field
+            indexes["field"] = "keyword"
+        return indexes
+    
+    async def ensure_payload_indexes(self, collection_name: str):
+        """Create the configured payload indexes a collection doesn't have yet"""
+        known = self._collections.setdefault(
+            collection_name,
+            {"size": None, "distance": None, "indexes": set(), "sparse": False}
+        )
+        for key, schema in self._payload_indexes().items():
+            if key in known["indexes"]:
+                continue
+            await self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=key,
+                field_schema=PayloadSchemaType(schema)
+            )
+            known["indexes"].add(key)
+            print(f"Created {schema} payload index on {collection_name}.{key}")
+    
+    def _remember_collection(self, collection_name: str, info):
+        """Registry entry from a Qdrant CollectionInfo"""
+        vectors = info.config.params.vectors
+        if isinstance(vectors, dict):
+            # Named vectors; the unnamed ("") one is the dense embedding
+            vectors = vectors.get("") or next(iter(vectors.values()))
+        self._collections[collection_name] = {
+            "size": vectors.size,
+            "distance": str(vectors.distance),
+            "indexes": set(info.payload_schema or {}),
+            "sparse": settings.SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+        }
+    
+    async def refresh_collections(self):
+        """Reload the registry from Qdrant"""
+        collections = await self.client.get_collections()
+        registry = {}
+        for col in collections.collections:
+            info = await self.client.get_collection(collection_name=col.name)
+            self._remember_collection(col.name, info)
+            registry[col.name] = self._collections[col.name]
+        self._collections = registry
+    
+    async def collection_info(self, collection_name: str, refresh: bool = False) -> Optional[Dict]:
+        """Registry entry (vector size, distance) of a collection, or None if it doesn't exist"""
+        if not refresh and collection_name in self._collections:
+            return self._collections[collection_name]
+        try:
+            info = await self.client.get_collection(collection_name=collection_name)
+        except Exception as e:
+            if not is_not_found(e):
+                raise
+            self._collections.pop(collection_name, None)
+            return None
+        self._remember_collection(collection_name, info)
+        return self._collections[collection_name]
+    
+    def check_vector_size(self, collection_name: str, vector: List[float]):
+        """Reject a vector whose dimension differs from the collection's, without a round-trip"""
+        known = self._collections.get(collection_name)
+        if known is not None and known["size"] not in (None, len(vector)):
+            raise EmbeddingSpecMismatch(
+                f"Collection '{collection_name}' holds {known['size']}-dim vectors, got {len(vector)}"
+            )
     
     async def health_check(self) -> bool:
         """Check if Qdrant is healthy"""
@@ -37,111 +289,632 @@ class QdrantService:
         }
         return metric_map.get(settings.DISTANCE_METRIC, Distance.COSINE)
     
-    async def create_collection(self, collection_name: str, vector_size: int):
-        """Create a new collection"""
+    async def create_collection(
+        self,
+        collection_name: str,
+        vector_size: int,
+        embedding_spec: Optional[Dict] = None,
+        tuning: Optional[Dict] = None
+    ):
+        """
+        Create a new collection, recording the embedding model and dimension it holds
+        
+        tuning may set quantization, quantization_always_ram, hnsw_m,
+        hnsw_ef_construct and on_disk; unset keys come from the settings.
+        """
+        tuning = {key: value for key, value in (tuning or {}).items() if value is not None}
+        quantization = quantization_config(
+            tuning.get("quantization", settings.QUANTIZATION),
+            tuning.get("quantization_always_ram", settings.QUANTIZATION_ALWAYS_RAM)
+        )
         try:
             await self.client.create_collection(
                 collection_name=collection_name,
                 vectors_config=VectorParams(
                     size=vector_size,
-                    distance=self._get_distance_metric()
-                )
+                    distance=self._get_distance_metric(),
+                    on_disk=tuning.get("on_disk", settings.VECTORS_ON_DISK)
+                ),
+                sparse_vectors_config={
+                    settings.SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+                },
+                hnsw_config=HnswConfigDiff(
+                    m=tuning.get("hnsw_m", settings.HNSW_M),
+                    ef_construct=tuning.get("hnsw_ef_construct", settings.HNSW_EF_CONSTRUCT)
+                ),
+                quantization_config=quantization
             )
             print(f"Created collection: {collection_name}")
+            self._collections[collection_name] = {
+                "size": vector_size,
+                "distance": str(self._get_distance_metric()),
+                "indexes": set(),
+                "sparse": True
+            }
+            await self.ensure_payload_indexes(collection_name)
+            metadata = {key: value for key, value in (embedding_spec or {}).items() if value is not None}
+            await self.set_collection_metadata(collection_name, {**metadata, "dim": vector_size})
         except Exception as e:
             # Collection might already exist - only raise if it's not an "already exists" error
             error_str = str(e).lower()
             if "already exists" in error_str or "409" in error_str:
                 print(f"Collection '{collection_name}' already exists, skipping creation")
+                await self.collection_info(collection_name, refresh=True)
             else:
                 print(f"Collection creation error: {e}")
                 raise
     
+    async def update_collection(self, collection_name: str, tuning: Dict):
+        """
+        Change quantization, HNSW parameters or on-disk storage of a live collection
+        
+        Only the keys present in tuning change; quantization "none" removes
+        it. Qdrant rebuilds the affected index segments in the background.
+        """
+        tuning = {key: value for key, value in tuning.items() if value is not None}
+        hnsw_config = None
+        if "hnsw_m" in tuning or "hnsw_ef_construct" in tuning:
+            hnsw_config = HnswConfigDiff(m=tuning.get("hnsw_m"), ef_construct=tuning.get("hnsw_ef_construct"))
+        quantization = None
+        if "quantization" in tuning:
+            quantization = quantization_config(
+                tuning["quantization"],
+                tuning.get("quantization_always_ram", settings.QUANTIZATION_ALWAYS_RAM)
+            ) or Disabled.DISABLED
+        vectors_config = None
+        if "on_disk" in tuning:
+            # "" is the unnamed dense vector
+            vectors_config = {"": VectorParamsDiff(on_disk=tuning["on_disk"])}
+        
+        await self.client.update_collection(
+            collection_name=collection_name,
+            vectors_config=vectors_config,
+            hnsw_config=hnsw_config,
+            quantization_config=quantization
+        )
+        print(f"Updated collection {collection_name}: {tuning}")
+    
     async def delete_collection(self, collection_name: str):
         """Delete a collection"""
         await self.client.delete_collection(collection_name=collection_name)
+        self._collections.pop(collection_name, None)
+        await self._delete_collection_metadata(collection_name)
         print(f"Deleted collection: {collection_name}")
     
-    async def get_collection_stats(self, collection_name: str):
-        """Get collection statistics"""
+    async def delete_field(self, field: str):
+        """Delete every collection of a field and its record, or its points in shared mode"""
+        spaces = await self.model_spaces(field)
+        if not spaces:
+            raise Exception(f"Field '{field}' has no collections")
+        if self.shared:
+            if field not in await self.list_fields():
+                raise Exception(f"Field '{field}' has no points")
+            for space in spaces:
+                await self.client.delete(
+                    collection_name=space["collection"],
+                    points_selector=FilterSelector(filter=self.field_filter(field))
+                )
+            fields = [name for name in await self.list_fields() if name != field]
+            await self.set_collection_metadata(SHARED_FIELDS_RECORD, {"fields": fields})
+            self._shared_fields = fields
+            return
+        for space in spaces:
+            await self.delete_collection(space["collection"])
+        await self._delete_collection_metadata(f"{FIELD_RECORD_PREFIX}{field}")
+    
+    async def get_collection_stats(self, collection_name: str, field: Optional[str] = None):
+        """Get collection statistics; in shared mode the counts are the field's"""
         info = await self.client.get_collection(collection_name=collection_name)
+        self._remember_collection(collection_name, info)
+        points_count, vectors_count = info.points_count, info.vectors_count
+        if self.shared and field:
+            points_count = (await self.client.count(
+                collection_name=collection_name,
+                count_filter=self.field_filter(field),
+                exact=True
+            )).count
+            vectors_count = points_count
         return {
-            "name": collection_name,
-            "vectors_count": info.vectors_count,
-            "points_count": info.points_count,
+            "name": field or collection_name,
+            "collection": collection_name,
+            "vectors_count": vectors_count,
+            "points_count": points_count,
             "status": info.status,
             "config": {
                 "vector_size": info.config.params.vectors.size,
-                "distance": str(info.config.params.vectors.distance)
-            }
+                "distance": str(info.config.params.vectors.distance),
+                "on_disk": bool(info.config.params.vectors.on_disk),
+                "hnsw_m": info.config.hnsw_config.m,
+                "hnsw_ef_construct": info.config.hnsw_config.ef_construct,
+                "quantization": describe_quantization(info.config.quantization_config)
+            },
+            "hybrid": self.has_sparse(collection_name),
+            "payload_indexes": {key: str(schema.data_type) for key, schema in (info.payload_schema or {}).items()},
+            "embedding": await self.get_collection_metadata(collection_name)
         }
     
-    async def list_collections(self) -> List[str]:
-        """List all collections"""
-        collections = await self.client.get_collections()
-        return [col.name for col in collections.collections]
+    async def list_fields(self) -> List[str]:
+        """Fields with an index: their collections, or the fields stored in the shared collection"""
+        if self.shared:
+            if self._shared_fields is None:
+                record = await self.get_collection_metadata(SHARED_FIELDS_RECORD)
+                self._shared_fields = list(record["fields"]) if record else []
+            return list(self._shared_fields)
+        return [name for name in await self._collection_names() if MODEL_COLLECTION_SEPARATOR not in name]
+    
+    async def register_field(self, field: str):
+        """Remember a field written to the shared collection"""
+        if not self.shared or field in await self.list_fields():
+            return
+        fields = self._shared_fields + [field]
+        await self.set_collection_metadata(SHARED_FIELDS_RECORD, {"fields": fields})
+        self._shared_fields = fields
+    
+    def field_filter(self, field: str) -> Optional[Filter]:
+        """Filter restricting a shared collection to one field; None in per-field mode"""
+        if not self.shared:
+            return None
+        return Filter(must=[FieldCondition(key="field", match=MatchValue(value=field))])
+    
+    def fields_filter(self, fields: Optional[List[str]]) -> Optional[Filter]:
+        """Filter restricting a shared collection to several fields"""
+        if not self.shared or not fields:
+            return None
+        return Filter(must=[FieldCondition(key="field", match=MatchAny(any=fields))])
+    
+    def namespace(self, field: str) -> str:
+        """Base collection name of a field: its own, or the shared one"""
+        return settings.SHARED_COLLECTION if self.shared else field
+    
+    async def _collection_names(self) -> List[str]:
+        return [name for name in self._collections if name != settings.METADATA_COLLECTION]
+    
+    async def model_spaces(self, field: str) -> List[Dict]:
+        """
+        Collections holding a field's vectors, one per embedding model
+        
+        Each entry has the collection name, the recorded model, dim and
+        reduction (dim is the vector size when none was recorded), and
+        whether it is the collection searches use by default.
+        """
+        active = await self.get_active_collection(field)
+        base = self.namespace(field)
+        names = [
+            name for name in await self._collection_names()
+            if name == base or name.startswith(f"{base}{MODEL_COLLECTION_SEPARATOR}")
+        ]
+        spaces = []
+        for name in names:
+            metadata = await self.get_collection_metadata(name) or {}
+            space = {
+                "collection": name,
+                **{key: metadata.get(key) for key in EMBEDDING_SPEC_KEYS},
+                "active": name == active
+            }
+            if space["dim"] is None:
+                # Legacy collections recorded no metadata; their vector size
+                # still rules out models of another dimension
+                space["dim"] = self._collections.get(name, {}).get("size")
+            spaces.append(space)
+        return spaces
+    
+    async def get_active_collection(self, field: str) -> str:
+        """Collection searches of a field use when the caller names no model"""
+        base = self.namespace(field)
+        record = await self.get_collection_metadata(f"{FIELD_RECORD_PREFIX}{base}")
+        return record["active_collection"] if record else base
+    
+    async def set_active_collection(self, field: str, collection_name: str):
+        """Make a field's collection for one model the default for searches (all fields in shared mode)"""
+        await self.set_collection_metadata(
+            f"{FIELD_RECORD_PREFIX}{self.namespace(field)}",
+            {"active_collection": collection_name}
+        )
+    
+    async def resolve_collection(self, field: str, embedding_spec: Optional[Dict], create: bool = False) -> str:
+        """
+        Collection holding a field's vectors of an embedding model
+        
+        Without a spec this is the field's active collection. The first
+        model written to a field uses the collection named after the field;
+        any other model gets its own <field>__<model> collection, so during
+        a model switch both can be written side by side. With create=False
+        (reads) a model the field has no vectors of raises
+        EmbeddingSpecMismatch listing the models it has.
+        """
+        if not embedding_spec:
+            return await self.get_active_collection(field)
+        
+        spaces = await self.model_spaces(field)
+        collection_name = matching_space(spaces, embedding_spec)
+        if collection_name is None:
+            # The registry may lag behind collections another instance created;
+            # only the two names this model could have been written to are
+            # looked up, not every collection
+            base = self.namespace(field)
+            candidates = [
+                name for name in (base, model_collection_name(base, embedding_spec))
+                if name not in self._collections
+            ]
+            for name in candidates:
+                self._metadata.pop(name, None)
+                await self.collection_info(name, refresh=True)
+            if candidates:
+                spaces = await self.model_spaces(field)
+                collection_name = matching_space(spaces, embedding_spec)
+        if collection_name is not None:
+            return collection_name
+        
+        if not create:
+            raise EmbeddingSpecMismatch(
+                f"Field '{field}' has no vectors for model={embedding_spec.get('model')}, "
+                f"dim={embedding_spec.get('dim')}, reduction={embedding_spec.get('reduction')}",
+                available=spaces,
+                active=await self.get_active_collection(field)
+            )
+        base = self.namespace(field)
+        return model_collection_name(base, embedding_spec) if spaces else base
+    
+    def _metadata_point_id(self, collection_name: str) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"omnia-collection:{collection_name}"))
+    
+    async def get_collection_metadata(self, collection_name: str) -> Optional[Dict]:
+        """
+        Embedding model, dimension and reduction recorded for a collection, if any
+        
+        Field records (the active collection of a field) are stored the same
+        way, under "field:<field>".
+        """
+        if collection_name in self._metadata:
+            return self._metadata[collection_name]
+        try:
+            points = await self.client.retrieve(
+                collection_name=settings.METADATA_COLLECTION,
+                ids=[self._metadata_point_id(collection_name)]
+            )
+        except Exception as e:
+            if not is_not_found(e):
+                return None
+            # Metadata collection not created yet
+            points = []
+        metadata = None
+        if points:
+            metadata = {key: value for key, value in points[0].payload.items() if key != "collection"}
+        # Misses are cached as well: most fields never get a field record,
+        # and it is looked up on every upsert and search
+        self._metadata[collection_name] = metadata
+        return metadata
+    
+    async def set_collection_metadata(self, collection_name: str, metadata: Dict):
+        """
+        Record embedding metadata for a collection
+        
+        Qdrant collections have no free-form metadata, so it is stored as
+        a payload-only point in a reserved collection, keyed by name.
+        """
+        if settings.METADATA_COLLECTION not in self._collections:
+            try:
+                await self.client.create_collection(
+                    collection_name=settings.METADATA_COLLECTION,
+                    vectors_config=VectorParams(size=1, distance=Distance.DOT)
+                )
+            except Exception as e:
+                if "already exists" not in str(e).lower() and "409" not in str(e):
+                    raise
+            self._collections[settings.METADATA_COLLECTION] = {
+                "size": 1,
+                "distance": str(Distance.DOT),
+                "indexes": set(),
+                "sparse": False
+            }
+        
+        metadata = {**metadata, "recorded_at": datetime.utcnow().isoformat()}
+        await self.client.upsert(
+            collection_name=settings.METADATA_COLLECTION,
+            points=[PointStruct(
+                id=self._metadata_point_id(collection_name),
+                vector=[1.0],
+                payload={"collection": collection_name, **metadata}
+            )]
+        )
+        self._metadata[collection_name] = metadata
+    
+    async def _delete_collection_metadata(self, collection_name: str):
+        self._metadata.pop(collection_name, None)
+        try:
+            await self.client.delete(
+                collection_name=settings.METADATA_COLLECTION,
+                points_selector=[self._metadata_point_id(collection_name)]
+            )
+        except Exception:
+            pass
+    
+    async def check_embedding_spec(self, collection_name: str, embedding_spec: Optional[Dict]):
+        """
+        Reject vectors whose model, dimension or reduction differ from the collection's
+        
+        Collections created before metadata was recorded adopt the spec of
+        their first write.
+        """
+        if not embedding_spec:
+            return
+        recorded = await self.get_collection_metadata(collection_name)
+        if recorded is None:
+            await self.set_collection_metadata(collection_name, embedding_spec)
+            return
+        if not spec_matches(recorded, embedding_spec):
+            raise EmbeddingSpecMismatch(
+                f"Collection '{collection_name}' holds model={recorded.get('model')}, "
+                f"dim={recorded.get('dim')}, reduction={recorded.get('reduction')}"
+            )
+    
+    async def _ensure_collection(self, collection_name: str, vector_size: int, embedding_spec: Optional[Dict] = None):
+        """Create the collection on first write if it does not exist yet"""
+        if await self.collection_info(collection_name) is not None:
+            return
+        try:
+            await self.create_collection(collection_name, vector_size, embedding_spec)
+        except Exception as create_error:
+            # Collection might have been created by another request
+            if "already exists" not in str(create_error).lower():
+                raise
+    
+    async def _upsert(self, collection_name: str, points: List[PointStruct], vector_size: int,
+                      embedding_spec: Optional[Dict] = None):
+        """Upsert, re-creating the collection once if it was deleted behind the registry's back"""
+        try:
+            await self.client.upsert(collection_name=collection_name, points=points)
+        except Exception as e:
+            if not is_not_found(e):
+                raise
+            print(f"Collection '{collection_name}' is gone, re-creating it")
+            self._collections.pop(collection_name, None)
+            await self._ensure_collection(collection_name, vector_size, embedding_spec)
+            await self.client.upsert(collection_name=collection_name, points=points)
+    
+    def has_sparse(self, collection_name: str) -> bool:
+        """Whether a collection has the sparse BM25 vector (collections created before it don't)"""
+        return self._collections.get(collection_name, {}).get("sparse", False)
+    
+    def _point_vector(self, collection_name: str, vector: List[float], sparse_vector: Optional[Dict] = None):
+        """Dense vector, plus the sparse one under SPARSE_VECTOR_NAME when the collection has it"""
+        if not sparse_vector or not sparse_vector.get("indices") or not self.has_sparse(collection_name):
+            return vector
+        # "" is the unnamed dense vector
+        return {"": vector, settings.SPARSE_VECTOR_NAME: SparseVector(**sparse_vector)}
     
     async def upsert_point(
         self,
         collection_name: str,
         point_id: str,
         vector: List[float],
-        payload: dict
+        payload: dict,
+        embedding_spec: Optional[Dict] = None,
+        field: Optional[str] = None,
+        sparse_vector: Optional[Dict] = None
     ):
         """Insert or update a point in the collection"""
-        # Ensure collection exists
-        try:
-            await self.client.get_collection(collection_name=collection_name)
-        except Exception:
-            # Create collection if it doesn't exist
-            try:
-                await self.create_collection(collection_name, len(vector))
-            except Exception as create_error:
-                # Collection might have been created by another request, try to get it again
-                if "already exists" not in str(create_error).lower():
-                    raise
-                # Collection exists now, continue with upsert
+        # Ensure collection exists and holds vectors of the same kind
+        await self._ensure_collection(collection_name, len(vector), embedding_spec)
+        self.check_vector_size(collection_name, vector)
+        await self.check_embedding_spec(collection_name, embedding_spec)
+        if self.shared and field:
+            payload = {**payload, "field": field}
+            await self.register_field(field)
         
         point = PointStruct(
             id=point_id,
-            vector=vector,
+            vector=self._point_vector(collection_name, vector, sparse_vector),
             payload=payload
         )
         
-        await self.client.upsert(
-            collection_name=collection_name,
-            points=[point]
-        )
+        await self._upsert(collection_name, [point], len(vector), embedding_spec)
+    
+    async def upsert_points(
+        self,
+        collection_name: str,
+        points: List[Dict],
+        batch_size: int = settings.UPSERT_BATCH_SIZE,
+        embedding_spec: Optional[Dict] = None,
+        field: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Insert or update many points, sending them to Qdrant in sub-batches
+        
+        Points are dicts with id, vector, payload and optionally sparse_vector
+        (indices and values). Returns one result per
+        input point, in order, with status "ok" or "error". A point that
+        cannot be built fails on its own; a rejected sub-batch fails all of
+        its points.
+        """
+        results: List[Dict] = [{"id": point["id"], "status": "ok"} for point in points]
+        if not points:
+            return results
+        
+        await self._ensure_collection(collection_name, len(points[0]["vector"]), embedding_spec)
+        await self.check_embedding_spec(collection_name, embedding_spec)
+        shared_field = field if self.shared else None
+        if shared_field:
+            await self.register_field(shared_field)
+        
+        valid = []
+        for index, point in enumerate(points):
+            try:
+                self.check_vector_size(collection_name, point["vector"])
+                payload = point["payload"]
+                if shared_field:
+                    payload = {**payload, "field": shared_field}
+                valid.append((index, PointStruct(
+                    id=point["id"],
+                    vector=self._point_vector(collection_name, point["vector"], point.get("sparse_vector")),
+                    payload=payload
+                )))
+            except Exception as e:
+                results[index].update(status="error", error=str(e))
+        
+        for start in range(0, len(valid), batch_size):
+            sub_batch = valid[start:start + batch_size]
+            try:
+                await self._upsert(
+                    collection_name,
+                    [point for _, point in sub_batch],
+                    len(points[0]["vector"]),
+                    embedding_spec
+                )
+            except Exception as e:
+                print(f"Sub-batch upsert failed for {collection_name}: {e}")
+                for index, _ in sub_batch:
+                    results[index].update(status="error", error=str(e))
+        
+        return results
     
     async def search(
         self,
         collection_name: str,
         query_vector: List[float],
         limit: int = 10,
-        score_threshold: Optional[float] = None
+        score_threshold: Optional[float] = None,
+        query_filter: Optional[Filter] = None,
+        params: Optional[SearchParams] = None
     ):
         """Search for similar vectors"""
-        results = await self.client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            limit=limit,
-            score_threshold=score_threshold
-        )
+        self.check_vector_size(collection_name, query_vector)
+        try:
+            results = await self.client.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                query_filter=query_filter,
+                search_params=params,
+                limit=limit,
+                score_threshold=score_threshold
+            )
+        except Exception as e:
+            if is_not_found(e):
+                self._collections.pop(collection_name, None)
+            raise
         return results
     
-    async def get_point(self, collection_name: str, point_id: str):
+    async def hybrid_search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        sparse_vector: Optional[Dict],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        query_filter: Optional[Filter] = None,
+        params: Optional[SearchParams] = None
+    ) -> List[Tuple]:
+        """
+        Dense and sparse (BM25) search fused with reciprocal rank fusion
+        
+        Both branches run as prefetches of one Qdrant query, with the filter
+        applied in each, and are fused server-side. score_threshold and
+        params (hnsw_ef, exact, rescoring) apply to the dense branch only.
+        Fused scores are ranks, so each result comes with its dense
+        similarity too: (point, similarity), the similarity computed from
+        the returned vector (cosine collections only, else None).
+        Collections without the sparse vector, and queries without terms,
+        fall back to dense search.
+        """
+        if not sparse_vector or not sparse_vector.get("indices") or not self.has_sparse(collection_name):
+            results = await self.search(collection_name, query_vector, limit, score_threshold, query_filter, params)
+            return [(result, result.score) for result in results]
+        
+        self.check_vector_size(collection_name, query_vector)
+        prefetch_limit = limit * settings.HYBRID_PREFETCH_MULTIPLIER
+        try:
+            response = await self.client.query_points(
+                collection_name=collection_name,
+                prefetch=[
+                    Prefetch(
+                        query=query_vector,
+                        filter=query_filter,
+                        params=params,
+                        score_threshold=score_threshold,
+                        limit=prefetch_limit
+                    ),
+                    Prefetch(
+                        query=SparseVector(**sparse_vector),
+                        using=settings.SPARSE_VECTOR_NAME,
+                        filter=query_filter,
+                        limit=prefetch_limit
+                    )
+                ],
+                query=FusionQuery(fusion=Fusion.RRF),
+                limit=limit,
+                with_vectors=True
+            )
+        except Exception as e:
+            if is_not_found(e):
+                self._collections.pop(collection_name, None)
+            raise
+        return [(point, self._dense_similarity(collection_name, query_vector, point.vector)) for point in response.points]
+    
+    def _dense_similarity(self, collection_name: str, query_vector: List[float], vector) -> Optional[float]:
+        """Cosine similarity of a returned point (Qdrant stores cosine vectors normalized)"""
+        if isinstance(vector, dict):
+            vector = vector.get("")
+        if not vector or self._collections.get(collection_name, {}).get("distance") != str(Distance.COSINE):
+            return None
+        norm = sum(value * value for value in query_vector) ** 0.5
+        if norm == 0:
+            return None
+        return sum(a * b for a, b in zip(query_vector, vector)) / norm
+    
+    async def get_point(self, collection_name: str, point_id: str, field: Optional[str] = None):
         """Get a specific point"""
         points = await self.client.retrieve(
             collection_name=collection_name,
             ids=[point_id]
         )
-        if not points:
+        if not points or (self.shared and field and points[0].payload.get("field") != field):
             raise Exception(f"Point {point_id} not found")
         return points[0]
     
-    async def delete_point(self, collection_name: str, point_id: str):
+    async def delete_point(self, collection_name: str, point_id: str, field: Optional[str] = None):
         """Delete a specific point"""
+        if self.shared and field:
+            await self.client.delete(
+                collection_name=collection_name,
+                points_selector=FilterSelector(filter=Filter(must=[
+                    HasIdCondition(has_id=[point_id]),
+                    *self.field_filter(field).must
+                ]))
+            )
+            return
         await self.client.delete(
             collection_name=collection_name,
             points_selector=[point_id]
         )
+    
+    async def delete_stale_chunks(self, collection_name: str, chunk_counts: Dict[str, int], field: Optional[str] = None):
+        """
+        Delete chunks an item no longer has: its points with chunk_index >= its current chunk count
+        
+        Re-embedding only upserts, so an item that now splits into fewer
+        chunks would otherwise keep its old trailing chunks.
+        """
+        if not chunk_counts:
+            return
+        scope = self.field_filter(field).must if self.shared and field else []
+        await self.client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(filter=Filter(should=[
+                Filter(must=[
+                    FieldCondition(key="item_id", match=MatchValue(value=item_id)),
+                    FieldCondition(key="chunk_index", range=Range(gte=chunk_count)),
+                    *scope
+                ])
+                for item_id, chunk_count in chunk_counts.items()
+            ]))
+        )
+    
+    async def delete_item_points(self, collection_name: str, item_ids: List[str], field: Optional[str] = None):
+        """Delete every point (all chunks) of the given archive items"""
+        conditions = [FieldCondition(key="item_id", match=MatchAny(any=item_ids))]
+        if self.shared and field:
+            conditions.extend(self.field_filter(field).must)
+        await self.client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(filter=Filter(must=conditions))
+        )